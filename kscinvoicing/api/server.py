@@ -0,0 +1,304 @@
+"""
+Headless HTTP/JSON rendering API for ksc-invoicing.
+Launch via: kscinvoicing api
+
+Endpoints:
+    POST /invoices            Render an invoice from the same json payload as `kscinvoicing generate`.
+                              Query parameters: draft=1 renders without numbering, saving or logging;
+                              async=1 returns 202 with a job id instead of waiting for the PDF.
+    GET  /jobs/<job_id>       Status of an asynchronous job.
+    GET  /jobs/<job_id>/pdf   PDF of a finished asynchronous job.
+    GET  /invoices/<number>/pdf
+                              PDF of a logged invoice stored in the invoice DB (see --store-pdfs), streamed in chunks.
+    GET  /health              Worker and queue usage.
+
+The save_location and logo_path of payloads are resolved inside the server's base folder (--base-dir), so clients
+can't write or read files elsewhere; style names are confined to config/styles (see pdf.utils.get_style).
+Invoice numbers are reserved in the invoice DB, and given back when a render fails.
+
+Rendering runs on a pool of worker processes that load fonts and style once at start-up and cache
+decoded logos, so each request only pays for the render itself. At most `workers + queue_size`
+renders are accepted at a time; beyond that requests are rejected with 503 and a Retry-After header.
+Request bodies must declare their Content-Length, of at most MAX_BODY_BYTES, or are rejected with 413.
+With memory tracing enabled (--trace-memory), responses report the peak memory of each render.
+"""
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from kscinvoicing.generate_invoice_from_json import validate_invoice_json
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.invoice.invoice_store import DB_PATH, init_db
+
+MAX_FINISHED_JOBS = 1000
+MAX_BODY_BYTES = 10 * 1024 * 1024  # larger POST bodies are rejected with 413 before being read
+PATH_FIELDS = ("save_location", "logo_path")  # payload paths resolved inside RenderService.base_dir
+
+
+# ---------------------------------------------------------------------------
+# Worker process side
+# ---------------------------------------------------------------------------
+
+def _warm_worker() -> None:
+    """Worker initializer: import the renderer, which loads the style config and fonts once per process."""
+    import kscinvoicing.pdf.invoicebuilder  # noqa: F401
+
+
+def _render(payload: dict, invoice_number: str | None, db_path: Path, store_pdf: bool = False) -> dict:
+    """
+    Render an invoice in a worker process. With an invoice number, the invoice is saved and logged (and its pdf
+    stored in the DB with store_pdf); without one it is rendered as a draft only.
+    """
+    from kscinvoicing.generate_invoice_from_json import invoice_from_json, build_invoice_from_json
+    from kscinvoicing.pdf.memory import trace_peak_memory
+
+    with trace_peak_memory() as memory:
+        invoice = invoice_from_json(payload, db_path=db_path)
+        invoice.invoice_number = invoice_number
+        invoice_with_pdf = build_invoice_from_json(payload, invoice)
+        if invoice_number is None:
+            pdf, save_path = invoice_with_pdf.to_bytes(), None
+        else:
+            invoice_with_pdf.save(store_pdf=store_pdf)
+            save_path = invoice_with_pdf._get_save_path()
+            pdf = save_path.read_bytes()
+    return {"invoice_number": invoice_number, "path": str(save_path) if save_path else None, "pdf": pdf,
+            "peak_memory_bytes": memory.peak_bytes}
+
+
+# ---------------------------------------------------------------------------
+# Server process side
+# ---------------------------------------------------------------------------
+
+class RenderService:
+    """Bounded queue of render jobs in front of a pre-warmed process pool."""
+
+    def __init__(self, workers: int = 2, queue_size: int = 8, db_path: Path = DB_PATH, store_pdfs: bool = False,
+                 base_dir: Path = Path(".")):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.db_path = db_path
+        self.store_pdfs = store_pdfs
+        self.base_dir = base_dir.resolve()
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                             initializer=_warm_worker)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._jobs: OrderedDict[str, Future] = OrderedDict()
+
+        init_db(self.db_path)
+        # start all workers now rather than on the first requests
+        for future in [self._executor.submit(_warm_worker) for _ in range(workers)]:
+            future.result()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def confine_paths(self, payload: dict) -> tuple[dict, list[str]]:
+        """
+        Resolve the path fields of a payload inside base_dir (relative paths are relative to it).
+        Returns the payload with resolved paths, and the errors of paths that lead outside base_dir.
+        """
+        payload, errors = dict(payload), []
+        for key in PATH_FIELDS:
+            if payload.get(key) is None:
+                continue
+            path = (self.base_dir / payload[key]).resolve()
+            if not path.is_relative_to(self.base_dir):
+                errors.append(f"$.{key}: must be inside the server's base folder")
+            payload[key] = str(path)
+        return payload, errors
+
+    def _release(self, number: str | None, future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        if number is not None and (future.cancelled() or future.exception() is not None):
+            # not logged (a no-op if the failure came after logging), so the next invoice takes the number
+            invoice_store.release_invoice_numbers([number], self.db_path)
+
+    def submit(self, payload: dict, draft: bool = False) -> tuple[str, Future] | None:
+        """
+        Queue a render, reserving its invoice number (see invoice_store.reserve_invoice_numbers) unless it is a
+        draft. Returns (job_id, future), or None when the queue is full.
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                return None
+            number = None if draft else invoice_store.reserve_invoice_numbers(1, self.db_path)[0]
+            future = self._executor.submit(_render, payload, number, self.db_path, self.store_pdfs)
+            self._in_flight += 1
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = future
+            self._evict_finished_jobs()
+        future.add_done_callback(lambda f: self._release(number, f))
+        return job_id, future
+
+    def get_job(self, job_id: str) -> Future | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict_finished_jobs(self) -> None:
+        finished = [job_id for job_id, future in self._jobs.items() if future.done()]
+        for job_id in finished[:max(0, len(self._jobs) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _job_status(future: Future) -> dict:
+    if not future.done():
+        return {"status": "pending"}
+    if future.exception() is not None:
+        return {"status": "error", "error": str(future.exception())}
+    result = future.result()
+    return {"status": "done", "invoice_number": result["invoice_number"], "path": result["path"],
+            "peak_memory_bytes": result["peak_memory_bytes"]}
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    server: "RenderServer"
+
+    def _send_json(self, status: HTTPStatus, body: dict, headers: dict = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_pdf(self, result: dict) -> None:
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(result["pdf"])))
+        if result["invoice_number"] is not None:
+            self.send_header("X-Invoice-Number", result["invoice_number"])
+        if result["peak_memory_bytes"] is not None:
+            self.send_header("X-Peak-Memory-Bytes", str(result["peak_memory_bytes"]))
+        self.end_headers()
+        self.wfile.write(result["pdf"])
+
+    def _send_stored_pdf(self, number: str) -> None:
+        db_path = self.server.service.db_path
+        invoice = invoice_store.get_invoice_by_number(number, db_path)
+        info = invoice_store.get_pdf_info(invoice["id"], db_path) if invoice is not None else None
+        if info is None:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "no stored pdf for this invoice"})
+            return
+        etag = f'"{info["sha256"]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(info["size"]))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        for chunk in invoice_store.iter_pdf(invoice["id"], db_path):
+            self.wfile.write(chunk)
+
+    def do_GET(self):
+        service = self.server.service
+        parts = urlparse(self.path).path.strip("/").split("/")
+
+        if len(parts) == 3 and parts[0] == "invoices" and parts[2] == "pdf":
+            self._send_stored_pdf(parts[1])
+            return
+        if parts == ["health"]:
+            self._send_json(HTTPStatus.OK, {"workers": service.workers, "capacity": service.capacity,
+                                            "in_flight": service.in_flight})
+            return
+
+        future = service.get_job(parts[1]) if len(parts) in (2, 3) and parts[0] == "jobs" else None
+        if future is None or (len(parts) == 3 and parts[2] != "pdf"):
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+        elif len(parts) == 2:
+            self._send_json(HTTPStatus.OK, _job_status(future))
+        elif not future.done() or future.exception() is not None:
+            self._send_json(HTTPStatus.CONFLICT, _job_status(future))
+        else:
+            self._send_pdf(future.result())
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") != "/invoices":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+        query = parse_qs(url.query)
+        draft = query.get("draft", ["0"])[0] == "1"
+        run_async = query.get("async", ["0"])[0] == "1"
+
+        try:
+            length = int(self.headers["Content-Length"])  # None when missing
+        except (TypeError, ValueError):
+            length = -1
+        if not 0 <= length <= MAX_BODY_BYTES:
+            self.close_connection = True  # the unread body must not be parsed as the next request
+            self._send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            {"error": f"request body must have a Content-Length of at most {MAX_BODY_BYTES} bytes"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"errors": ["invalid json"]})
+            return
+        errors = validate_invoice_json(payload)
+        if not errors:
+            payload, errors = self.server.service.confine_paths(payload)
+        if errors:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"errors": errors})
+            return
+
+        job = self.server.service.submit(payload, draft=draft)
+        if job is None:
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"error": "render queue is full"},
+                            headers={"Retry-After": "1"})
+            return
+        job_id, future = job
+
+        if run_async:
+            self._send_json(HTTPStatus.ACCEPTED, {"job_id": job_id, "status": "pending"},
+                            headers={"Location": f"/jobs/{job_id}"})
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+            return
+        self._send_pdf(result)
+
+
+class RenderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: RenderService):
+        super().__init__(address, RenderRequestHandler)
+        self.service = service
+
+
+def serve(host: str = "localhost", port: int = 8600, workers: int = 2, queue_size: int = 8,
+          db_path: Path = DB_PATH, store_pdfs: bool = False, base_dir: Path = Path(".")) -> None:
+    """Run the rendering API until interrupted."""
+    service = RenderService(workers=workers, queue_size=queue_size, db_path=db_path, store_pdfs=store_pdfs,
+                            base_dir=base_dir)
+    server = RenderServer((host, port), service)
+    print(f"Rendering API listening on http://{host}:{server.server_port} with {workers} worker(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
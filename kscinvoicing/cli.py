@@ -1,8 +1,16 @@
 import argparse
+import contextlib
 import sys
+from datetime import date
 from pathlib import Path
 
-from kscinvoicing.generate_invoice_from_json import invoice_data_from_json, generate_invoice_and_preview, generate_invoice_and_save
+from kscinvoicing.generate_invoice_from_json import (
+    NDJSON_BATCH_SIZE,
+    invoice_data_from_json,
+    generate_invoice_and_preview,
+    generate_invoice_and_save,
+    generate_invoices_from_ndjson,
+)
 
 APP_PATH = Path(__file__).parent / "web" / "app.py"
 
@@ -13,24 +21,242 @@ def cli():
 
     # generate subcommand (existing behaviour)
     gen = subparsers.add_parser("generate", help="Generate invoice from a JSON file.")
-    gen.add_argument("filepath", type=str, help="path to json file")
+    gen.add_argument("filepath", type=str, help="path to json file ('-' for stdin with --ndjson)")
     gen.add_argument("--no-preview", action="store_false", dest="show_preview",
                      help="save invoice directly without opening a preview")
+    gen.add_argument("--ndjson", action="store_true",
+                     help="read one invoice per line and save each without preview, "
+                          "writing one json result line per invoice to stdout")
+    gen.add_argument("--trace-memory", action="store_true",
+                     help="report the peak memory of each render (slower)")
+    gen.add_argument("--batch-size", type=int, default=NDJSON_BATCH_SIZE,
+                     help=f"with --ndjson, invoices saved and logged per transaction (default: {NDJSON_BATCH_SIZE})")
 
     # serve subcommand (new)
     serve = subparsers.add_parser("serve", help="Launch the Streamlit web UI.")
     serve.add_argument("--port", type=int, default=8501, help="port to serve on (default: 8501)")
     serve.add_argument("--host", type=str, default="localhost", help="host address (default: localhost)")
 
+    # export subcommand
+    export = subparsers.add_parser("export", help="Export invoice history to CSV.")
+    export.add_argument("--what", choices=["invoices", "line-items"], default="invoices",
+                        help="export invoices or their line items (default: invoices)")
+    export.add_argument("--from", dest="date_from", type=date.fromisoformat, default=None,
+                        help="first invoice date to include, YYYY-MM-DD")
+    export.add_argument("--to", dest="date_to", type=date.fromisoformat, default=None,
+                        help="last invoice date to include, YYYY-MM-DD")
+    export.add_argument("--status", choices=["unpaid", "paid", "overdue"], default=None,
+                        help="only export invoices with this payment status")
+    export.add_argument("--output", type=str, default="-", help="output CSV file (default: stdout)")
+
+    # archive subcommand
+    archive = subparsers.add_parser("archive", help="Bundle invoice PDFs and a CSV manifest into one zip/tar file.")
+    archive.add_argument("--from", dest="date_from", type=date.fromisoformat, default=None,
+                         help="first invoice date to include, YYYY-MM-DD")
+    archive.add_argument("--to", dest="date_to", type=date.fromisoformat, default=None,
+                         help="last invoice date to include, YYYY-MM-DD")
+    archive.add_argument("--status", choices=["unpaid", "paid", "overdue"], default=None,
+                         help="only archive invoices with this payment status")
+    archive.add_argument("--folder", type=str, default="invoices",
+                         help="folder the invoice PDFs were saved to (default: invoices)")
+    archive.add_argument("--format", dest="fmt", choices=["zip", "tar"], default="zip",
+                         help="zip, or gzipped tar (default: zip)")
+    archive.add_argument("--output", type=str, default="-", help="output archive file (default: stdout)")
+    archive.add_argument("--workers", type=int, default=None,
+                         help="processes used to regenerate missing PDFs (default: one per CPU)")
+    archive.add_argument("--no-regenerate", action="store_false", dest="regenerate",
+                         help="list missing PDFs in the manifest instead of regenerating them")
+
+    # recurring schedules
+    schedules = subparsers.add_parser("schedules", help="Manage recurring invoice schedules.")
+    schedules_commands = schedules.add_subparsers(dest="schedules_command", required=True)
+    schedules_add = schedules_commands.add_parser("add", help="Add a schedule from a JSON file.")
+    schedules_add.add_argument("filepath", type=str, help="path to the schedule json file")
+    schedules_commands.add_parser("list", help="List schedules and their next run date.")
+    schedules_remove = schedules_commands.add_parser("remove", help="Remove a schedule.")
+    schedules_remove.add_argument("schedule_id", type=int, help="id of the schedule (see 'schedules list')")
+
+    run_schedules = subparsers.add_parser("run-schedules",
+                                          help="Generate every invoice due from recurring schedules.")
+    run_schedules.add_argument("--date", dest="today", type=date.fromisoformat, default=None,
+                               help="generate invoices due up to this date, YYYY-MM-DD (default: today)")
+    run_schedules.add_argument("--workers", type=int, default=None,
+                               help="processes used to render invoices (default: one per CPU)")
+
+    # render job queue
+    jobs = subparsers.add_parser("jobs", help="Queue invoices for worker processes and follow their jobs.")
+    jobs_commands = jobs.add_subparsers(dest="jobs_command", required=True)
+    jobs_add = jobs_commands.add_parser("add", help="Queue invoices from a JSON file.")
+    jobs_add.add_argument("filepath", type=str, help="path to json file ('-' for stdin with --ndjson)")
+    jobs_add.add_argument("--ndjson", action="store_true", help="read one invoice per line")
+    jobs_add.add_argument("--max-attempts", type=int, default=3,
+                          help="renders tried before a job is failed (default: 3)")
+    jobs_list = jobs_commands.add_parser("list", help="List the most recent jobs.")
+    jobs_list.add_argument("--status", choices=["queued", "running", "done", "failed"], default=None,
+                           help="only list jobs with this status")
+    jobs_retry = jobs_commands.add_parser("retry", help="Queue a failed job again.")
+    jobs_retry.add_argument("job_id", type=int, help="id of the job (see 'jobs list')")
+
+    worker = subparsers.add_parser("worker", help="Process queued render jobs.")
+    worker.add_argument("--processes", type=int, default=1, help="number of worker processes (default: 1)")
+    worker.add_argument("--lease", type=float, default=300,
+                        help="seconds a job is leased to a worker before others may take it over (default: 300)")
+    worker.add_argument("--poll", type=float, default=1.0,
+                        help="seconds between polls of an empty queue (default: 1)")
+    worker.add_argument("--exit-when-idle", action="store_true",
+                        help="stop once no job is queued or running, instead of waiting for new jobs")
+
+    # api subcommand
+    api = subparsers.add_parser("api", help="Run the headless HTTP rendering API.")
+    api.add_argument("--port", type=int, default=8600, help="port to serve on (default: 8600)")
+    api.add_argument("--host", type=str, default="localhost", help="host address (default: localhost)")
+    api.add_argument("--workers", type=int, default=2, help="number of render worker processes (default: 2)")
+    api.add_argument("--queue-size", type=int, default=8,
+                     help="renders allowed to wait for a worker before requests are rejected (default: 8)")
+    api.add_argument("--store-pdfs", action="store_true",
+                     help="also store rendered PDFs in the invoice DB, served at /invoices/<number>/pdf")
+    api.add_argument("--trace-memory", action="store_true",
+                     help="report the peak memory of each render in an X-Peak-Memory-Bytes header (slower)")
+    api.add_argument("--base-dir", type=Path, default=Path("."),
+                     help="folder that the save_location and logo_path of requests must be in, relative paths "
+                          "being relative to it (default: current folder)")
+
     args = parser.parse_args()
+    if args.command == "generate" and args.batch_size < 1:
+        gen.error("--batch-size must be at least 1")
+
+    if getattr(args, "trace_memory", False):
+        import os
+        from kscinvoicing.pdf.memory import TRACE_MEMORY_ENV
+        os.environ[TRACE_MEMORY_ENV] = "1"  # inherited by render worker processes
+
+    if args.command in ("generate", "export", "archive", "api", "schedules", "run-schedules", "jobs", "worker"):
+        from kscinvoicing.invoice.invoice_store import init_db, run_overdue_sweep
+        init_db()
+        run_overdue_sweep()
+
+    if args.command == "generate" and args.ndjson:
+        if args.filepath == "-":
+            failures = generate_invoices_from_ndjson(sys.stdin, batch_size=args.batch_size)
+        else:
+            with open(args.filepath, "r", encoding="utf-8") as stream:
+                failures = generate_invoices_from_ndjson(stream, batch_size=args.batch_size)
+        sys.exit(1 if failures else 0)
 
-    if args.command == "generate":
+    elif args.command == "generate":
         data = invoice_data_from_json(args.filepath)
         if args.show_preview:
             generate_invoice_and_preview(data)
         else:
             generate_invoice_and_save(data)
 
+    elif args.command == "export":
+        from kscinvoicing.invoice.export import write_invoices_csv, write_line_items_csv
+        write_csv = write_invoices_csv if args.what == "invoices" else write_line_items_csv
+        filters = dict(date_from=args.date_from, date_to=args.date_to, status=args.status)
+        if args.output == "-":
+            write_csv(sys.stdout, **filters)
+        else:
+            with open(args.output, "w", encoding="utf-8", newline="") as out:
+                count = write_csv(out, **filters)
+            print(f"Exported {count} row(s) to '{args.output}'")
+
+    elif args.command == "archive":
+        from kscinvoicing.generate_invoice_from_json import regenerate_pdf
+        from kscinvoicing.invoice.archive import write_archive
+        options = dict(folder=Path(args.folder), date_from=args.date_from, date_to=args.date_to,
+                       status=args.status, fmt=args.fmt, workers=args.workers,
+                       regenerate=regenerate_pdf if args.regenerate else None)
+        if args.output == "-":
+            counts = write_archive(sys.stdout.buffer, **options)
+        else:
+            with open(args.output, "wb") as out:
+                counts = write_archive(out, **options)
+        print(f"Archived {counts['file'] + counts['regenerated']} invoice(s) to '{args.output}' "
+              f"({counts['regenerated']} regenerated), {counts['missing']} PDF(s) missing",
+              file=sys.stderr if args.output == "-" else sys.stdout)
+
+    elif args.command == "schedules":
+        from kscinvoicing.generate_invoice_from_json import InvoiceValidationError
+        from kscinvoicing.invoice import invoice_store
+        from kscinvoicing.invoice.schedules import add_schedule
+        from kscinvoicing.web import profile_store
+        if args.schedules_command == "add":
+            try:
+                schedule_id = add_schedule(invoice_data_from_json(args.filepath), profile_store.load_sender(),
+                                           profile_store.load_clients())
+            except InvoiceValidationError as e:
+                sys.exit("\n".join(e.errors))
+            print(f"Added schedule {schedule_id}")
+        elif args.schedules_command == "list":
+            for schedule in invoice_store.get_schedules():
+                items = len(schedule["template"]["lineitem_details"])
+                print(f"{schedule['id']}\t{schedule['client_key']}\t{schedule['cadence']}\t"
+                      f"next run {schedule['next_run']}\t{items} line item(s)")
+        elif not invoice_store.delete_schedule(args.schedule_id):
+            sys.exit(f"No schedule with id {args.schedule_id}")
+
+    elif args.command == "run-schedules":
+        import json
+        from kscinvoicing.generate_invoice_from_json import render_numbered_invoice
+        from kscinvoicing.invoice.schedules import run_schedules
+        from kscinvoicing.web import profile_store
+        results = run_schedules(profile_store.load_sender(), profile_store.load_clients(), render_numbered_invoice,
+                                today=args.today, workers=args.workers)
+        for result in results:
+            print(json.dumps(result, ensure_ascii=False))
+        sys.exit(1 if any(result["status"] == "error" for result in results) else 0)
+
+    elif args.command == "jobs":
+        from kscinvoicing.generate_invoice_from_json import InvoiceValidationError
+        from kscinvoicing.invoice import invoice_store
+        from kscinvoicing.invoice.jobqueue import enqueue
+        if args.jobs_command == "add":
+            if args.ndjson:
+                import json
+                payloads, errors = [], []
+                with (contextlib.nullcontext(sys.stdin) if args.filepath == "-"
+                      else open(args.filepath, "r", encoding="utf-8")) as stream:
+                    for line_number, line in enumerate(stream, start=1):
+                        if not line.strip():
+                            continue
+                        try:
+                            payload = json.loads(line)
+                        except json.JSONDecodeError as e:
+                            errors.append(f"line {line_number}: invalid json: {e.msg}")
+                            continue
+                        if not isinstance(payload, dict):
+                            errors.append(f"line {line_number}: expected a json object")
+                            continue
+                        payloads.append(payload)
+                if errors:
+                    sys.exit("\n".join(errors))  # all or none, like enqueue
+            else:
+                payloads = [invoice_data_from_json(args.filepath)]
+            try:
+                job_ids = enqueue(payloads, max_attempts=args.max_attempts)
+            except InvoiceValidationError as e:
+                sys.exit("\n".join(e.errors))
+            print(f"Queued {len(job_ids)} job(s): {', '.join(map(str, job_ids))}")
+        elif args.jobs_command == "list":
+            print(", ".join(f"{count} {status}" for status, count in invoice_store.count_jobs().items()))
+            for job in invoice_store.get_jobs(status=args.status):
+                print(f"{job['id']}\t{job['status']}\tattempt {job['attempts']}/{job['max_attempts']}\t"
+                      f"{job['invoice_number'] or '-'}\t{job['path'] or job['error'] or ''}")
+        elif not invoice_store.retry_job(args.job_id):
+            sys.exit(f"No failed job with id {args.job_id}")
+
+    elif args.command == "worker":
+        from kscinvoicing.generate_invoice_from_json import render_numbered_invoice
+        from kscinvoicing.invoice.jobqueue import run_workers
+        run_workers(args.processes, render_numbered_invoice, lease_seconds=args.lease, poll_interval=args.poll,
+                    exit_when_idle=args.exit_when_idle)
+
+    elif args.command == "api":
+        from kscinvoicing.api.server import serve
+        serve(host=args.host, port=args.port, workers=args.workers, queue_size=args.queue_size,
+              store_pdfs=args.store_pdfs, base_dir=args.base_dir)
+
     elif args.command == "serve":
         import subprocess
         subprocess.run([
@@ -1,17 +1,176 @@
 """
 Main script to create invoices. Parameters provided by json file, see template for examples.
 """
+import contextlib
+import sys
 from pathlib import Path
 from datetime import datetime
 import json
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, TextIO
 
 from kscinvoicing.info import Address, CompanySender, IndividualRecipient, CompanyRecipient
 from kscinvoicing.invoice import LineItem, InvoiceData, InvoiceLogger
+import kscinvoicing.invoice.invoice_store as invoice_store
 from kscinvoicing.pdf.borbinvoice import BorbInvoice
 from kscinvoicing.pdf.invoicebuilder import build_invoice
+from kscinvoicing.pdf.memory import trace_peak_memory
+from kscinvoicing.pdf.savebatch import SaveBatch, write_temp_pdf
+from kscinvoicing.pdf.utils import Currency, Language
 
 
+NDJSON_BATCH_SIZE = 50  # invoices saved and logged per transaction by generate_invoices_from_ndjson
+
+
+class InvoiceValidationError(ValueError):
+    """Raised when invoice json data does not match the expected schema."""
+
+    def __init__(self, errors: list[str]):
+        self.errors = errors
+        super().__init__("Invalid invoice data: " + "; ".join(errors))
+
+
+# ---------------------------------------------------------------------------
+# Schema
+# ---------------------------------------------------------------------------
+
+class _Optional:
+    """Marks a schema field as optional, i.e. it may be absent or null."""
+
+    def __init__(self, spec):
+        self.spec = spec
+
+
+def _is_text(value) -> bool:
+    return isinstance(value, str)
+
+
+def _is_positive_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def _is_amount(value) -> bool:
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return False
+    try:
+        return Decimal(value) >= 0
+    except InvalidOperation:
+        return False
+
+
+def _is_iso_date(value) -> bool:
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _one_of(enum_cls) -> Callable[[Any], bool]:
+    values = {member.value for member in enum_cls}
+    return lambda value: value in values
+
+
+_ADDRESS_SCHEMA = {
+    "number": _is_text,
+    "street": _is_text,
+    "postcode": _is_text,
+    "city": _is_text,
+    "country": _is_text,
+    "building": _Optional(_is_text),
+}
+
+INVOICE_SCHEMA = {
+    "save_location": _is_text,
+    "invoice_date": _is_iso_date,
+    "currency": _one_of(Currency),
+    "language": _one_of(Language),
+    "discount": _Optional(_is_amount),
+    "tax_rate": _Optional(_is_amount),
+    "logo_path": _Optional(_is_text),
+    "footer_text": _Optional(_is_text),
+    "style": _Optional(_is_text),
+    "due_date": _Optional(_is_iso_date),
+    "sender": {
+        "name": _is_text,
+        "company": _is_text,
+        "siren": _is_text,
+        "email": _is_text,
+        "phone": _Optional(_is_text),
+        "website": _Optional(_is_text),
+        "address": _ADDRESS_SCHEMA,
+    },
+    "recipient": {
+        "name": _is_text,
+        "company": _Optional(_is_text),
+        "siren": _Optional(_is_text),
+        "email": _is_text,
+        "phone": _Optional(_is_text),
+        "website": _Optional(_is_text),
+        "address": _ADDRESS_SCHEMA,
+    },
+    "lineitem_details": [{
+        "description": _is_text,
+        "quantity": _is_positive_int,
+        "price_per_unit": _is_amount,
+    }],
+}
+
+
+def _compile_schema(spec) -> Callable[[Any, str, list[str]], None]:
+    """
+    Compile a schema spec into a validator closure.
+    The spec is walked once here rather than once per validated record.
+    """
+    if isinstance(spec, dict):
+        fields = [
+            (key, _compile_schema(sub.spec if isinstance(sub, _Optional) else sub), not isinstance(sub, _Optional))
+            for key, sub in spec.items()
+        ]
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append(f"{path}: expected an object")
+                return
+            for key, check_field, required in fields:
+                field_value = value.get(key)
+                if field_value is not None:
+                    check_field(field_value, f"{path}.{key}", errors)
+                elif required:
+                    errors.append(f"{path}.{key}: required field missing")
+        return check_object
+
+    if isinstance(spec, list):
+        check_element = _compile_schema(spec[0])
+
+        def check_list(value, path, errors):
+            if not isinstance(value, list) or not value:
+                errors.append(f"{path}: expected a non-empty list")
+                return
+            for i, element in enumerate(value):
+                check_element(element, f"{path}[{i}]", errors)
+        return check_list
+
+    def check_value(value, path, errors):
+        if not spec(value):
+            errors.append(f"{path}: invalid value {value!r}")
+    return check_value
+
+
+_check_invoice = _compile_schema(INVOICE_SCHEMA)
+
+
+def validate_invoice_json(data: dict) -> list[str]:
+    """Return a list of schema errors for invoice json data, empty if valid."""
+    errors = []
+    _check_invoice(data, "$", errors)
+    return errors
+
+
+# ---------------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------------
+
 def invoice_data_from_json(path: str) -> dict:
     with open(path, "r", encoding="utf-8") as file:
         data = json.load(file)
@@ -25,18 +184,29 @@ def extract_sender_from_json(data: dict) -> CompanySender:
         name=data['sender']['name'],
         address=Address(**data['sender']['address']),
         email=data['sender']['email'],
-        phone=data['sender']['phone'],
-        website=data['sender']['website'],
+        phone=data['sender'].get('phone'),
+        website=data['sender'].get('website'),
     )
     return sender
 
 
 def extract_recipient_from_json(data: dict) -> IndividualRecipient | CompanyRecipient:
+    if data['recipient'].get('company') is not None:
+        return CompanyRecipient(
+            siren=data['recipient'].get('siren', ''),
+            company_name=data['recipient']['company'],
+            name=data['recipient']['name'],
+            address=Address(**data['recipient']['address']),
+            email=data['recipient']['email'],
+            phone=data['recipient'].get('phone'),
+            website=data['recipient'].get('website'),
+        )
     recipient = IndividualRecipient(
         name=data['recipient']['name'],
         address=Address(**data['recipient']['address']),
         email=data['recipient']['email'],
-        phone=data['recipient']['phone'],
+        phone=data['recipient'].get('phone'),
+        website=data['recipient'].get('website'),
     )
     return recipient
 
@@ -51,33 +221,92 @@ def extract_lineitems_from_json(data: dict) -> list[LineItem]:
     return items
 
 
-def generate_invoice(data: dict) -> BorbInvoice:
+def invoice_from_json(data: dict, db_path: Path = None) -> InvoiceData:
     """
-    Generate pdf invoice from provided invoice data dictionary.
+    Create an (unnumbered) InvoiceData from an invoice data dictionary.
+    Raises InvoiceValidationError if the data does not match INVOICE_SCHEMA.
     """
+    errors = validate_invoice_json(data)
+    if errors:
+        raise InvoiceValidationError(errors)
 
     invoice_date = datetime.strptime(data['invoice_date'], '%Y-%m-%d')
+    due_date = datetime.strptime(data['due_date'], '%Y-%m-%d') if data.get('due_date') else None
 
-    # create invoice
-    invoice = InvoiceData(
+    return InvoiceData(
         sender=extract_sender_from_json(data),
         recipient=extract_recipient_from_json(data),
         items=extract_lineitems_from_json(data),
         date=invoice_date,
+        due_date=due_date,
         save_folder=Path(data['save_location']),
-        discount=Decimal(data.get('discount', 0)),
-        tax_rate=Decimal(data.get('tax_rate', 0)),
+        discount=Decimal(data.get('discount') or 0),
+        tax_rate=Decimal(data.get('tax_rate') or 0),
         currency=data['currency'],
+        db_path=db_path,
     )
 
-    invoice_with_pdf = build_invoice(
+
+def build_invoice_from_json(data: dict, invoice: InvoiceData) -> BorbInvoice:
+    """
+    Render an InvoiceData with the presentation options (logo, footer, language, style) of an invoice data dictionary.
+    """
+    return build_invoice(
         invoice=invoice,
         logo_path=data.get('logo_path', None),
         footer_text=data.get('footer_text', None),
         language=data['language'],
+        style=data.get('style', None),
     )
 
-    return invoice_with_pdf
+
+def rerender_invoice(invoice_id: int, db_path: Path = invoice_store.DB_PATH) -> BorbInvoice:
+    """
+    Re-render a logged invoice from the snapshot stored with it, with its original number (nothing is logged).
+    Raises LookupError for invoices without a snapshot, e.g. migrated from legacy log files.
+    """
+    data = invoice_store.get_invoice_snapshot(invoice_id, db_path)
+    if data is None:
+        raise LookupError(f"No snapshot stored for invoice id {invoice_id}")
+    invoice = invoice_from_json(data, db_path=db_path)
+    invoice.invoice_number = data['invoice_number']
+    if data.get('style') and Path(data['style']).is_absolute():  # a style Path given by a trusted caller
+        data = {**data, 'style': Path(data['style'])}
+    return build_invoice_from_json(data, invoice)
+
+
+def regenerate_pdf(invoice_row: dict, db_path: Path = invoice_store.DB_PATH) -> bytes:
+    """Re-render the pdf of a logged invoice (a row from invoice_store), for use as archive.write_archive's regenerate."""
+    with contextlib.redirect_stdout(sys.stderr):  # keep warnings out of archives streamed to stdout
+        return rerender_invoice(invoice_row['id'], db_path).to_bytes()
+
+
+def render_numbered_invoice(data: dict, invoice_number: str, db_path: Path = invoice_store.DB_PATH) -> dict:
+    """
+    Render an invoice with a given (reserved) number to a temporary file, without logging it: the render of
+    schedules.run_schedules and of render job workers, which log invoices themselves and only then move the pdf to
+    its final path (see savebatch.move_pdfs), so no pdf is ever saved under a number that isn't logged.
+    Returns the temporary and final paths of the pdf and the record to log, see invoice_store.invoice_record.
+    """
+    with contextlib.redirect_stdout(sys.stderr):
+        invoice = invoice_from_json(data, db_path=db_path)
+        invoice.invoice_number = invoice_number
+        invoice_with_pdf = build_invoice_from_json(data, invoice)
+        save_path = invoice_with_pdf._get_save_path()
+        save_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = write_temp_pdf(invoice_with_pdf, save_path)
+    return {"temp_path": str(temp_path), "path": str(save_path),
+            "record": invoice_store.invoice_record(invoice, invoice_with_pdf.render_options)}
+
+
+def generate_invoice(data: dict) -> BorbInvoice:
+    """
+    Generate pdf invoice from provided invoice data dictionary.
+    Raises InvoiceValidationError if the data does not match INVOICE_SCHEMA.
+    """
+    invoice = invoice_from_json(data)
+    invoice.assign_number()
+    return build_invoice_from_json(data, invoice)
 
 def generate_invoice_and_preview(data: dict) -> None:
     """
@@ -90,5 +319,68 @@ def generate_invoice_and_save(data: dict) -> None:
     """
     Generate and save invoice pdf from data dictionary - without preview.
     """
-    invoice_with_pdf = generate_invoice(data)
-    invoice_with_pdf.save()
+    with trace_peak_memory() as memory:
+        invoice_with_pdf = generate_invoice(data)
+        invoice_with_pdf.save()
+    if memory.peak_bytes is not None:
+        print(f"Rendered invoice {invoice_with_pdf.invoice.invoice_number}: {memory}")
+
+
+def generate_invoices_from_ndjson(stream: TextIO, out: TextIO = None, batch_size: int = NDJSON_BATCH_SIZE) -> int:
+    """
+    Generate and save one invoice per line of newline-delimited json, in a single process.
+    Invoices are saved and logged atomically, batch_size at a time in one transaction (see savebatch), and one json
+    result line per record is written to `out` (default stdout), in input order, once its batch is committed;
+    progress messages are sent to stderr so that `out` only carries results. Results include the peak memory
+    of each render when memory tracing is enabled, see kscinvoicing.pdf.memory.
+    Returns the number of records that failed.
+    """
+    out = out if out is not None else sys.stdout
+    failures = 0
+    batch = SaveBatch()
+    results = []
+
+    def commit() -> None:
+        nonlocal failures
+        try:
+            batch.commit()
+        except Exception as e:
+            for result in results:
+                if result["status"] == "ok":
+                    result.update(status="error", errors=[f"not saved: {e}"])
+                    del result["invoice_number"], result["path"]
+        for result in results:
+            if result["status"] == "error":
+                failures += 1
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+        results.clear()
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        result = {"line": line_number}
+        try:
+            data = json.loads(line)
+            with contextlib.redirect_stdout(sys.stderr), trace_peak_memory() as memory:
+                invoice = invoice_from_json(data)
+                batch.assign_number(invoice)
+                try:
+                    save_path = batch.add(build_invoice_from_json(data, invoice))
+                except BaseException:
+                    invoice.release_number()  # for the next record
+                    raise
+            result.update(status="ok", invoice_number=invoice.invoice_number, path=str(save_path))
+            if memory.peak_bytes is not None:
+                result.update(peak_memory_bytes=memory.peak_bytes)
+        except json.JSONDecodeError as e:
+            result.update(status="error", errors=[f"invalid json: {e.msg}"])
+        except InvoiceValidationError as e:
+            result.update(status="error", errors=e.errors)
+        except Exception as e:
+            result.update(status="error", errors=[str(e)])
+        results.append(result)
+        if len(results) >= batch_size:
+            commit()
+    commit()
+    return failures
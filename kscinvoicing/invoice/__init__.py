@@ -1,3 +1,4 @@
 
-from .invoicedata import LineItem, InvoiceData
+from .invoicedata import LineItem, LineItemBatch, InvoiceData
 from .invoicelogger import InvoiceLogger
+from .totals import Totals, calculate_totals, bulk_calculate_totals
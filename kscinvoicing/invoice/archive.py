@@ -0,0 +1,140 @@
+"""
+Archive bundles of invoice PDFs with a CSV manifest, e.g. to hand over a month of invoices.
+
+Invoices are selected through the invoice store and their PDFs are copied from the save folder straight into a
+single zip or tar.gz stream, so nothing is staged on disk and memory stays constant whatever the number of invoices.
+PDFs missing from the save folder can be regenerated in parallel by a `regenerate` function run on an executor.
+"""
+import csv
+import io
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from datetime import date
+from pathlib import Path
+from typing import BinaryIO, Callable
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.invoice.export import INVOICE_COLUMNS
+from kscinvoicing.invoice.invoicedata import invoice_name
+
+ARCHIVE_FORMATS = ("zip", "tar")
+MANIFEST_NAME = "manifest.csv"
+MANIFEST_COLUMNS = INVOICE_COLUMNS + ["file", "source"]
+
+# regenerate(invoice_row, db_path) -> pdf bytes
+Regenerate = Callable[[dict, Path], bytes]
+
+
+class _ZipWriter:
+    def __init__(self, out: BinaryIO):
+        self._zip = zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def add(self, name: str, data: BinaryIO, size: int) -> None:
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with self._zip.open(info, "w") as member:
+            shutil.copyfileobj(data, member)
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+class _TarWriter:
+    def __init__(self, out: BinaryIO):
+        self._tar = tarfile.open(fileobj=out, mode="w|gz")
+
+    def add(self, name: str, data: BinaryIO, size: int) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(time.time())
+        self._tar.addfile(info, data)
+
+    def close(self) -> None:
+        self._tar.close()
+
+
+def write_archive(
+    out: BinaryIO,
+    folder: Path,
+    db_path: Path = invoice_store.DB_PATH,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    status: str | None = None,
+    fmt: str = "zip",
+    regenerate: Regenerate | None = None,
+    executor: Executor | None = None,
+    workers: int | None = None,
+) -> dict[str, int]:
+    """
+    Write the PDFs of invoices matching the filters, plus a CSV manifest, as a zip or tar.gz archive to a binary
+    stream (which need not be seekable). PDFs are looked up by name in `folder`; missing ones are regenerated on
+    `executor` (by default a pool of `workers` processes) when a `regenerate` function is given, and listed in the
+    manifest as missing otherwise.
+    Returns the number of invoices archived by source: "file", "regenerated" and "missing".
+    """
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unsupported archive format: {fmt}")
+    writer = _ZipWriter(out) if fmt == "zip" else _TarWriter(out)
+    counts = {"file": 0, "regenerated": 0, "missing": 0}
+
+    manifest = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode="w+b")
+    manifest_text = io.TextIOWrapper(manifest, encoding="utf-8", newline="")
+    manifest_writer = csv.DictWriter(manifest_text, fieldnames=MANIFEST_COLUMNS, extrasaction="ignore")
+    manifest_writer.writeheader()
+
+    def record(row: dict, name: str, source: str) -> None:
+        manifest_writer.writerow({**row, "file": name if source != "missing" else "", "source": source})
+        counts[source] += 1
+
+    own_executor = None
+    pending: dict[Future, tuple[dict, str]] = {}
+
+    def collect(futures) -> None:
+        for future in futures:
+            row, name = pending.pop(future)
+            try:
+                pdf = future.result()
+            except Exception as e:
+                print(f"Warning: could not regenerate invoice {row['number']}: {e}", file=sys.stderr)
+                record(row, name, "missing")
+                continue
+            writer.add(name, io.BytesIO(pdf), len(pdf))
+            record(row, name, "regenerated")
+
+    try:
+        for row in invoice_store.iter_invoices(db_path, date_from=date_from, date_to=date_to, status=status):
+            if row["date"] is None:  # migrated from a legacy log, no file name or snapshot to go by
+                record(row, "", "missing")
+                continue
+            name = invoice_name(row["number"], row["client_name"], date.fromisoformat(row["date"])) + ".pdf"
+            path = folder / name
+            if path.is_file():
+                with open(path, "rb") as pdf_file:
+                    writer.add(name, pdf_file, path.stat().st_size)
+                record(row, name, "file")
+            elif regenerate is None:
+                record(row, name, "missing")
+            else:
+                if executor is None:
+                    executor = own_executor = ProcessPoolExecutor(max_workers=workers)
+                pending[executor.submit(regenerate, row, db_path)] = (row, name)
+                # bound the number of rendered PDFs held in memory
+                if len(pending) >= 2 * (workers or 4):
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        collect(wait(pending).done)
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown(cancel_futures=True)
+
+    manifest_text.flush()
+    size = manifest.tell()
+    manifest_text.detach()
+    manifest.seek(0)
+    writer.add(MANIFEST_NAME, manifest, size)
+    writer.close()
+    return counts
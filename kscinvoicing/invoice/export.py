@@ -0,0 +1,70 @@
+"""
+CSV export of invoice history and line items.
+
+Rows are streamed from the invoice store cursor straight into the csv writer,
+so exports run in constant memory whatever the size of the history.
+"""
+import csv
+import io
+import tempfile
+from datetime import date
+from pathlib import Path
+from typing import Callable, TextIO
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+
+INVOICE_COLUMNS = [
+    "number", "date", "due_date", "sender_name", "client_name", "currency",
+    "subtotal", "discount", "tax_rate", "total", "status",
+]
+LINE_ITEM_COLUMNS = [
+    "invoice_number", "date", "client_name", "currency", "description", "quantity", "price_per_unit",
+]
+
+
+def write_invoices_csv(
+    out: TextIO,
+    db_path: Path = invoice_store.DB_PATH,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    status: str | None = None,
+) -> int:
+    """Write invoices matching the filters as CSV to a text stream. Returns the number of rows written."""
+    rows = invoice_store.iter_invoices(db_path, date_from=date_from, date_to=date_to, status=status)
+    return _write_csv(out, INVOICE_COLUMNS, rows)
+
+
+def write_line_items_csv(
+    out: TextIO,
+    db_path: Path = invoice_store.DB_PATH,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    status: str | None = None,
+) -> int:
+    """Write line items of invoices matching the filters as CSV to a text stream. Returns the number of rows written."""
+    rows = invoice_store.iter_line_items(db_path, date_from=date_from, date_to=date_to, status=status)
+    return _write_csv(out, LINE_ITEM_COLUMNS, rows)
+
+
+def spool_csv(write_csv: Callable[..., int], max_memory: int = 1024 * 1024, **kwargs) -> tempfile.SpooledTemporaryFile:
+    """
+    Run one of the write_*_csv functions into a spooled temporary file, rewound and ready to read as bytes.
+    The file stays in memory up to max_memory bytes and rolls over to disk beyond that.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory, mode="w+b")
+    text = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+    write_csv(text, **kwargs)
+    text.flush()
+    text.detach()
+    spool.seek(0)
+    return spool
+
+
+def _write_csv(out: TextIO, columns: list[str], rows) -> int:
+    writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
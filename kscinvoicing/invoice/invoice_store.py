@@ -5,101 +5,550 @@ Manages invoice numbering, history, and payment status tracking.
 DB lives at kscinvoicing_data/invoices.db alongside other app data.
 No Streamlit dependency — independently testable.
 """
+import hashlib
+import io
 import json
+import os
+import re
 import sqlite3
-from datetime import datetime
+import time
+from datetime import datetime, date
 from pathlib import Path
+from typing import BinaryIO, Iterator
 
 DB_PATH = Path("kscinvoicing_data/invoices.db")
+PDF_CHUNK_SIZE = 64 * 1024
+
+# invoice columns returned by queries: all but the (comparatively large) snapshot
+INVOICE_FIELDS = ("id", "number", "date", "due_date", "sender_name", "client_name", "currency",
+                  "subtotal", "discount", "tax_rate", "total", "status")
+_SELECT_INVOICES = "SELECT " + ", ".join(f"invoices.{name}" for name in INVOICE_FIELDS) + " FROM invoices"
+
+
+# ---------------------------------------------------------------------------
+# Schema
+# ---------------------------------------------------------------------------
+
+MIGRATION_BATCH_SIZE = 10_000  # rows backfilled per transaction by migrations of large tables
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    """
+    The tables of databases created before the schema was versioned, which may lack some of them (or the snapshot
+    column), hence IF NOT EXISTS.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS invoices (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            number      TEXT NOT NULL UNIQUE,
+            date        TEXT,
+            due_date    TEXT,
+            sender_name TEXT,
+            client_name TEXT,
+            currency    TEXT,
+            subtotal    REAL,
+            discount    REAL,
+            tax_rate    REAL,
+            total       REAL,
+            status      TEXT NOT NULL DEFAULT 'unpaid',
+            snapshot    BLOB
+        )
+    """)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(invoices)")}
+    if "snapshot" not in columns:  # databases created before snapshots were stored
+        conn.execute("ALTER TABLE invoices ADD COLUMN snapshot BLOB")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS line_items (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            invoice_id     INTEGER NOT NULL REFERENCES invoices(id),
+            description    TEXT,
+            quantity       INTEGER,
+            price_per_unit REAL
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_invoices_status_due_date ON invoices (status, due_date)
+    """)
+    # history pages are ordered by number, and line items are looked up by invoice
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_invoices_number ON invoices (CAST(number AS INTEGER))
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_line_items_invoice_id ON line_items (invoice_id)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pdf_blobs (
+            invoice_id INTEGER PRIMARY KEY REFERENCES invoices(id),
+            sha256     TEXT NOT NULL,
+            size       INTEGER NOT NULL,
+            pdf        BLOB NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key   TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schedules (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_key TEXT NOT NULL,
+            cadence    TEXT NOT NULL,
+            next_run   TEXT NOT NULL,
+            day        INTEGER NOT NULL,
+            template   TEXT NOT NULL
+        )
+    """)
+    # one row per generated period, so a period is never invoiced twice
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schedule_runs (
+            schedule_id INTEGER NOT NULL REFERENCES schedules(id),
+            period      TEXT NOT NULL,
+            invoice_id  INTEGER REFERENCES invoices(id),
+            PRIMARY KEY (schedule_id, period)
+        )
+    """)
+    # render jobs queued for `kscinvoicing worker` processes, see jobqueue
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            payload        TEXT NOT NULL,
+            status         TEXT NOT NULL DEFAULT 'queued',
+            attempts       INTEGER NOT NULL DEFAULT 0,
+            max_attempts   INTEGER NOT NULL,
+            available_at   REAL NOT NULL,
+            lease_owner    TEXT,
+            lease_expires  REAL,
+            invoice_number TEXT,
+            invoice_id     INTEGER REFERENCES invoices(id),
+            path           TEXT,
+            error          TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_status_available_at ON jobs (status, available_at)
+    """)
+
+
+_SEARCH_INDEXES = (("invoices_fts", "client_name", "invoices"), ("line_items_fts", "description", "line_items"))
+
+
+def _create_search_triggers(conn: sqlite3.Connection, table: str, column: str, content: str,
+                            when: str | None = None) -> None:
+    """Triggers keeping an external-content FTS table in sync; deletes and updates only apply to rows matching when."""
+    when = f"WHEN {when}" if when is not None else ""
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {content} BEGIN
+            INSERT INTO {table}(rowid, {column}) VALUES (new.id, new.{column});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {content} {when} BEGIN
+            INSERT INTO {table}({table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {column} ON {content} {when} BEGIN
+            INSERT INTO {table}({table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+            INSERT INTO {table}(rowid, {column}) VALUES (new.id, new.{column});
+        END
+    """)
+
+
+def _backfill_state(conn: sqlite3.Connection, table: str) -> tuple[int, int] | None:
+    """(last id indexed, last id to index) of a search index being backfilled, None if it isn't."""
+    rows = dict(conn.execute("SELECT key, value FROM app_meta WHERE key IN (?, ?)",
+                             (f"{table}_backfilled", f"{table}_backfill_until")).fetchall())
+    if len(rows) < 2:
+        return None
+    return int(rows[f"{table}_backfilled"]), int(rows[f"{table}_backfill_until"])
+
+
+def _create_search_index(conn: sqlite3.Connection) -> None:
+    """
+    Create the FTS5 full-text index over client names and line item descriptions.
+    Both FTS tables are external-content tables kept in sync by triggers. Existing rows are indexed
+    MIGRATION_BATCH_SIZE at a time, each batch committed with its progress (in app_meta), so that indexing a large
+    DB doesn't lock it for long and resumes where it stopped if interrupted. Until then, the triggers leave the
+    deletes and updates of rows not indexed yet to the backfill.
+    """
+    for table, column, content in _SEARCH_INDEXES:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,)).fetchone() is not None
+        if exists and _backfill_state(conn, table) is None:
+            continue  # built in one go before the schema was versioned, or by another process
+        if not exists:
+            until = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {content}").fetchone()[0]
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE {table} USING fts5(
+                    {column}, content='{content}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+            conn.executemany("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)",
+                             [(f"{table}_backfilled", 0), (f"{table}_backfill_until", until)])
+            _create_search_triggers(conn, table, column, content, when=(
+                f"old.id > {until} OR old.id <= "
+                f"CAST((SELECT value FROM app_meta WHERE key = '{table}_backfilled') AS INTEGER)"
+            ))
+        while (state := _backfill_state(conn, table)) is not None and state[0] < state[1]:
+            done, until = state
+            last = min(done + MIGRATION_BATCH_SIZE, until)
+            conn.execute(f"INSERT INTO {table}(rowid, {column}) SELECT id, {column} FROM {content} "
+                         f"WHERE id > ? AND id <= ?", (done, last))
+            conn.execute("UPDATE app_meta SET value = ? WHERE key = ?", (last, f"{table}_backfilled"))
+            conn.execute("COMMIT")
+            conn.execute("BEGIN IMMEDIATE")
+        # every row is indexed: replace the triggers by unconditional ones
+        conn.execute(f"DROP TRIGGER IF EXISTS {table}_ad")
+        conn.execute(f"DROP TRIGGER IF EXISTS {table}_au")
+        _create_search_triggers(conn, table, column, content)
+        conn.execute("DELETE FROM app_meta WHERE key IN (?, ?)",
+                     (f"{table}_backfilled", f"{table}_backfill_until"))
+
+
+def _create_date_index(conn: sqlite3.Connection) -> None:
+    # exports and archives select invoices by date range
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices (date)")
+
+
+def _create_number_reservations(conn: sqlite3.Connection) -> None:
+    # invoice numbers taken by invoices being rendered, see reserve_invoice_numbers
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS number_reservations (
+            number  TEXT PRIMARY KEY,
+            expires REAL
+        )
+    """)
+
+
+def _reserve_job_numbers(conn: sqlite3.Connection) -> None:
+    # render jobs reserve their numbers like other invoices; failed jobs give theirs back (see fail_job)
+    conn.execute("""
+        INSERT OR IGNORE INTO number_reservations (number, expires)
+        SELECT invoice_number, CASE WHEN status = 'failed' THEN 0 END FROM jobs
+        WHERE status IN ('queued', 'running', 'failed') AND invoice_number IS NOT NULL
+    """)
+    conn.execute("UPDATE jobs SET invoice_number = NULL WHERE status = 'failed'")
+
+
+# Schema migrations, in order: a DB at version n (its PRAGMA user_version) has had the first n applied.
+# Append new ones, never edit or reorder them.
+_MIGRATIONS = (
+    _create_tables,
+    _create_search_index,
+    _create_date_index,
+    _create_number_reservations,
+    _reserve_job_numbers,
+)
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+_current_schemas: set[tuple] = set()
+
+
+def _schema_key(db_path: Path) -> tuple | None:
+    """Identifies a DB file, even if deleted and recreated at the same path. None if it doesn't exist."""
+    try:
+        stat = db_path.stat()
+    except FileNotFoundError:
+        return None
+    return db_path.resolve(), stat.st_dev, stat.st_ino
 
 
 def init_db(db_path: Path = DB_PATH) -> None:
-    """Create tables if they don't exist."""
+    """
+    Create the DB, or bring its schema up to date by running the migrations it hasn't had yet, each in its own
+    transaction (see _MIGRATIONS). A DB is only checked once per process, and a current one costs a single
+    PRAGMA read and no DDL, so this is safe to call whenever the DB is about to be used.
+    """
+    if _schema_key(db_path) in _current_schemas:
+        return
     db_path.parent.mkdir(exist_ok=True)
-    with sqlite3.connect(db_path) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS invoices (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                number      TEXT NOT NULL UNIQUE,
-                date        TEXT,
-                due_date    TEXT,
-                sender_name TEXT,
-                client_name TEXT,
-                currency    TEXT,
-                subtotal    REAL,
-                discount    REAL,
-                tax_rate    REAL,
-                total       REAL,
-                status      TEXT NOT NULL DEFAULT 'unpaid'
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS line_items (
-                id             INTEGER PRIMARY KEY AUTOINCREMENT,
-                invoice_id     INTEGER NOT NULL REFERENCES invoices(id),
-                description    TEXT,
-                quantity       INTEGER,
-                price_per_unit REAL
-            )
-        """)
-        conn.commit()
+    conn = sqlite3.connect(db_path, timeout=JOB_DB_TIMEOUT, isolation_level=None)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"Invoice DB '{db_path}' has schema version {version}, newer than this version of "
+                               f"kscinvoicing supports ({SCHEMA_VERSION}); please upgrade.")
+        for number, migration in enumerate(_MIGRATIONS[version:], start=version + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # another process may have migrated the DB since it was checked
+                if conn.execute("PRAGMA user_version").fetchone()[0] < number:
+                    migration(conn)
+                    conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+    _current_schemas.add(_schema_key(db_path))
+
+
+# ---------------------------------------------------------------------------
+# Invoices
+# ---------------------------------------------------------------------------
+
+RESERVATION_SECONDS = 3600  # how long a reserved invoice number waits to be logged before it's handed out again
+
+
+def _last_invoice_number(conn: sqlite3.Connection) -> int:
+    row = conn.execute("""
+        SELECT MAX(number) FROM (
+            SELECT MAX(CAST(number AS INTEGER)) AS number FROM invoices
+            UNION ALL
+            SELECT MAX(CAST(number AS INTEGER)) FROM number_reservations
+        )
+    """).fetchone()
+    return row[0] if row[0] is not None else 0
+
+
+def _free_numbers(conn: sqlite3.Connection, count: int, now: float) -> list[str]:
+    """Reserved numbers given back or whose reservation expired, lowest first."""
+    rows = conn.execute(
+        "SELECT number FROM number_reservations WHERE expires <= ? ORDER BY CAST(number AS INTEGER) LIMIT ?",
+        (now, count),
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def _next_invoice_number(conn: sqlite3.Connection, now: float | None = None) -> str:
+    now = time.time() if now is None else now
+    free = _free_numbers(conn, 1, now)
+    return free[0] if free else f"{_last_invoice_number(conn) + 1:04}"
+
+
+def _reserve_invoice_numbers(conn: sqlite3.Connection, count: int, expires: float | None,
+                             now: float | None = None) -> list[str]:
+    """Reserve count numbers until expires (None: until logged or released), within a BEGIN IMMEDIATE transaction."""
+    now = time.time() if now is None else now
+    numbers = _free_numbers(conn, count, now)
+    last = _last_invoice_number(conn)
+    numbers += [f"{last + i:04}" for i in range(1, count - len(numbers) + 1)]
+    conn.executemany("INSERT OR REPLACE INTO number_reservations (number, expires) VALUES (?, ?)",
+                     [(number, expires) for number in numbers])
+    return numbers
 
 
 def get_next_invoice_number(db_path: Path = DB_PATH) -> str:
-    """Return the next invoice number as a zero-padded 4-digit string."""
+    """Return the next invoice number as a zero-padded 4-digit string, without reserving it."""
     with sqlite3.connect(db_path) as conn:
-        row = conn.execute(
-            "SELECT MAX(CAST(number AS INTEGER)) FROM invoices"
-        ).fetchone()
-        prev = row[0] if row[0] is not None else 0
-        return f"{prev + 1:04}"
+        return _next_invoice_number(conn)
+
+
+def reserve_invoice_numbers(count: int = 1, db_path: Path = DB_PATH, seconds: float = RESERVATION_SECONDS,
+                            now: float | None = None) -> list[str]:
+    """
+    Reserve the next count invoice numbers for invoices about to be rendered, so that no other process (the web UI,
+    the CLI, the rendering API, schedules or render job workers) takes them. A reservation ends when its invoice is
+    logged (see log_invoices) or the number is given back (see release_invoice_numbers); numbers given back, or
+    not logged within `seconds`, are handed out again first, so failed renders leave no gap in the numbering.
+    """
+    now = time.time() if now is None else now
+    conn = _job_connection(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        numbers = _reserve_invoice_numbers(conn, count, now + seconds, now)
+        conn.execute("COMMIT")
+        return numbers
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
 
 
-def log_invoice(invoice_data, db_path: Path = DB_PATH) -> int:
-    """Insert invoice and its line items into the DB. Returns the new invoice row id."""
+def _release_invoice_numbers(conn: sqlite3.Connection, numbers: list[str]) -> None:
+    conn.executemany("UPDATE number_reservations SET expires = 0 WHERE number = ?", [(number,) for number in numbers])
+
+
+def release_invoice_numbers(numbers: list[str], db_path: Path = DB_PATH) -> None:
+    """Give back reserved numbers whose invoices won't be logged, to be reserved again first."""
+    with sqlite3.connect(db_path, timeout=JOB_DB_TIMEOUT) as conn:
+        _release_invoice_numbers(conn, numbers)
+        conn.commit()
+
+
+def invoice_record(invoice_data, render_options: dict | None = None) -> dict:
+    """
+    The values logged for a numbered invoice: its invoices row (with the snapshot) and line items.
+    Records are plain data, so they can be prepared in worker processes and logged together, see log_invoices.
+    """
+    from kscinvoicing.invoice.invoicedata import line_item_rows
+    from kscinvoicing.invoice.snapshot import encode_snapshot, invoice_to_json
+    totals = invoice_data.totals
+    return {
+        "invoice": (
+            invoice_data.invoice_number,
+            invoice_data.date.strftime("%Y-%m-%d"),
+            invoice_data.due_date.strftime("%Y-%m-%d") if invoice_data.due_date else None,
+            invoice_data.sender.name,
+            invoice_data.recipient.name,
+            invoice_data.currency,
+            float(totals.subtotal),
+            float(totals.discount),
+            float(invoice_data.tax_rate),
+            float(totals.total),
+            encode_snapshot(invoice_to_json(invoice_data, render_options)),
+        ),
+        "line_items": [
+            (description, quantity, float(price_per_unit))
+            for description, quantity, price_per_unit, _ in line_item_rows(invoice_data.items)
+        ],
+    }
+
+
+def _insert_invoice(conn: sqlite3.Connection, record: dict) -> int:
+    cur = conn.execute(
+        """
+        INSERT INTO invoices
+            (number, date, due_date, sender_name, client_name, currency,
+             subtotal, discount, tax_rate, total, status, snapshot)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'unpaid', ?)
+        """,
+        record["invoice"],
+    )
+    invoice_id = cur.lastrowid
+    conn.execute("DELETE FROM number_reservations WHERE number = ?", (record["invoice"][0],))
+    conn.executemany(
+        "INSERT INTO line_items (invoice_id, description, quantity, price_per_unit) VALUES (?, ?, ?, ?)",
+        ((invoice_id, *item) for item in record["line_items"]),
+    )
+    return invoice_id
+
+
+def log_invoice(invoice_data, db_path: Path = DB_PATH, render_options: dict | None = None) -> int:
+    """
+    Insert invoice and its line items into the DB. Returns the new invoice row id.
+    A snapshot of the invoice and its render_options (the presentation arguments of build_invoice) is stored
+    with it, so the invoice can be re-rendered later, see get_invoice_snapshot.
+    """
     with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(
-            """
-            INSERT INTO invoices
-                (number, date, due_date, sender_name, client_name, currency,
-                 subtotal, discount, tax_rate, total, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'unpaid')
-            """,
-            (
-                invoice_data.invoice_number,
-                invoice_data.date.strftime("%Y-%m-%d"),
-                invoice_data.due_date.strftime("%Y-%m-%d") if invoice_data.due_date else None,
-                invoice_data.sender.name,
-                invoice_data.recipient.name,
-                invoice_data.currency,
-                float(invoice_data.subtotal),
-                float(invoice_data.discount),
-                float(invoice_data.tax_rate),
-                float(invoice_data.total),
-            ),
-        )
-        invoice_id = cur.lastrowid
-        conn.executemany(
-            "INSERT INTO line_items (invoice_id, description, quantity, price_per_unit) VALUES (?, ?, ?, ?)",
-            [
-                (invoice_id, item.description, item.quantity, float(item.price_per_unit))
-                for item in invoice_data.items
-            ],
-        )
+        invoice_id = _insert_invoice(conn, invoice_record(invoice_data, render_options))
         conn.commit()
         return invoice_id
 
 
+def log_invoices(records: list[dict], db_path: Path = DB_PATH,
+                 schedule_runs: list[tuple[int, str, str]] | None = None) -> list[int]:
+    """
+    Insert several invoices (see invoice_record) in one transaction. Returns their row ids, in order.
+    schedule_runs gives, for each record, the (schedule id, period, next run date) it was generated for: the period
+    is marked as generated and the schedule moved on to its next run in the same transaction, see schedules.
+    """
+    with sqlite3.connect(db_path) as conn:
+        invoice_ids = [_insert_invoice(conn, record) for record in records]
+        if schedule_runs is not None:
+            conn.executemany(
+                "INSERT INTO schedule_runs (schedule_id, period, invoice_id) VALUES (?, ?, ?)",
+                [(schedule_id, period, invoice_id)
+                 for (schedule_id, period, _), invoice_id in zip(schedule_runs, invoice_ids)],
+            )
+            conn.executemany("UPDATE schedules SET next_run = ? WHERE id = ?",
+                             [(next_run, schedule_id) for schedule_id, _, next_run in schedule_runs])
+        conn.commit()
+        return invoice_ids
+
+
 def get_all_invoices(db_path: Path = DB_PATH) -> list[dict]:
     """Return all invoices ordered by invoice number descending."""
     with sqlite3.connect(db_path) as conn:
         conn.row_factory = sqlite3.Row
         rows = conn.execute(
-            "SELECT * FROM invoices ORDER BY CAST(number AS INTEGER) DESC"
+            f"{_SELECT_INVOICES} ORDER BY CAST(number AS INTEGER) DESC"
         ).fetchall()
         return [dict(row) for row in rows]
 
 
+def get_invoices_page(offset: int = 0, limit: int = 50, status: str | None = None,
+                      db_path: Path = DB_PATH) -> list[dict]:
+    """Return one page of invoices (newest number first), optionally filtered by status."""
+    where, params = _invoice_filters(None, None, status)
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            f"{_SELECT_INVOICES} {where} ORDER BY CAST(number AS INTEGER) DESC LIMIT ? OFFSET ?",
+            [*params, limit, offset],
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def summarize_invoices(status: str | None = None, db_path: Path = DB_PATH) -> dict:
+    """Number of invoices and sum of their totals, optionally filtered by status: {"count": int, "total": float}."""
+    where, params = _invoice_filters(None, None, status)
+    with sqlite3.connect(db_path) as conn:
+        count, total = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(total), 0) FROM invoices {where}",
+                                    params).fetchone()
+        return {"count": count, "total": total}
+
+
+def _invoice_filters(date_from: date | None, date_to: date | None, status: str | None,
+                     table: str = "invoices") -> tuple[str, list]:
+    """Build a WHERE clause (possibly empty) and its parameters for the common invoice filters."""
+    clauses, params = [], []
+    if date_from is not None:
+        clauses.append(f"{table}.date >= ?")
+        params.append(date_from.strftime("%Y-%m-%d"))
+    if date_to is not None:
+        clauses.append(f"{table}.date <= ?")
+        params.append(date_to.strftime("%Y-%m-%d"))
+    if status is not None:
+        clauses.append(f"{table}.status = ?")
+        params.append(status)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def _iter_rows(db_path: Path, sql: str, params: list, batch_size: int) -> Iterator[dict]:
+    """Yield rows of a query as dicts, fetching from the cursor in batches of batch_size."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.row_factory = sqlite3.Row
+        cur = conn.execute(sql, params)
+        while rows := cur.fetchmany(batch_size):
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+
+def iter_invoices(
+    db_path: Path = DB_PATH,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    status: str | None = None,
+    batch_size: int = 500,
+) -> Iterator[dict]:
+    """
+    Yield invoices in ascending number order, filtered by date range (inclusive) and status.
+    Unlike get_all_invoices, rows are streamed from the cursor so memory does not grow with history size.
+    """
+    where, params = _invoice_filters(date_from, date_to, status)
+    sql = f"{_SELECT_INVOICES} {where} ORDER BY CAST(number AS INTEGER)"
+    return _iter_rows(db_path, sql, params, batch_size)
+
+
+def iter_line_items(
+    db_path: Path = DB_PATH,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    status: str | None = None,
+    batch_size: int = 500,
+) -> Iterator[dict]:
+    """Yield line items joined with their invoice's number, date, client and currency, filtered like iter_invoices."""
+    where, params = _invoice_filters(date_from, date_to, status)
+    sql = f"""
+        SELECT invoices.number AS invoice_number, invoices.date, invoices.client_name, invoices.currency,
+               line_items.description, line_items.quantity, line_items.price_per_unit
+        FROM line_items JOIN invoices ON invoices.id = line_items.invoice_id
+        {where}
+        ORDER BY CAST(invoices.number AS INTEGER), line_items.id
+    """
+    return _iter_rows(db_path, sql, params, batch_size)
+
+
 def get_invoice_line_items(invoice_id: int, db_path: Path = DB_PATH) -> list[dict]:
     """Return line items for a given invoice."""
     with sqlite3.connect(db_path) as conn:
@@ -110,6 +559,100 @@ def get_invoice_line_items(invoice_id: int, db_path: Path = DB_PATH) -> list[dic
         return [dict(row) for row in rows]
 
 
+def get_line_items_for_invoices(invoice_ids: list[int], db_path: Path = DB_PATH) -> dict[int, list[dict]]:
+    """Return the line items of several invoices in one query, by invoice id."""
+    items = {invoice_id: [] for invoice_id in invoice_ids}
+    if not items:
+        return items
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            f"SELECT * FROM line_items WHERE invoice_id IN ({', '.join('?' * len(items))}) ORDER BY id",
+            list(items),
+        ).fetchall()
+    for row in rows:
+        items[row["invoice_id"]].append(dict(row))
+    return items
+
+
+def get_invoice_by_number(number: str, db_path: Path = DB_PATH) -> dict | None:
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(f"{_SELECT_INVOICES} WHERE number = ?", (number,)).fetchone()
+        return dict(row) if row is not None else None
+
+
+def get_invoice_snapshot(invoice_id: int, db_path: Path = DB_PATH) -> dict | None:
+    """
+    Return the snapshot stored with an invoice: its invoice json data (see generate_invoice_from_json) with
+    the invoice number. None for invoices logged without one, e.g. migrated from legacy log files.
+    """
+    from kscinvoicing.invoice.snapshot import decode_snapshot
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute("SELECT snapshot FROM invoices WHERE id = ?", (invoice_id,)).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return decode_snapshot(row[0])
+
+
+def _fts_terms(query: str) -> list[str]:
+    """Split a free-text query into FTS5 prefix terms, quoted so user input can't inject FTS syntax."""
+    return [f'"{word}"*' for word in re.findall(r"\w+", query)]
+
+
+def _search_sql(terms: list[str], status: str | None) -> tuple[str, list]:
+    """The grouped query selecting the invoices matching every search term, and its parameters."""
+    term_matches = """
+        SELECT rowid AS invoice_id, rank, {i} AS term FROM invoices_fts WHERE invoices_fts MATCH ?
+        UNION ALL
+        SELECT line_items.invoice_id, line_items_fts.rank, {i} AS term
+        FROM line_items_fts JOIN line_items ON line_items.id = line_items_fts.rowid
+        WHERE line_items_fts MATCH ?
+    """
+    matches = " UNION ALL ".join(term_matches.format(i=i) for i in range(len(terms)))
+    where, filter_params = _invoice_filters(None, None, status)
+    sql = f"""
+        WITH matches AS ({matches}),
+             best AS (SELECT invoice_id, term, MIN(rank) AS rank FROM matches GROUP BY invoice_id, term)
+        {_SELECT_INVOICES} JOIN best ON invoices.id = best.invoice_id
+        {where}
+        GROUP BY best.invoice_id
+        HAVING COUNT(*) = ?
+    """
+    return sql, [term for term in terms for _ in range(2)] + filter_params + [len(terms)]
+
+
+def search_invoices(query: str, limit: int = 20, status: str | None = None, offset: int = 0,
+                    db_path: Path = DB_PATH) -> list[dict]:
+    """
+    Full-text search over client names and line item descriptions, optionally filtered by status.
+    Every word of the query must match (as a prefix) either the client name or one of the invoice's line items.
+    Returns one page of invoices ranked by relevance (bm25), best match first; see summarize_search for the total.
+    """
+    terms = _fts_terms(query)
+    if not terms:
+        return []
+    sql, params = _search_sql(terms, status)
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            f"{sql} ORDER BY SUM(best.rank), CAST(invoices.number AS INTEGER) DESC LIMIT ? OFFSET ?",
+            [*params, limit, offset],
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def summarize_search(query: str, status: str | None = None, db_path: Path = DB_PATH) -> dict:
+    """Number of invoices matching a search (see search_invoices) and sum of their totals, like summarize_invoices."""
+    terms = _fts_terms(query)
+    if not terms:
+        return {"count": 0, "total": 0}
+    sql, params = _search_sql(terms, status)
+    with sqlite3.connect(db_path) as conn:
+        count, total = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(total), 0) FROM ({sql})", params).fetchone()
+        return {"count": count, "total": total}
+
+
 def update_invoice_status(invoice_id: int, status: str, db_path: Path = DB_PATH) -> None:
     """Update the payment status of an invoice. status: 'unpaid' | 'paid' | 'overdue'"""
     with sqlite3.connect(db_path) as conn:
@@ -117,12 +660,418 @@ def update_invoice_status(invoice_id: int, status: str, db_path: Path = DB_PATH)
         conn.commit()
 
 
+def update_invoices_status(invoice_ids: list[int], status: str, db_path: Path = DB_PATH) -> int:
+    """Update the payment status of several invoices in one transaction. Returns the number updated."""
+    with sqlite3.connect(db_path) as conn:
+        updated = conn.executemany("UPDATE invoices SET status = ? WHERE id = ?",
+                                   [(status, invoice_id) for invoice_id in invoice_ids]).rowcount
+        conn.commit()
+        return updated
+
+
+def _mark_overdue(conn: sqlite3.Connection, today: date) -> int:
+    return conn.execute(
+        "UPDATE invoices SET status = 'overdue' WHERE status = 'unpaid' AND due_date < ?",
+        (today.strftime("%Y-%m-%d"),),
+    ).rowcount
+
+
+def mark_overdue_invoices(today: date | None = None, db_path: Path = DB_PATH) -> int:
+    """
+    Flip every unpaid invoice whose due date has passed to 'overdue' in a single UPDATE.
+    Uses the (status, due_date) index. Returns the number of invoices updated.
+    """
+    with sqlite3.connect(db_path) as conn:
+        updated = _mark_overdue(conn, today or date.today())
+        conn.commit()
+        return updated
+
+
+_last_overdue_sweep: dict[Path, date] = {}
+
+
+def run_overdue_sweep(today: date | None = None, db_path: Path = DB_PATH) -> int:
+    """
+    Run mark_overdue_invoices at most once per day per database.
+    The last sweep date is remembered in the process and in the app_meta table, so calling this on every
+    app start, rerun or CLI invocation costs nothing once the day's sweep is done.
+    Returns the number of invoices updated (0 when the sweep was skipped).
+    """
+    today = today or date.today()
+    if _last_overdue_sweep.get(db_path) == today:
+        return 0
+    today_str = today.strftime("%Y-%m-%d")
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = 'last_overdue_sweep'").fetchone()
+        if row is not None and row[0] == today_str:
+            updated = 0
+        else:
+            updated = _mark_overdue(conn, today)
+            conn.execute(
+                "INSERT OR REPLACE INTO app_meta (key, value) VALUES ('last_overdue_sweep', ?)", (today_str,)
+            )
+        conn.commit()
+    _last_overdue_sweep[db_path] = today
+    return updated
+
+
 def delete_invoice(invoice_id: int, db_path: Path = DB_PATH) -> None:
     """Delete an invoice and its line items from the DB."""
+    delete_invoices([invoice_id], db_path)
+
+
+def delete_invoices(invoice_ids: list[int], db_path: Path = DB_PATH) -> None:
+    """Delete several invoices, with their line items and stored pdfs, in one transaction."""
+    params = [(invoice_id,) for invoice_id in invoice_ids]
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("DELETE FROM line_items WHERE invoice_id = ?", params)
+        conn.executemany("DELETE FROM pdf_blobs WHERE invoice_id = ?", params)
+        # the schedule periods they were generated for stay marked as generated
+        conn.executemany("UPDATE schedule_runs SET invoice_id = NULL WHERE invoice_id = ?", params)
+        conn.executemany("UPDATE jobs SET invoice_id = NULL WHERE invoice_id = ?", params)
+        conn.executemany("DELETE FROM invoices WHERE id = ?", params)
+        conn.commit()
+
+
+# ---------------------------------------------------------------------------
+# Recurring schedules
+# ---------------------------------------------------------------------------
+
+_SCHEDULE_FIELDS = "id, client_key, cadence, next_run, day, template"
+
+
+def _schedule(row: sqlite3.Row) -> dict:
+    return {**dict(row), "template": json.loads(row["template"])}
+
+
+def add_schedule(client_key: str, cadence: str, next_run: date, day: int, template: dict,
+                 db_path: Path = DB_PATH) -> int:
+    """
+    Store a recurring invoice schedule, see schedules.add_schedule. template holds the invoice json fields that
+    don't come from the sender and client profiles (line items, currency...). Returns the schedule id.
+    """
+    with sqlite3.connect(db_path) as conn:
+        cur = conn.execute(
+            "INSERT INTO schedules (client_key, cadence, next_run, day, template) VALUES (?, ?, ?, ?, ?)",
+            (client_key, cadence, next_run.strftime("%Y-%m-%d"), day, json.dumps(template, ensure_ascii=False)),
+        )
+        conn.commit()
+        return cur.lastrowid
+
+
+def get_schedules(db_path: Path = DB_PATH) -> list[dict]:
+    """Return all schedules, with their template decoded."""
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f"SELECT {_SCHEDULE_FIELDS} FROM schedules ORDER BY id").fetchall()
+        return [_schedule(row) for row in rows]
+
+
+def get_due_schedules(today: date, db_path: Path = DB_PATH) -> list[dict]:
+    """Return the schedules with a run due on or before today, with the periods they already generated."""
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(f"SELECT {_SCHEDULE_FIELDS} FROM schedules WHERE next_run <= ? ORDER BY id",
+                            (today.strftime("%Y-%m-%d"),)).fetchall()
+        schedules = {row["id"]: {**_schedule(row), "periods": set()} for row in rows}
+        if schedules:
+            for schedule_id, period in conn.execute(
+                f"SELECT schedule_id, period FROM schedule_runs "
+                f"WHERE schedule_id IN ({', '.join('?' * len(schedules))})",
+                list(schedules),
+            ):
+                schedules[schedule_id]["periods"].add(period)
+        return list(schedules.values())
+
+
+def set_schedules_next_run(next_runs: dict[int, str], db_path: Path = DB_PATH) -> None:
+    """Move schedules (by id) on to their next run date, e.g. past periods that were already generated."""
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("UPDATE schedules SET next_run = ? WHERE id = ?",
+                         [(next_run, schedule_id) for schedule_id, next_run in next_runs.items()])
+        conn.commit()
+
+
+def delete_schedule(schedule_id: int, db_path: Path = DB_PATH) -> bool:
+    """Delete a schedule and its run history (generated invoices are kept). Returns False if it didn't exist."""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DELETE FROM schedule_runs WHERE schedule_id = ?", (schedule_id,))
+        deleted = conn.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,)).rowcount
+        conn.commit()
+        return deleted > 0
+
+
+# ---------------------------------------------------------------------------
+# Render jobs
+# ---------------------------------------------------------------------------
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+JOB_DB_TIMEOUT = 30  # seconds to wait for the write lock, shared by all worker processes
+
+
+def _job_connection(db_path: Path) -> sqlite3.Connection:
+    """A connection in autocommit mode, for explicit BEGIN IMMEDIATE transactions between worker processes."""
+    conn = sqlite3.connect(db_path, timeout=JOB_DB_TIMEOUT, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _job(row: sqlite3.Row) -> dict:
+    return {**dict(row), "payload": json.loads(row["payload"])}
+
+
+def enqueue_jobs(payloads: list[dict], max_attempts: int = 3, db_path: Path = DB_PATH,
+                 now: float | None = None) -> list[int]:
+    """Queue render jobs for invoice json payloads in one transaction, see jobqueue.enqueue. Returns the job ids."""
+    now = time.time() if now is None else now
+    with sqlite3.connect(db_path, timeout=JOB_DB_TIMEOUT) as conn:
+        job_ids = [
+            conn.execute("INSERT INTO jobs (payload, max_attempts, available_at) VALUES (?, ?, ?)",
+                         (json.dumps(payload, ensure_ascii=False), max_attempts, now)).lastrowid
+            for payload in payloads
+        ]
+        conn.commit()
+        return job_ids
+
+
+def claim_job(worker_id: str, lease_seconds: float, db_path: Path = DB_PATH, now: float | None = None) -> dict | None:
+    """
+    Lease the oldest job that is queued and available, or running with an expired lease (its worker died), to
+    worker_id. A job reserves the next invoice number on its first claim (see reserve_invoice_numbers) and keeps
+    it across retries, until it is done or failed.
+    Jobs whose lease expired on their last attempt are failed instead. Returns the job, or None if none is ready.
+    """
+    now = time.time() if now is None else now
+    conn = _job_connection(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        lost = conn.execute(
+            "SELECT id FROM jobs WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+            (now,),
+        ).fetchall()
+        for row in lost:
+            _give_up_job(conn, row["id"], "worker lost its lease")
+        row = conn.execute(
+            """
+            SELECT id, invoice_number FROM jobs
+            WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires < ?)
+            ORDER BY id LIMIT 1
+            """,
+            (now, now),
+        ).fetchone()
+        job = None
+        if row is not None:
+            job = conn.execute(
+                """
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires = ?,
+                                invoice_number = ?
+                WHERE id = ? RETURNING *
+                """,
+                (worker_id, now + lease_seconds,
+                 row["invoice_number"] or _reserve_invoice_numbers(conn, 1, None, now)[0], row["id"]),
+            ).fetchone()
+        conn.execute("COMMIT")
+        return _job(job) if job is not None else None
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def complete_job(job_id: int, worker_id: str, record: dict, path: str, db_path: Path = DB_PATH) -> bool:
+    """
+    Log the invoice rendered by a job (see invoice_record) and mark the job done, in one transaction, so a job is
+    logged exactly once. Returns False, logging nothing, if worker_id no longer holds the job's lease.
+    """
+    conn = _job_connection(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        leased = conn.execute("SELECT 1 FROM jobs WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                              (job_id, worker_id)).fetchone()
+        if leased is None:
+            conn.execute("ROLLBACK")
+            return False
+        invoice_id = _insert_invoice(conn, record)
+        conn.execute(
+            """
+            UPDATE jobs SET status = 'done', invoice_id = ?, path = ?, error = NULL,
+                            lease_owner = NULL, lease_expires = NULL
+            WHERE id = ?
+            """,
+            (invoice_id, path, job_id),
+        )
+        conn.execute("COMMIT")
+        return True
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _give_up_job(conn: sqlite3.Connection, job_id: int, error: str) -> None:
+    """Fail a job for good, giving back its invoice number so that it doesn't leave a gap in the numbering."""
+    number = conn.execute("SELECT invoice_number FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    conn.execute(
+        """
+        UPDATE jobs SET status = 'failed', error = ?, invoice_number = NULL, lease_owner = NULL, lease_expires = NULL
+        WHERE id = ?
+        """,
+        (error, job_id),
+    )
+    if number is not None:
+        _release_invoice_numbers(conn, [number])
+
+
+def fail_job(job_id: int, worker_id: str, error: str, retry_at: float, db_path: Path = DB_PATH) -> str | None:
+    """
+    Record a failed attempt of a job leased by worker_id: it is queued again from retry_at, or failed once it has
+    used all its attempts (giving back its invoice number). Returns the job's new status, None if worker_id no
+    longer holds its lease.
+    """
+    conn = _job_connection(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT attempts < max_attempts FROM jobs WHERE id = ? AND status = 'running' AND lease_owner = ?",
+            (job_id, worker_id),
+        ).fetchone()
+        if row is None:
+            conn.execute("ROLLBACK")
+            return None
+        if row[0]:
+            conn.execute(
+                """
+                UPDATE jobs SET status = 'queued', available_at = ?, error = ?,
+                                lease_owner = NULL, lease_expires = NULL
+                WHERE id = ?
+                """,
+                (retry_at, error, job_id),
+            )
+        else:
+            _give_up_job(conn, job_id, error)
+        conn.execute("COMMIT")
+        return "queued" if row[0] else "failed"
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def release_job(job_id: int, worker_id: str, db_path: Path = DB_PATH) -> None:
+    """Give back a job leased by worker_id without counting the attempt, e.g. when the worker is stopped."""
+    with sqlite3.connect(db_path, timeout=JOB_DB_TIMEOUT) as conn:
+        conn.execute(
+            """
+            UPDATE jobs SET status = 'queued', attempts = attempts - 1, lease_owner = NULL, lease_expires = NULL
+            WHERE id = ? AND status = 'running' AND lease_owner = ?
+            """,
+            (job_id, worker_id),
+        )
+        conn.commit()
+
+
+def retry_job(job_id: int, db_path: Path = DB_PATH, now: float | None = None) -> bool:
+    """Queue a failed job again, with all its attempts and a new invoice number. False if not failed."""
+    now = time.time() if now is None else now
+    with sqlite3.connect(db_path, timeout=JOB_DB_TIMEOUT) as conn:
+        updated = conn.execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ? WHERE id = ? AND status = 'failed'",
+            (now, job_id),
+        ).rowcount
+        conn.commit()
+        return updated > 0
+
+
+def get_job(job_id: int, db_path: Path = DB_PATH) -> dict | None:
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row is not None else None
+
+
+def get_jobs(status: str | None = None, limit: int = 50, db_path: Path = DB_PATH) -> list[dict]:
+    """Return the most recent jobs (without their payload), optionally filtered by status."""
+    where, params = ("WHERE status = ?", [status]) if status is not None else ("", [])
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            f"""
+            SELECT id, status, attempts, max_attempts, invoice_number, path, error FROM jobs {where}
+            ORDER BY id DESC LIMIT ?
+            """,
+            [*params, limit],
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def count_jobs(db_path: Path = DB_PATH) -> dict[str, int]:
+    """Number of jobs by status."""
+    counts = dict.fromkeys(JOB_STATUSES, 0)
     with sqlite3.connect(db_path) as conn:
-        conn.execute("DELETE FROM line_items WHERE invoice_id = ?", (invoice_id,))
-        conn.execute("DELETE FROM invoices WHERE id = ?", (invoice_id,))
+        counts.update(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+    return counts
+
+
+# ---------------------------------------------------------------------------
+# PDF blobs
+# ---------------------------------------------------------------------------
+
+def store_pdf(invoice_id: int, pdf: bytes | BinaryIO, db_path: Path = DB_PATH,
+              chunk_size: int = PDF_CHUNK_SIZE) -> str:
+    """
+    Store the rendered pdf of an invoice in the DB, replacing any previous one. File objects are copied in chunks
+    through SQLite's incremental blob I/O, so the pdf is never held in memory whole.
+    Returns the sha256 hex digest of the pdf.
+    """
+    stream = io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf
+    start = stream.tell()
+    size = stream.seek(0, os.SEEK_END) - start
+    stream.seek(start)
+    digest = hashlib.sha256()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO pdf_blobs (invoice_id, sha256, size, pdf) VALUES (?, '', ?, zeroblob(?))",
+            (invoice_id, size, size),
+        )
+        with conn.blobopen("pdf_blobs", "pdf", invoice_id) as blob:
+            while chunk := stream.read(chunk_size):
+                blob.write(chunk)
+                digest.update(chunk)
+        conn.execute("UPDATE pdf_blobs SET sha256 = ? WHERE invoice_id = ?", (digest.hexdigest(), invoice_id))
         conn.commit()
+    return digest.hexdigest()
+
+
+def get_pdf_info(invoice_id: int, db_path: Path = DB_PATH) -> dict | None:
+    """Return the sha256 and size of the stored pdf of an invoice, or None if it has none."""
+    with sqlite3.connect(db_path) as conn:
+        conn.row_factory = sqlite3.Row
+        row = conn.execute("SELECT sha256, size FROM pdf_blobs WHERE invoice_id = ?", (invoice_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+
+def iter_pdf(invoice_id: int, db_path: Path = DB_PATH, chunk_size: int = PDF_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield the stored pdf of an invoice in chunks, read through SQLite's incremental blob I/O.
+    Raises LookupError if the invoice has no stored pdf, see get_pdf_info.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        try:
+            blob = conn.blobopen("pdf_blobs", "pdf", invoice_id, readonly=True)
+        except sqlite3.OperationalError:
+            raise LookupError(f"No pdf stored for invoice id {invoice_id}") from None
+        with blob:
+            while chunk := blob.read(chunk_size):
+                yield chunk
+    finally:
+        conn.close()
 
 
 def migrate_from_json(json_path: Path, db_path: Path = DB_PATH) -> int:
@@ -1,14 +1,18 @@
+from array import array
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
+from operator import mul
+from typing import Iterable, Iterator
 
 from kscinvoicing.info.party import CompanySender, IndividualRecipient
 from kscinvoicing.invoice.invoice_store import DB_PATH as _DEFAULT_DB_PATH
 from kscinvoicing.invoice.invoicelogger import InvoiceLogger
+from kscinvoicing.invoice.totals import Totals, calculate_totals
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class LineItem:
     description: str
     quantity: int
@@ -17,6 +21,15 @@ class LineItem:
     def price(self) -> Decimal:
         return self.quantity * self.price_per_unit
 
+    @classmethod
+    def _unchecked(cls, description: str, quantity: int, price_per_unit: Decimal) -> "LineItem":
+        """Create a LineItem from values that have already been validated, skipping __post_init__."""
+        item = object.__new__(cls)
+        object.__setattr__(item, "description", description)
+        object.__setattr__(item, "quantity", quantity)
+        object.__setattr__(item, "price_per_unit", price_per_unit)
+        return item
+
     def __post_init__(self):
         self._validate_quantity()
         self._validate_price_per_unit()
@@ -41,14 +54,131 @@ class LineItem:
             raise ValueError("Description must be a string.")
 
 
+class LineItemBatch:
+    """
+    Columnar container of line items, for invoices with a very large number of lines.
+
+    Descriptions are kept in a list, quantities and unit prices (in integer cents) in compact arrays.
+    Validation runs once over whole columns and line prices are computed column-wise.
+    Iterating yields LineItem objects, so a batch can be used anywhere a list of line items is expected.
+    """
+    __slots__ = ("descriptions", "quantities", "unit_prices_cents")
+
+    def __init__(self, descriptions: list[str], quantities: Iterable[int], prices_per_unit: Iterable[Decimal]):
+        cents = []
+        for i, price in enumerate(prices_per_unit):
+            try:
+                value = Decimal(str(price))
+            except InvalidOperation:
+                raise ValueError("Price per unit must be a decimal.")
+            if not value.is_finite():
+                description = descriptions[i] if i < len(descriptions) else None
+                raise ValueError(f"Price per unit of line item {i} ({description!r}) must be a finite number, "
+                                 f"not {price!r}.")
+            value = value.scaleb(2)
+            if value != value.to_integral_value():
+                raise ValueError("Price per unit must be a whole number of cents.")
+            cents.append(int(value))
+        self._set_columns(descriptions, quantities, cents)
+
+    @classmethod
+    def from_cents(cls, descriptions: list[str], quantities: Iterable[int], unit_prices_cents: Iterable[int]) -> "LineItemBatch":
+        """Create a batch from unit prices already expressed in integer cents."""
+        batch = object.__new__(cls)
+        batch._set_columns(descriptions, quantities, unit_prices_cents)
+        return batch
+
+    @classmethod
+    def from_line_items(cls, items: Iterable[LineItem]) -> "LineItemBatch":
+        items = list(items)
+        return cls(
+            [item.description for item in items],
+            [item.quantity for item in items],
+            [item.price_per_unit for item in items],
+        )
+
+    def _set_columns(self, descriptions, quantities, unit_prices_cents):
+        try:
+            self.quantities = array("q", quantities)
+        except TypeError:
+            raise ValueError("Quantity must be an integer.")
+        self.unit_prices_cents = array("q", unit_prices_cents)
+        self.descriptions = list(descriptions)
+        self._validate()
+
+    def _validate(self):
+        if not len(self.descriptions) == len(self.quantities) == len(self.unit_prices_cents):
+            raise ValueError("Line item columns must all have the same length.")
+        if self.quantities and min(self.quantities) <= 0:
+            raise ValueError("Quantity must be a positive integer.")
+        if self.unit_prices_cents and min(self.unit_prices_cents) < 0:
+            raise ValueError("Price per unit must be a positive number.")
+        if not all(isinstance(description, str) for description in self.descriptions):
+            raise ValueError("Description must be a string.")
+        if "" in self.descriptions:
+            raise ValueError("Description cannot be empty.")
+
+    def __len__(self) -> int:
+        return len(self.descriptions)
+
+    def __iter__(self) -> Iterator[LineItem]:
+        for description, quantity, cents in zip(self.descriptions, self.quantities, self.unit_prices_cents):
+            yield LineItem._unchecked(description, quantity, Decimal(cents).scaleb(-2))
+
+    def prices_per_unit(self) -> list[Decimal]:
+        return [Decimal(cents).scaleb(-2) for cents in self.unit_prices_cents]
+
+    def prices_cents(self) -> array:
+        """Line prices (quantity * unit price) in integer cents."""
+        return array("q", map(mul, self.quantities, self.unit_prices_cents))
+
+    def subtotal(self) -> Decimal:
+        return Decimal(sum(self.prices_cents())).scaleb(-2)
+
+    def rows(self) -> Iterator[tuple[str, int, Decimal, Decimal]]:
+        """Yield (description, quantity, price_per_unit, price) for each line."""
+        for description, quantity, cents, price_cents in zip(
+                self.descriptions, self.quantities, self.unit_prices_cents, self.prices_cents()):
+            yield description, quantity, Decimal(cents).scaleb(-2), Decimal(price_cents).scaleb(-2)
+
+
+def line_item_rows(items: list[LineItem] | LineItemBatch) -> Iterator[tuple[str, int, Decimal, Decimal]]:
+    """Yield (description, quantity, price_per_unit, price) for each line of a list of line items or a batch."""
+    if isinstance(items, LineItemBatch):
+        return items.rows()
+    return ((item.description, item.quantity, item.price_per_unit, item.price()) for item in items)
+
+
+def is_line_item_rows(items) -> bool:
+    """Whether items are rows of line_item_rows already collected in a tuple, rather than a tuple of line items."""
+    return isinstance(items, tuple) and not (items and isinstance(items[0], LineItem))
+
+
+DRAFT_INVOICE_NUMBER = "DRAFT"
+
+
+def invoice_name(number: str, recipient_name: str, invoice_date: datetime) -> str:
+    """File name (without extension) of an invoice pdf, see InvoiceData.get_invoice_name."""
+    return f"Invoice_{number}_{recipient_name.replace(' ', '-')}_{invoice_date.strftime('%Y-%m-%d')}"
+
+
 class InvoiceData:
-    """Class representing all the data for a complete invoice."""
+    """
+    Class representing all the data for a complete invoice.
+
+    Constructing an InvoiceData does not touch the invoice database: it has no invoice number until
+    assign_number() is called, so invoices can be built and rendered (e.g. for previews) without side effects.
+
+    Totals are computed once and cached. Reassigning items, discount or tax_rate invalidates the cache. Lists of
+    line items are stored as tuples and LineItem is frozen, so they can't change in place behind the cache;
+    LineItemBatch columns aren't copied, call invalidate_totals() after changing them in place.
+    """
 
     def __init__(
         self,
         sender: CompanySender,
         recipient: IndividualRecipient,
-        items: list[LineItem],
+        items: list[LineItem] | LineItemBatch,
         save_folder: Path,
         currency: str,
         date: datetime = datetime.now(),
@@ -56,7 +186,10 @@ class InvoiceData:
         discount: Decimal = Decimal("0"),
         tax_rate: Decimal = Decimal("0"),
         db_path: Path = None,
+        invoice_number: str | None = None,
     ):
+        self._totals = None
+
         self.sender = sender
         self.recipient = recipient
         self.items = items
@@ -66,29 +199,100 @@ class InvoiceData:
 
         self.date = date
         self.due_date = due_date
-        self.invoice_number = self.logger.invoice_number
+        self.invoice_number = invoice_number
 
         self.currency = currency
         self.discount = discount
         self.tax_rate = tax_rate
 
-    def log_invoice(self):
-        self.logger.log_invoice(self)
+    @property
+    def is_numbered(self) -> bool:
+        return self.invoice_number is not None
+
+    def assign_number(self) -> str:
+        """
+        Commit step: reserve the next invoice number in the database, unless a number is already assigned.
+        Must be called before rendering the final invoice and before log_invoice(), which ends the reservation;
+        call release_number() if the invoice won't be logged.
+        """
+        if self.invoice_number is None:
+            self.invoice_number = self.logger.reserve_invoice_number()
+        return self.invoice_number
+
+    def release_number(self) -> None:
+        """Give back the number reserved by assign_number(), e.g. when the invoice is discarded before logging."""
+        if self.invoice_number is not None:
+            self.logger.release_invoice_number(self.invoice_number)
+            self.invoice_number = None
+
+    def log_invoice(self, render_options: dict | None = None) -> int:
+        """
+        Log the invoice, with the build_invoice options it was rendered with (stored in its snapshot).
+        Returns the invoice id in the DB.
+        """
+        if self.invoice_number is None:
+            raise ValueError("Invoice has no number, call assign_number() before logging it.")
+        return self.logger.log_invoice(self, render_options)
 
     def get_invoice_name(self):
-        return f"Invoice_{self.invoice_number}_{self.recipient.name.replace(' ', '-')}_{self.date.strftime('%Y-%m-%d')}"
+        return invoice_name(self.invoice_number or DRAFT_INVOICE_NUMBER, self.recipient.name, self.date)
+
+    @property
+    def items(self) -> tuple[LineItem, ...] | LineItemBatch:
+        return self._items
+
+    @items.setter
+    def items(self, items: Iterable[LineItem] | LineItemBatch):
+        self._items = items if isinstance(items, LineItemBatch) else tuple(items)
+        self._totals = None
+
+    @property
+    def discount(self) -> Decimal:
+        return self._discount
+
+    @discount.setter
+    def discount(self, discount: Decimal):
+        self._discount = discount
+        self._totals = None
+
+    @property
+    def tax_rate(self) -> Decimal:
+        return self._tax_rate
+
+    @tax_rate.setter
+    def tax_rate(self, tax_rate: Decimal):
+        self._tax_rate = tax_rate
+        self._totals = None
+
+    def invalidate_totals(self):
+        """Discard cached totals, e.g. after changing the columns of a LineItemBatch in place."""
+        self._totals = None
+
+    def prime_totals(self, totals: Totals):
+        """Cache totals computed elsewhere for the current items, discount and tax rate (see bulk_calculate_totals)."""
+        self._totals = totals
+
+    @property
+    def totals(self) -> Totals:
+        if self._totals is None:
+            if isinstance(self.items, LineItemBatch):
+                subtotal = self.items.subtotal()
+            else:
+                subtotal = sum([item.price() for item in self.items])
+            self._totals = calculate_totals(subtotal, self.discount, self.tax_rate)
+        return self._totals
 
     @property
     def subtotal(self) -> Decimal:
-        return sum([item.price() for item in self.items])
+        return self.totals.subtotal
 
     @property
     def tax(self) -> Decimal:
-        return (self.subtotal - self.discount) * self.tax_rate
+        return self.totals.tax
 
     @property
     def total(self) -> Decimal:
-        return self.subtotal + self.tax - self.discount
+        return self.totals.total
 
     @staticmethod
     def calculate_discount_from_rate(discount_rate: Decimal, price: Decimal):
@@ -1,4 +1,4 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from pathlib import Path
 
 from kscinvoicing.invoice.invoice_store import init_db, get_next_invoice_number
@@ -7,22 +7,22 @@ import kscinvoicing.invoice.invoice_store as invoice_store
 
 @dataclass
 class InvoiceLogger:
+    """Database access for an invoice. Creating a logger is free, the database is only touched when used."""
 
     db_path: Path
-    _invoice_number: str = field(init=False, repr=True)
 
-    def __post_init__(self):
+    def next_invoice_number(self) -> str:
         init_db(self.db_path)
-        self.invoice_number = get_next_invoice_number(self.db_path)
+        return get_next_invoice_number(self.db_path)
 
-    @property
-    def invoice_number(self):
-        return self._invoice_number
+    def reserve_invoice_number(self) -> str:
+        init_db(self.db_path)
+        return invoice_store.reserve_invoice_numbers(1, self.db_path)[0]
 
-    @invoice_number.setter
-    def invoice_number(self, number: str):
-        self._invoice_number = number
+    def release_invoice_number(self, number: str) -> None:
+        invoice_store.release_invoice_numbers([number], self.db_path)
 
-    def log_invoice(self, invoice_data):
-        invoice_store.log_invoice(invoice_data, db_path=self.db_path)
+    def log_invoice(self, invoice_data, render_options: dict | None = None) -> int:
+        invoice_id = invoice_store.log_invoice(invoice_data, db_path=self.db_path, render_options=render_options)
         print(f"Invoice {invoice_data.invoice_number} logged to database.")
+        return invoice_id
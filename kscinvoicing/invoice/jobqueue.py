@@ -0,0 +1,107 @@
+"""
+Durable render job queue in the invoice DB, processed by `kscinvoicing worker` processes.
+
+Callers enqueue invoice json payloads; workers claim them one at a time with a lease, render the pdf to a temporary
+file, then log the invoice and mark the job done in a single transaction, and only then move the pdf to its path. A job whose worker dies is claimed again once
+its lease expires, with the invoice number it was given on its first claim, so nothing is lost or logged twice.
+Failed renders are retried with exponential backoff, up to each job's max_attempts.
+Workers only share the SQLite database, so throughput scales with the number of worker processes.
+"""
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.generate_invoice_from_json import InvoiceValidationError, validate_invoice_json
+from kscinvoicing.invoice.schedules import Render
+from kscinvoicing.pdf.savebatch import move_pdfs
+
+LEASE_SECONDS = 300
+POLL_INTERVAL = 1.0
+RETRY_DELAY = 5.0  # seconds before the first retry, doubled for each further attempt
+
+
+def enqueue(payloads: list[dict], max_attempts: int = 3, db_path: Path = invoice_store.DB_PATH) -> list[int]:
+    """
+    Queue render jobs for invoice json payloads (see generate_invoice_from_json), all or none: raises
+    InvoiceValidationError, with the errors of each invalid payload prefixed by its position, if any is invalid.
+    Returns the job ids.
+    """
+    errors = [f"[{i}] {error}" for i, payload in enumerate(payloads) for error in validate_invoice_json(payload)]
+    if errors:
+        raise InvoiceValidationError(errors)
+    return invoice_store.enqueue_jobs(payloads, max_attempts, db_path)
+
+
+def process_job(job: dict, render: Render, worker_id: str, db_path: Path = invoice_store.DB_PATH) -> str:
+    """Render, save and log a claimed job. Returns its new status, or "lost" if its lease was taken over meanwhile."""
+    try:
+        rendered = render(job["payload"], job["invoice_number"], db_path)
+    except KeyboardInterrupt:
+        invoice_store.release_job(job["id"], worker_id, db_path)
+        raise
+    except Exception as e:
+        retry_at = time.time() + RETRY_DELAY * 2 ** (job["attempts"] - 1)
+        status = invoice_store.fail_job(job["id"], worker_id, str(e), retry_at, db_path)
+        print(f"Job {job['id']} attempt {job['attempts']} failed: {e}", file=sys.stderr)
+        return status or "lost"
+    try:
+        completed = invoice_store.complete_job(job["id"], worker_id, rendered["record"], rendered["path"], db_path)
+    except BaseException:
+        Path(rendered["temp_path"]).unlink(missing_ok=True)
+        raise
+    if not completed:
+        Path(rendered["temp_path"]).unlink(missing_ok=True)
+        return "lost"
+    move_pdfs([(Path(rendered["temp_path"]), Path(rendered["path"]))])
+    print(f"Job {job['id']}: invoice {job['invoice_number']} saved to '{rendered['path']}'", file=sys.stderr)
+    return "done"
+
+
+def run_worker(
+    render: Render,
+    db_path: Path = invoice_store.DB_PATH,
+    worker_id: str | None = None,
+    lease_seconds: float = LEASE_SECONDS,
+    poll_interval: float = POLL_INTERVAL,
+    exit_when_idle: bool = False,
+) -> int:
+    """
+    Claim and process jobs until stopped (KeyboardInterrupt), polling every poll_interval seconds when the queue is
+    empty. With exit_when_idle, return once no job is queued or running. Returns the number of jobs processed.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    processed = 0
+    try:
+        while True:
+            job = invoice_store.claim_job(worker_id, lease_seconds, db_path)
+            if job is not None:
+                process_job(job, render, worker_id, db_path)
+                processed += 1
+                continue
+            if exit_when_idle:
+                counts = invoice_store.count_jobs(db_path)
+                if not counts["queued"] and not counts["running"]:
+                    return processed
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        return processed
+
+
+def run_workers(processes: int, render: Render, db_path: Path = invoice_store.DB_PATH, **options) -> None:
+    """Run run_worker (with its keyword options) in `processes` worker processes until they all return."""
+    if processes == 1:
+        run_worker(render, db_path, **options)
+        return
+    workers = [multiprocessing.Process(target=run_worker, args=(render, db_path), kwargs=options)
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        try:
+            worker.join()
+        except KeyboardInterrupt:  # the workers got it too, and give their jobs back before exiting
+            worker.join()
@@ -0,0 +1,235 @@
+"""
+Recurring invoice schedules, e.g. a monthly retainer invoiced on the last day of each month.
+
+A schedule stores a client (by its key in the client store), a template of the invoice json fields that don't come
+from the sender and client profiles (line items, currency, language...), a cadence and its next run date.
+run_schedules generates every invoice due in one run: payloads are validated and numbered up front, rendered in
+parallel on an executor, then logged together in a single transaction that also marks each schedule period as
+generated. A period is only ever invoiced once, so running it again (or after a missed month-end) is safe.
+"""
+import calendar
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.generate_invoice_from_json import InvoiceValidationError, validate_invoice_json
+from kscinvoicing.pdf.savebatch import move_pdfs
+
+CADENCES = ("weekly", "monthly", "quarterly", "yearly")
+_MONTHS = {"monthly": 1, "quarterly": 3, "yearly": 12}
+
+# invoice json fields taken from a schedule's template, plus due_days (days from the invoice date to its due date)
+TEMPLATE_FIELDS = ("save_location", "currency", "language", "discount", "tax_rate", "style", "due_days",
+                   "lineitem_details")
+
+# render(invoice json data, invoice number, db_path) -> {"temp_path": rendered pdf, "path": where to save it once
+# logged, "record": invoice_store.invoice_record}, see generate_invoice_from_json.render_numbered_invoice
+Render = Callable[[dict, str, Path], dict]
+
+
+# ---------------------------------------------------------------------------
+# Cadences
+# ---------------------------------------------------------------------------
+
+def next_run_date(run_date: date, cadence: str, day: int) -> date:
+    """
+    The run after run_date: a week later, or `day` of the month 1, 3 or 12 months later, clamped to the end of
+    shorter months (day 31 runs on the last day of every month).
+    """
+    if cadence == "weekly":
+        return run_date + timedelta(weeks=1)
+    year, month = divmod(run_date.year * 12 + run_date.month - 1 + _MONTHS[cadence], 12)
+    return date(year, month + 1, min(day, calendar.monthrange(year, month + 1)[1]))
+
+
+def period_of(run_date: date, cadence: str) -> str:
+    """The period a run invoices: 2024-W05, 2024-01, 2024-Q1 or 2024."""
+    if cadence == "weekly":
+        iso = run_date.isocalendar()
+        return f"{iso.year}-W{iso.week:02}"
+    if cadence == "monthly":
+        return f"{run_date.year}-{run_date.month:02}"
+    if cadence == "quarterly":
+        return f"{run_date.year}-Q{(run_date.month - 1) // 3 + 1}"
+    return f"{run_date.year}"
+
+
+# ---------------------------------------------------------------------------
+# Payloads
+# ---------------------------------------------------------------------------
+
+def _profile_to_json(profile: dict, company: str | None) -> dict:
+    """A sender or client profile (see profile_store) as a sender/recipient of the invoice json."""
+    party = {
+        "name": profile.get("name", ""),
+        "company": company,
+        "siren": profile.get("siren", "") if company is not None else None,
+        "email": profile.get("email", ""),
+        "phone": profile.get("phone") or None,
+        "website": profile.get("website") or None,
+        "address": {key: value for key, value in profile.get("address", {}).items()
+                    if value or key != "building"},
+    }
+    return {key: value for key, value in party.items() if value is not None}
+
+
+def schedule_payload(schedule: dict, sender: dict, client: dict, run_date: date) -> dict:
+    """The invoice json data (see generate_invoice_from_json) of a schedule's run on run_date."""
+    template = dict(schedule["template"])
+    due_days = template.pop("due_days", None)
+    data = {
+        **template,
+        "invoice_date": run_date.isoformat(),
+        "logo_path": sender.get("logo_path") or None,
+        "footer_text": sender.get("footer_text") or None,
+        "sender": _profile_to_json(sender, sender.get("company", "")),
+        "recipient": _profile_to_json(client, client.get("company_name", "") if client.get("type") == "company"
+                                      else None),
+    }
+    if due_days is not None:
+        data["due_date"] = (run_date + timedelta(days=due_days)).isoformat()
+    return {key: value for key, value in data.items() if value is not None}
+
+
+def add_schedule(data: dict, sender: dict | None, clients: dict, db_path: Path = invoice_store.DB_PATH) -> int:
+    """
+    Store a schedule from its json data: "client" (a key of the client store), "cadence" (one of CADENCES),
+    "start" (first run date, YYYY-MM-DD), optionally "day" (day of the month of runs, default the start date's
+    day) and the TEMPLATE_FIELDS. The first invoice is built and validated against the sender and client profiles.
+    Raises InvoiceValidationError on invalid data. Returns the schedule id.
+    """
+    errors = [f"$.{key}: unknown field" for key in data if key not in ("client", "cadence", "start", "day",
+                                                                     *TEMPLATE_FIELDS)]
+    if data.get("cadence") not in CADENCES:
+        errors.append(f"$.cadence: expected one of {', '.join(CADENCES)}")
+    try:
+        start = date.fromisoformat(data.get("start"))
+    except (TypeError, ValueError):
+        errors.append("$.start: expected a YYYY-MM-DD date")
+        start = None
+    day = data.get("day", start.day if start else 1)
+    if not isinstance(day, int) or isinstance(day, bool) or not 1 <= day <= 31:
+        errors.append("$.day: expected a day of the month, 1 to 31")
+    due_days = data.get("due_days")
+    if due_days is not None and (not isinstance(due_days, int) or isinstance(due_days, bool) or due_days < 0):
+        errors.append("$.due_days: expected a number of days")
+    if sender is None:
+        errors.append("no sender profile saved")
+    if data.get("client") not in clients:
+        errors.append(f"$.client: unknown client {data.get('client')!r}")
+    template = {key: data[key] for key in TEMPLATE_FIELDS if key in data}
+    if not errors:
+        payload = schedule_payload({"template": template}, sender, clients[data["client"]], start)
+        errors += validate_invoice_json(payload)
+    if errors:
+        raise InvoiceValidationError(errors)
+    return invoice_store.add_schedule(data["client"], data["cadence"], start, day, template, db_path)
+
+
+# ---------------------------------------------------------------------------
+# Runs
+# ---------------------------------------------------------------------------
+
+@dataclass
+class _Job:
+    schedule_id: int
+    period: str
+    next_run: date
+    data: dict
+    result: dict
+
+
+def run_schedules(
+    sender: dict | None,
+    clients: dict,
+    render: Render,
+    today: date | None = None,
+    db_path: Path = invoice_store.DB_PATH,
+    executor: Executor | None = None,
+    workers: int | None = None,
+) -> list[dict]:
+    """
+    Generate every invoice due on or before today: each schedule catches up on all its periods since its next run
+    date, skipping periods already generated. Invoices are rendered by `render` on `executor` (by default a pool of
+    `workers` processes), and the successful ones logged in a single transaction, then moved to their paths.
+    Numbers are reserved in the invoice DB in schedule and period order and stay gapless: if a render fails, the
+    invoices after it are not logged (their pdfs are deleted and their numbers given back) and are generated by the
+    next run; if logging fails, none is.
+    Returns one result per period: {"schedule_id", "client", "period", "status": "ok" | "skipped" | "error"}, with
+    "invoice_number" and "path" for generated invoices and "errors" for failures.
+    """
+    today = today or date.today()
+    results, jobs, skipped_to = [], [], {}
+    for schedule in invoice_store.get_due_schedules(today, db_path):
+        cadence, queued = schedule["cadence"], False
+        run_date = date.fromisoformat(schedule["next_run"])
+        while run_date <= today:
+            result = {"schedule_id": schedule["id"], "client": schedule["client_key"],
+                      "period": period_of(run_date, cadence)}
+            results.append(result)
+            next_run = next_run_date(run_date, cadence, schedule["day"])
+            if result["period"] in schedule["periods"]:
+                result["status"] = "skipped"
+                if not queued:
+                    skipped_to[schedule["id"]] = next_run.isoformat()
+            else:
+                client = clients.get(schedule["client_key"])
+                errors = ["no sender profile saved"] if sender is None else []
+                if client is None:
+                    errors.append(f"unknown client {schedule['client_key']!r}")
+                data = schedule_payload(schedule, sender, client, run_date) if not errors else None
+                errors = errors or validate_invoice_json(data)
+                if errors:  # later periods wait, so the schedule's invoices stay in period order
+                    result.update(status="error", errors=errors)
+                    break
+                jobs.append(_Job(schedule["id"], result["period"], next_run, data, result))
+                queued = True
+            run_date = next_run
+    if skipped_to:
+        invoice_store.set_schedules_next_run(skipped_to, db_path)
+    if not jobs:
+        return results
+
+    numbers = invoice_store.reserve_invoice_numbers(len(jobs), db_path)
+    own_executor = None
+    if executor is None:
+        executor = own_executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(render, job.data, number, db_path) for job, number in zip(jobs, numbers)]
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(e)
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown()
+
+    logged = next((i for i, outcome in enumerate(outcomes) if isinstance(outcome, Exception)), len(outcomes))
+    log_error = None
+    if logged:
+        try:
+            invoice_store.log_invoices(
+                [outcome["record"] for outcome in outcomes[:logged]], db_path,
+                schedule_runs=[(job.schedule_id, job.period, job.next_run.isoformat()) for job in jobs[:logged]],
+            )
+        except Exception as e:
+            log_error, logged = f"not logged: {e}", 0
+        else:
+            move_pdfs((Path(outcome["temp_path"]), Path(outcome["path"])) for outcome in outcomes[:logged])
+    invoice_store.release_invoice_numbers(numbers[logged:], db_path)
+    if log_error is None and logged < len(jobs):
+        log_error = f"not logged, invoice {numbers[logged]} failed first"
+    for i, (job, number, outcome) in enumerate(zip(jobs, numbers, outcomes)):
+        if i < logged:
+            job.result.update(status="ok", invoice_number=number, path=outcome["path"])
+        elif isinstance(outcome, Exception):
+            job.result.update(status="error", errors=[str(outcome)])
+        else:
+            Path(outcome["temp_path"]).unlink(missing_ok=True)
+            job.result.update(status="error", errors=[log_error])
+    return results
@@ -0,0 +1,62 @@
+"""
+Invoice snapshots, stored with each logged invoice so it can be re-rendered later.
+
+A snapshot is the invoice json accepted by `kscinvoicing generate` (see generate_invoice_from_json) plus the
+invoice number, serialized as compact json and zlib-compressed. Amounts are kept as decimal strings, so a
+re-rendered invoice is identical to the original.
+"""
+import json
+import zlib
+from dataclasses import asdict
+
+
+def _without_none(data: dict) -> dict:
+    return {key: value for key, value in data.items() if value is not None}
+
+
+def _party_to_json(party) -> dict:
+    data = {
+        "name": party.name,
+        "company": getattr(party, "company_name", None),
+        "siren": getattr(party, "siren", None),
+        "email": party.email,
+        "phone": party.phone,
+        "website": party.website,
+        "address": _without_none(asdict(party.address)),
+    }
+    return _without_none(data)
+
+
+def invoice_to_json(invoice, render_options: dict | None = None) -> dict:
+    """
+    Invoice json data (as read by invoice_from_json) for an InvoiceData, with its invoice number.
+    render_options are the presentation arguments given to build_invoice: language, logo_path, footer_text, style.
+    """
+    from kscinvoicing.invoice.invoicedata import line_item_rows
+
+    data = {
+        "invoice_number": invoice.invoice_number,
+        "save_location": str(invoice.save_folder),
+        "invoice_date": invoice.date.strftime("%Y-%m-%d"),
+        "due_date": invoice.due_date.strftime("%Y-%m-%d") if invoice.due_date else None,
+        "currency": invoice.currency,
+        "language": "fr",
+        "discount": str(invoice.discount),
+        "tax_rate": str(invoice.tax_rate),
+        "sender": _party_to_json(invoice.sender),
+        "recipient": _party_to_json(invoice.recipient),
+        "lineitem_details": [
+            {"description": description, "quantity": quantity, "price_per_unit": str(price_per_unit)}
+            for description, quantity, price_per_unit, _ in line_item_rows(invoice.items)
+        ],
+        **(render_options or {}),
+    }
+    return _without_none(data)
+
+
+def encode_snapshot(data: dict) -> bytes:
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def decode_snapshot(snapshot: bytes) -> dict:
+    return json.loads(zlib.decompress(snapshot).decode("utf-8"))
@@ -0,0 +1,74 @@
+"""
+Invoice totals calculation, for a single invoice or for many invoices at once.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from itertools import accumulate
+from operator import mul
+from typing import Iterable, Sequence
+
+
+@dataclass(frozen=True)
+class Totals:
+    """Computed money totals of an invoice."""
+    subtotal: Decimal
+    discount: Decimal
+    tax: Decimal
+    total: Decimal
+
+
+def calculate_totals(subtotal: Decimal, discount: Decimal, tax_rate: Decimal) -> Totals:
+    """Apply discount and tax to a subtotal. Tax is charged on the discounted subtotal."""
+    tax = (subtotal - discount) * tax_rate
+    return Totals(subtotal=subtotal, discount=discount, tax=tax, total=subtotal + tax - discount)
+
+
+def totals_from_columns(
+    quantities: Sequence,
+    prices_per_unit: Sequence,
+    offsets: Sequence[int],
+    discounts: Sequence,
+    tax_rates: Sequence,
+) -> list[Totals]:
+    """
+    Compute totals for many invoices from flat line item columns.
+    Line items of invoice i are the rows offsets[i]:offsets[i + 1] of quantities and prices_per_unit,
+    so offsets has one more entry than there are invoices.
+    Line prices are computed in one pass over the columns, then summed per invoice.
+    """
+    line_prices = list(map(mul, quantities, prices_per_unit))
+    return [
+        calculate_totals(sum(line_prices[start:stop]), discount, tax_rate)
+        for start, stop, discount, tax_rate in zip(offsets, offsets[1:], discounts, tax_rates)
+    ]
+
+
+def bulk_calculate_totals(invoices: Iterable) -> list[Totals]:
+    """
+    Compute totals for many InvoiceData objects at once, priming each invoice's cached totals.
+    Useful for reporting and bulk generation where totals of every invoice are needed.
+    """
+    from kscinvoicing.invoice.invoicedata import LineItemBatch  # invoicedata imports this module
+
+    invoices = list(invoices)
+    quantities, prices_per_unit = [], []
+    for invoice in invoices:
+        if isinstance(invoice.items, LineItemBatch):  # already columnar
+            quantities.extend(invoice.items.quantities)
+            prices_per_unit.extend(invoice.items.prices_per_unit())
+            continue
+        for item in invoice.items:
+            quantities.append(item.quantity)
+            prices_per_unit.append(item.price_per_unit)
+    offsets = [0, *accumulate(len(invoice.items) for invoice in invoices)]
+
+    all_totals = totals_from_columns(
+        quantities,
+        prices_per_unit,
+        offsets,
+        [invoice.discount for invoice in invoices],
+        [invoice.tax_rate for invoice in invoices],
+    )
+    for invoice, totals in zip(invoices, all_totals):
+        invoice.prime_totals(totals)
+    return all_totals
@@ -1,22 +1,43 @@
+import io
 import platform
 import subprocess
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import BinaryIO
 
 from borb.pdf import Document, PDF
 
 from kscinvoicing.invoice import InvoiceData
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.pdf.nativewriter import NativeDocument
 
 
 @dataclass
 class BorbInvoice:
     invoice: InvoiceData
-    document: Document
+    document: Document | NativeDocument  # depending on the backend of build_invoice
+    render_options: dict = field(default_factory=dict)  # presentation arguments of build_invoice, logged with the invoice
+
+    def _write(self, out: BinaryIO) -> None:
+        """
+        Serialize the pdf document to a binary stream. Native documents are written sequentially (to a file, pipe or
+        socket), page by page when built with streaming=True; borb serializes the whole document at once.
+        """
+        if isinstance(self.document, NativeDocument):
+            self.document.write(out)
+        else:
+            # noinspection PyTypeChecker
+            PDF.dumps(out, self.document)
 
     def _save_document(self, save_path: Path) -> None:
         with open(save_path, "wb") as f:
-            # noinspection PyTypeChecker
-            PDF.dumps(f, self.document)
+            self._write(f)
+
+    def to_bytes(self) -> bytes:
+        """Serialize the pdf document in memory, without saving or logging it."""
+        buffer = io.BytesIO()
+        self._write(buffer)
+        return buffer.getvalue()
 
     def _delete_draft(self):
         save_path = self._get_save_path(draft=True)
@@ -28,12 +49,20 @@ class BorbInvoice:
         else:
             return self.invoice.save_folder / f"{self.invoice.get_invoice_name()}.pdf"
 
-    def save(self):
-        """Save and log invoice with no preview."""
-        save_path = self._get_save_path()
-        self._save_document(save_path)
+    def save(self, store_pdf: bool = False):
+        """
+        Save and log invoice with no preview, atomically: the pdf only gets its final name once the invoice is
+        logged, see savebatch. With store_pdf, the pdf is also stored in the invoice DB, see invoice_store.store_pdf.
+        """
+        from kscinvoicing.pdf.savebatch import SaveBatch
+        batch = SaveBatch()
+        batch.add(self)
+        [(invoice_id, save_path)] = batch.commit()
         print(f"Invoice saved to: '{save_path}'")
-        self.invoice.log_invoice()
+        print(f"Invoice {self.invoice.invoice_number} logged to database.")
+        if store_pdf:
+            with open(save_path, "rb") as f:
+                invoice_store.store_pdf(invoice_id, f, db_path=self.invoice.logger.db_path)
 
 
     def preview_with_optional_save(self):
@@ -43,12 +72,13 @@ class BorbInvoice:
         preview_file(save_path)
         response = input("Do you want to save this draft as an official invoice? (type 'y' to save)\n")
         if response == "y":
-            # rename draft to final name
+            # log first, so the draft is only renamed to its final name once its number is taken
+            self.invoice.log_invoice(self.render_options)
             save_path.rename(self._get_save_path())
-            print(f"InvoiceData saved to : '{save_path}'")
-            self.invoice.log_invoice()
+            print(f"InvoiceData saved to : '{self._get_save_path()}'")
         else:
             save_path.unlink()
+            self.invoice.release_number()
             print("Draft deleted.")
 
 
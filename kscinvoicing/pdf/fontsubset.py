@@ -0,0 +1,138 @@
+"""
+Font subsetting for rendered invoices.
+
+borb embeds the whole TrueType program of every font used on a page, although an invoice only uses a few dozen
+glyphs. subset_fonts replaces the embedded programs with subsets holding just the glyphs drawn in the document.
+Glyph ids are kept (unused glyphs are emptied), so content streams, widths and ToUnicode maps stay valid.
+subset_font_program does the same for a single font program, e.g. for the native pdf writer (see nativewriter).
+"""
+import io
+import re
+import zlib
+from functools import lru_cache
+
+from borb.io.read.types import Decimal as bDecimal, Dictionary, List, Name, Stream
+from borb.pdf import Document
+from fontTools import subset
+from fontTools.ttLib import TTFont
+
+# tables a viewer needs to draw glyphs of an embedded CIDFontType2 with an Identity CIDToGIDMap
+_KEEP_TABLES = ["head", "hhea", "maxp", "hmtx", "loca", "glyf", "cvt ", "fpgm", "prep"]
+
+# one <cid> <unicode> mapping of a ToUnicode cmap
+_BFCHAR = re.compile(rb"<([0-9a-fA-F]+)>\s*<([0-9a-fA-F]+)>")
+
+# font selection (/F2 1.0 Tf) and hex strings (<003a00cf>) in a page content stream
+_CONTENT_TOKEN = re.compile(rb"/([^\s/\[\]<>()]+)\s+[-\d.]+\s+Tf|<([0-9a-fA-F]*)>")
+
+
+@lru_cache(maxsize=64)
+def subset_font_program(font_program: bytes, gids: frozenset[int]) -> bytes:
+    """
+    Subset a TrueType font program to the given glyph ids, keeping glyph ids unchanged.
+    Cached: the same fonts and mostly the same glyphs are drawn on every invoice.
+    """
+    font = TTFont(io.BytesIO(font_program))
+    options = subset.Options()
+    options.retain_gids = True
+    options.notdef_outline = True
+    options.layout_features = []
+    options.name_IDs = []
+    options.drop_tables = [tag for tag in font.keys() if tag not in _KEEP_TABLES and tag != "GlyphOrder"]
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(gids=sorted(gids))
+    subsetter.subset(font)
+    out = io.BytesIO()
+    font.save(out)
+    return out.getvalue()
+
+
+def _used_glyphs(document: Document) -> dict[int, set[int]]:
+    """Glyph ids drawn with each composite (Type0) font of the document, keyed by id() of the font dictionary."""
+    used: dict[int, set[int]] = {}
+    for page_number in range(int(document.get_document_info().get_number_of_pages())):
+        page = document.get_page(page_number)
+        fonts = page["Resources"]["Font"]
+        glyphs = None
+        for match in _CONTENT_TOKEN.finditer(page["Contents"]["DecodedBytes"]):
+            font_name, hex_string = match.groups()
+            if font_name is not None:
+                font = fonts.get(Name(font_name.decode("latin1")))
+                is_composite = font is not None and font.get("Subtype") == "Type0"
+                glyphs = used.setdefault(id(font), set()) if is_composite else None
+            elif glyphs is not None:
+                glyphs.update(int(hex_string[i:i + 4], 16) for i in range(0, len(hex_string), 4))
+    return used
+
+
+def _copy(obj: Dictionary, **replace) -> Dictionary:
+    """Shallow copy of a pdf dictionary with some entries replaced; the fonts of a style are shared by all documents."""
+    copied = Dictionary()
+    for key, value in obj.items():
+        copied[key] = value
+    for key, value in replace.items():
+        copied[Name(key)] = value
+    return copied
+
+
+def _stream(data: bytes, **entries) -> Stream:
+    stream = Stream()
+    stream[Name("DecodedBytes")] = data
+    stream[Name("Bytes")] = zlib.compress(data, 9)
+    stream[Name("Filter")] = Name("FlateDecode")
+    stream[Name("Length")] = bDecimal(len(stream["Bytes"]))
+    for key, value in entries.items():
+        stream[Name(key)] = value
+    return stream
+
+
+def _subset_widths(widths: List, gids: set[int]) -> List:
+    """Keep the `cid [width]` entries of a W array for the used glyphs (borb writes one entry per glyph)."""
+    subset_widths = List()
+    for i in range(0, len(widths), 2):
+        if int(widths[i]) in gids:
+            subset_widths.append(widths[i])
+            subset_widths.append(widths[i + 1])
+    return subset_widths
+
+
+def _subset_to_unicode(cmap: bytes, gids: set[int]) -> bytes:
+    """Keep the bfchar mappings of a ToUnicode cmap for the used glyphs."""
+    head, _, rest = cmap.partition(b"endcodespacerange")
+    tail = rest[rest.rindex(b"endbfchar") + len(b"endbfchar"):] if b"endbfchar" in rest else rest
+    pairs = [m.group(0) for m in _BFCHAR.finditer(rest) if int(m.group(1), 16) in gids]
+    blocks = b"".join(b"%d beginbfchar\n" % len(pairs[i:i + 100]) + b"\n".join(pairs[i:i + 100]) + b"\nendbfchar\n"
+                      for i in range(0, len(pairs), 100))
+    return head + b"endcodespacerange\n" + blocks + tail.lstrip()
+
+
+def _subset_font(font: Dictionary, gids: set[int]) -> Dictionary:
+    descendant = font["DescendantFonts"][0]
+    descriptor = descendant["FontDescriptor"]
+    font_program = subset_font_program(descriptor["FontFile2"]["DecodedBytes"], frozenset(gids | {0}))
+    font_file = _stream(font_program, Length1=bDecimal(len(font_program)))
+
+    descendants = List()
+    descendants.append(_copy(descendant,
+                             FontDescriptor=_copy(descriptor, FontFile2=font_file),
+                             W=_subset_widths(descendant["W"], gids)))
+    to_unicode = _stream(_subset_to_unicode(font["ToUnicode"]["DecodedBytes"], gids))
+    return _copy(font, DescendantFonts=descendants, ToUnicode=to_unicode)
+
+
+def subset_fonts(document: Document) -> Document:
+    """
+    Replace the embedded TrueType programs in a finished document with subsets of the glyphs it uses.
+    Call once all content has been laid out, right before serializing.
+    """
+    used = _used_glyphs(document)
+    subsets: dict[int, Dictionary] = {}
+    for page_number in range(int(document.get_document_info().get_number_of_pages())):
+        fonts = document.get_page(page_number)["Resources"]["Font"]
+        for name, font in list(fonts.items()):
+            if id(font) not in used or "FontFile2" not in font["DescendantFonts"][0]["FontDescriptor"]:
+                continue
+            if id(font) not in subsets:
+                subsets[id(font)] = _subset_font(font, used[id(font)])
+            fonts[name] = subsets[id(font)]
+    return document
@@ -0,0 +1,134 @@
+"""
+Lightweight HTML preview of an invoice, e.g. for the live preview of the web UI.
+
+The preview is built from the same sections as the pdf (the table schemas of invoicebuilder.build_section_schemas
+and the line item rows of _build_itemised_table) but skips layout, fonts and pdf writing entirely, so it is cheap
+enough to re-render on every form change. Long invoices are shown on one continuous page.
+"""
+import base64
+import mimetypes
+from functools import lru_cache
+from html import escape
+from pathlib import Path
+
+from kscinvoicing.invoice.invoicedata import InvoiceData, line_item_rows
+from kscinvoicing.pdf.invoicebuilder import build_section_schemas
+from kscinvoicing.pdf.nativewriter import PAGE_WIDTH, MARGIN_LEFT, SCHEMA_PADDING, ITEM_PADDING, ITEM_COLUMN_WIDTHS
+from kscinvoicing.pdf.sectioncache import SECTION_CACHE, schema_inputs
+from kscinvoicing.pdf.tableschema import TableSchema
+from kscinvoicing.pdf.utils import (
+    StyleConfig,
+    Currency,
+    Language,
+    format_money_factory,
+    get_headings_for_language,
+    get_style,
+)
+
+
+def _css_color(color) -> str:
+    color = color.to_rgb()
+    return "#" + "".join(f"{round(float(c) * 255):02x}" for c in (color.red, color.green, color.blue))
+
+
+def _padding(padding: tuple) -> str:
+    return " ".join(f"{p:g}pt" for p in padding)
+
+
+def _text(value: str) -> str:
+    return escape(str(value)).replace("\n", "<br>")
+
+
+def _colgroup(widths) -> str:
+    total = sum(float(w) for w in widths)
+    return "<colgroup>" + "".join(f'<col style="width:{float(w) / total:.2%}">' for w in widths) + "</colgroup>"
+
+
+def _schema_table_html(schema: TableSchema) -> str:
+    """The table of TableSchema.build_table: bold cells in the title font, double cells spanning two columns."""
+    rows = []
+    for i, values in enumerate(schema.tabledata):
+        cells, skip = [], False
+        for j, value in enumerate(values):
+            if skip:
+                skip = False
+                continue
+            skip = (i, j) in schema.double_cells
+            attributes = ' colspan="2"' if skip else ""
+            attributes += ' class="bold"' if (i, j) in schema.bold_cells else ""
+            cells.append(f"<td{attributes}>{_text(value)}</td>")
+        rows.append("<tr>" + "".join(cells) + "</tr>")
+    return (f'<table style="font-size:{float(schema.font_size):g}pt">'
+            f'{_colgroup(schema.column_widths)}{"".join(rows)}</table>')
+
+
+def _section_html(schema: TableSchema) -> str:
+    return SECTION_CACHE.get("html_table", schema.style, schema_inputs(schema), lambda: _schema_table_html(schema))
+
+
+def _items_table_html(rows: tuple[tuple], currency: Currency, lang: Language, style: StyleConfig) -> str:
+    """The table of invoicebuilder._build_itemised_table: a heading row, then line items in alternating colours."""
+    colors = style.colors
+    format_money = format_money_factory(currency)
+    heading = "".join(f'<th class="bold">{_text(text)}</th>' for text in get_headings_for_language(lang))
+    html_rows = [f'<tr style="background:{_css_color(colors["dark_blue"])};color:{_css_color(colors["white"])}">'
+                 f'{heading}</tr>']
+    for i, (description, quantity, price_per_unit, price) in enumerate(rows, start=1):
+        background = colors["lighter_grey_blue"] if i % 2 else colors["light_grey_blue"]
+        cells = [description, str(quantity), format_money(price_per_unit), format_money(price)]
+        html_rows.append(f'<tr style="background:{_css_color(background)}">'
+                         + "".join(f"<td>{_text(cell)}</td>" for cell in cells) + "</tr>")
+    return f'<table class="items">{_colgroup(ITEM_COLUMN_WIDTHS)}{"".join(html_rows)}</table>'
+
+
+@lru_cache(maxsize=16)
+def _logo_data_uri(path: Path, mtime_ns: int) -> str:
+    """A logo file as a data uri (keyed by modification time, so edited files are reloaded)."""
+    mime = mimetypes.guess_type(path.name)[0] or "image/png"
+    return f"data:{mime};base64," + base64.b64encode(path.read_bytes()).decode("ascii")
+
+
+def build_invoice_html(
+    invoice: InvoiceData,
+    logo_path: str = None,
+    logo_width: int = 200,
+    footer_text: str = None,
+    language: str = "fr",
+    style: StyleConfig | str | Path = None,
+) -> str:
+    """
+    Render a standalone html page previewing the invoice, taking the same options as invoicebuilder.build_invoice.
+    Invoices without an assigned number are shown as drafts.
+    """
+    style = get_style(style)
+    contact_details, invoice_information, totals = build_section_schemas(invoice, style=style)
+
+    logo = ""
+    if logo_path is not None and Path(logo_path).is_file():
+        logo_path = Path(logo_path)
+        logo = (f'<img src="{_logo_data_uri(logo_path, logo_path.stat().st_mtime_ns)}" '
+                f'style="width:{logo_width}pt" alt="logo">')
+    item_inputs = (tuple(line_item_rows(invoice.items)), Currency(invoice.currency), Language(language))
+    items = SECTION_CACHE.get("html_items", style, item_inputs, lambda: _items_table_html(*item_inputs, style))
+    footer = f'<footer>{_text(footer_text)}</footer>' if footer_text is not None else ""
+
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><style>
+body {{ margin: 0; background: #e8e8e8; font-family: sans-serif; }}
+.page {{ width: {PAGE_WIDTH - 2 * MARGIN_LEFT:g}pt; margin: 8pt auto; padding: 36pt {MARGIN_LEFT:g}pt 24pt;
+         background: white; box-shadow: 0 1pt 4pt rgba(0, 0, 0, 0.3); }}
+table {{ width: 100%; border-collapse: collapse; table-layout: fixed; margin-top: 12pt; }}
+td, th {{ padding: {_padding(SCHEMA_PADDING)}; text-align: left; vertical-align: top; overflow-wrap: anywhere; }}
+table.items {{ font-size: 12pt; }}
+table.items td, table.items th {{ padding: {_padding(ITEM_PADDING)}; }}
+.bold {{ font-weight: bold; }}
+footer {{ margin-top: 36pt; font-size: 8pt; text-align: center; }}
+</style></head><body><div class="page">
+{logo}
+{_section_html(contact_details)}
+{_section_html(invoice_information)}
+{items}
+{_section_html(totals)}
+{footer}
+</div></body></html>
+"""
@@ -1,3 +1,5 @@
+import os
+from functools import lru_cache
 from math import radians
 from pathlib import Path
 from datetime import datetime
@@ -18,92 +20,173 @@ from borb.pdf import (
 from PIL import Image as PILImage
 
 from kscinvoicing.info.party import CompanySender, IndividualRecipient, CompanyRecipient
-from kscinvoicing.invoice.invoicedata import LineItem, InvoiceData
+from kscinvoicing.invoice.invoicedata import (
+    LineItem, LineItemBatch, InvoiceData, line_item_rows, is_line_item_rows, DRAFT_INVOICE_NUMBER
+)
+from kscinvoicing.pdf import fontsubset, nativewriter
 from kscinvoicing.pdf.borbinvoice import BorbInvoice
+from kscinvoicing.pdf.sectioncache import SECTION_CACHE
 from kscinvoicing.pdf.tableschema import TableSchema
 from kscinvoicing.pdf.utils import (
     VerticalSpacer,
     format_money_factory,
-    STYLE,
-    COLOR, Currency, get_headings_for_language, Language,
+    StyleConfig,
+    get_style,
+    Currency, get_headings_for_language, Language,
 )
 
 
+ITEM_ROWS_PER_TABLE = 20  # at most, fewer when descriptions wrap, see nativewriter.paginate_line_items
+
+# "borb" lays invoices out with borb's layout engine, "native" with the much faster nativewriter
+PDF_BACKENDS = ("borb", "native")
+PDF_BACKEND_ENV = "KSCINVOICING_PDF_BACKEND"
+
+
 def get_image_dimensions(path) -> tuple[int, int]:
     with PILImage.open(path) as logo_pil:
         return logo_pil.size
 
 
+@lru_cache(maxsize=16)
+def _load_logo(path: Path, mtime_ns: int) -> PILImage.Image:
+    """Decode a logo once per process (keyed by modification time, so edited files are reloaded)."""
+    with PILImage.open(path) as logo_pil:
+        logo_pil.load()
+        return logo_pil.copy()
+
+
 def build_invoice(
     invoice: InvoiceData,
     logo_path: str = None,
     logo_width: int = 200,
     footer_text: str = None,
     language: str = "fr",
+    style: StyleConfig | str | Path = None,
+    subset_fonts: bool = True,
+    backend: str = None,
+    streaming: bool = False,
 ) -> BorbInvoice:
     """
     Main method to build borb invoice. Returns BorbInvoice object containing borb pdf document and invoice data.
+    Invoices without an assigned number are rendered as drafts, see InvoiceData.assign_number.
     Args:
         invoice: InvoiceData object containing invoice data.
         logo_path: Path to logo image file.
         logo_width: Width of logo image in pixels.
         footer_text: Optional text to display in footer.
+        style: StyleConfig, style name or Path of a style json file (see get_style). Defaults to config/style.json.
+        subset_fonts: Embed only the glyphs used in the invoice rather than the full fonts.
+        backend: "borb" or "native" (see nativewriter), defaults to $KSCINVOICING_PDF_BACKEND or "borb".
+        streaming: Lay the pdf out while it is written, writing each page out as soon as it is full, so that memory
+            doesn't grow with the number of line items (native backend only, see NativeDocument.defer_layout).
     Returns:
         BorbInvoice object containing borb pdf document and invoice data.
     """
+    style_option, style = style, get_style(style)
+    backend = backend or os.environ.get(PDF_BACKEND_ENV) or "borb"
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {backend}")
+    if streaming and backend != "native":
+        raise ValueError("Streaming pdf output needs the native PDF backend")
+
     if logo_path is None:
-        logo = None
         print("Warning: no logo file specified.")
     elif not Path(logo_path).is_file():
         print(f"Warning: logo file '{logo_path}' not found.")
-        logo = None
+        logo_path = None
+    else:
+        logo_path = Path(logo_path)
+
+    contact_details_schema, invoice_information_schema, totals_schema = build_section_schemas(invoice, style=style)
+
+    if backend == "native":
+        pdf = nativewriter.build_invoice_document(
+            contact_details=contact_details_schema,
+            invoice_information=invoice_information_schema,
+            line_items=invoice.items,
+            currency=Currency(invoice.currency),
+            lang=Language(language),
+            totals=totals_schema,
+            style=style,
+            rows_per_table=ITEM_ROWS_PER_TABLE,
+            footer_text=footer_text,
+            logo_path=logo_path,
+            logo_width=logo_width,
+            subset_fonts=subset_fonts,
+            streaming=streaming,
+        )
     else:
-        w, h = get_image_dimensions(logo_path)
-        logo_height = logo_width * h // w
-        logo = Image(Path(logo_path), width=Decimal(logo_width), height=Decimal(logo_height))
-
-    contact_details_schema = _build_contact_details_schema(invoice.sender, invoice.recipient)
-    contact_details_table = contact_details_schema.build_table()
-
-    invoice_information_schema = _build_invoice_info_schema(company_name=invoice.sender.company_name,
-                                                            siren_number=invoice.sender.siren,
-                                                            invoice_number=invoice.invoice_number,
-                                                            bill_date=invoice.date,
-                                                            due_date=invoice.due_date)
-    invoice_information_table = invoice_information_schema.build_table()
-
-    itemised_table = _build_itemised_table(
-        line_items=invoice.items,
-        currency=Currency(invoice.currency),
-        lang=Language(language),
+        logo = None
+        if logo_path is not None:
+            logo_pil = _load_logo(logo_path, logo_path.stat().st_mtime_ns)
+            w, h = logo_pil.size
+            # borb attaches pdf object state to the image, so each document gets its own copy of the cached logo
+            logo = Image(logo_pil.copy(), width=Decimal(logo_width), height=Decimal(logo_width * h // w))
+
+        pdf = _build_invoice_document(
+            logo=logo,
+            contact_details_table=contact_details_schema.build_table(),
+            invoice_information_table=invoice_information_schema.build_table(),
+            itemised_tables=_build_itemised_tables(
+                line_items=invoice.items,
+                currency=Currency(invoice.currency),
+                lang=Language(language),
+                style=style,
+            ),
+            totals_table=totals_schema.build_table(),
+            footer_text=footer_text,
+            style=style,
+        )
+        if subset_fonts:
+            fontsubset.subset_fonts(pdf)
+    if isinstance(style_option, Path):  # kept as an absolute path, see rerender_invoice
+        style_option = str(style_option.resolve())
+    render_options = {
+        "language": language,
+        "logo_path": str(logo_path.resolve()) if logo_path is not None else None,
+        "footer_text": footer_text,
+        "style": style_option if isinstance(style_option, str) else None,
+    }
+    return BorbInvoice(invoice=invoice, document=pdf, render_options=render_options)
+
+
+def build_section_schemas(invoice: InvoiceData,
+                          style: StyleConfig = None) -> tuple[TableSchema, TableSchema, TableSchema]:
+    """
+    The table schemas of the contact details, invoice information and totals sections, shared by the pdf
+    backends and the html preview (see htmlpreview). Each is cached by a hash of its inputs (see sectioncache).
+    """
+    style = get_style(style)
+    contact_details_schema = SECTION_CACHE.get(
+        "contact_details", style, (invoice.sender, invoice.recipient),
+        lambda: _build_contact_details_schema(invoice.sender, invoice.recipient, style=style),
     )
 
-    totals_schema = _build_totals_schema(
-        subtotal=invoice.subtotal,
-        total=invoice.total,
-        discount=invoice.discount,
-        tax=invoice.tax,
-        currency=Currency(invoice.currency),
+    invoice_information = (invoice.sender.company_name, invoice.sender.siren,
+                           invoice.invoice_number or DRAFT_INVOICE_NUMBER, invoice.date, invoice.due_date)
+    invoice_information_schema = SECTION_CACHE.get(
+        "invoice_information", style, invoice_information,
+        lambda: _build_invoice_info_schema(*invoice_information, style=style),
     )
-    totals_table = totals_schema.build_table()
-
-    pdf = _build_invoice_document(
-        logo=logo,
-        contact_details_table=contact_details_table,
-        invoice_information_table=invoice_information_table,
-        itemised_table=itemised_table,
-        totals_table=totals_table,
-        footer_text=footer_text,
+
+    totals = invoice.totals
+    totals_inputs = (totals.subtotal, totals.total, totals.discount, totals.tax, Currency(invoice.currency))
+    totals_schema = SECTION_CACHE.get(
+        "totals", style, totals_inputs,
+        lambda: _build_totals_schema(*totals_inputs, style=style),
     )
-    return BorbInvoice(invoice=invoice, document=pdf)
+    return contact_details_schema, invoice_information_schema, totals_schema
+
 
 def _build_invoice_document(
     contact_details_table: FixedColumnWidthTable,
     invoice_information_table: FixedColumnWidthTable,
-    itemised_table: FixedColumnWidthTable,
+    itemised_tables: list[FixedColumnWidthTable],
     totals_table: FixedColumnWidthTable,
     footer_text: str = None,
     logo: Image = None,
+    style: StyleConfig = None,
 ) -> Document:
     """Creates a pdf object for invoice using borb tables."""
     # Create document & add page
@@ -123,20 +206,22 @@ def _build_invoice_document(
     layout.add(VerticalSpacer(size=Decimal('15')))
     layout.add(invoice_information_table)  # Invoice information (date etc, invoice number)
     layout.add(VerticalSpacer(size=Decimal('5')))
-    layout.add(itemised_table)  # Invoice items
+    for itemised_table in itemised_tables:  # Invoice items, one table per page-sized chunk
+        layout.add(itemised_table)
     layout.add(VerticalSpacer(size=Decimal('10')))
     layout.add(totals_table)  # Invoice totals summary
     if footer_text is not None:
-        _add_footer(page, footer_text)
+        _add_footer(page, footer_text, style=style)
 
     return pdf
 
 
-def _add_footer(page: Page, footer_text: str):
+def _add_footer(page: Page, footer_text: str, style: StyleConfig = None):
     """Places a centered footer at the bottom of the page."""
+    style = get_style(style)
     ps = page.get_page_info().get_size()
     rect = Rectangle(Decimal(0), Decimal(0), Decimal(ps[0]), Decimal(60))
-    footer = Paragraph(footer_text, font_size=Decimal(8), font=STYLE.primary_font, horizontal_alignment=Alignment.CENTERED)
+    footer = Paragraph(footer_text, font_size=Decimal(8), font=style.primary_font, horizontal_alignment=Alignment.CENTERED)
     footer.paint(page, rect)
 
 
@@ -145,6 +230,7 @@ def _build_invoice_info_schema(company_name: str,
                               invoice_number: str,
                               bill_date: datetime,
                               due_date: Optional[datetime] = None,
+                              style: StyleConfig = None,
                               ) -> TableSchema:
     """ Inserts a table with the bill number, todays date and optionally the due date."""
 
@@ -166,7 +252,7 @@ def _build_invoice_info_schema(company_name: str,
     bold_cells = [*[(i, 0) for i in range(len(tabledata))], *[(i, 2) for i in range(len(tabledata))]]
     double_cells = [(0, 0)]
 
-    tableschema = TableSchema(tabledata, column_width_ratios, bold_cells, double_cells)
+    tableschema = TableSchema(tabledata, column_width_ratios, bold_cells, double_cells, style=style)
 
     return tableschema
 
@@ -185,7 +271,8 @@ def _contact_info_to_list(contact: CompanySender | IndividualRecipient, use_cont
     return details
 
 
-def _build_contact_details_schema(sender: CompanySender, recipient: IndividualRecipient) -> TableSchema:
+def _build_contact_details_schema(sender: CompanySender, recipient: IndividualRecipient,
+                                  style: StyleConfig = None) -> TableSchema:
     """ Inserts a table with sender and recipient personal information."""
 
     sender_details = _contact_info_to_list(sender, use_contact_name=True)
@@ -213,7 +300,8 @@ def _build_contact_details_schema(sender: CompanySender, recipient: IndividualRe
     tableschema = TableSchema(tabledata=tabledata,
                               column_widths=column_width_ratios,
                               bold_cells=bold_cells,
-                              font_size=Decimal(12))
+                              font_size=Decimal(12),
+                              style=style)
 
     return tableschema
 
@@ -224,6 +312,7 @@ def _build_totals_schema(
         discount: Decimal,
         tax: Decimal,
         currency: Currency,
+        style: StyleConfig = None,
 ) -> TableSchema:
     """Builds TableSchema """
 
@@ -254,13 +343,30 @@ def _build_totals_schema(
     column_width_ratios = [Decimal(4), Decimal(1), Decimal(1)]
     tableschema = TableSchema(tabledata=tabledata,
                               column_widths=column_width_ratios,
-                              bold_cells=bold_cells)
+                              bold_cells=bold_cells,
+                              style=style)
     return tableschema
 
 
-def _build_itemised_table(line_items: list[LineItem], currency: Currency, lang: Language) -> FixedColumnWidthTable:
-    """Builds Borb table containing line items for the invoice."""
+def _build_itemised_tables(line_items: list[LineItem] | LineItemBatch, currency: Currency, lang: Language,
+                           style: StyleConfig = None,
+                           rows_per_table: int = ITEM_ROWS_PER_TABLE) -> list[FixedColumnWidthTable]:
+    """
+    Builds Borb tables containing the line items for the invoice, each with a heading row and at most
+    rows_per_table items. borb can't split a table across pages, so long invoices need several tables
+    (see nativewriter.paginate_line_items).
+    """
+    style = get_style(style)
+    return [_build_itemised_table(rows, currency, lang, style=style)
+            for rows in nativewriter.paginate_line_items(line_items, currency, lang, style, rows_per_table)]
+
+
+def _build_itemised_table(line_items: list[LineItem] | LineItemBatch | tuple[tuple], currency: Currency,
+                          lang: Language, style: StyleConfig = None) -> FixedColumnWidthTable:
+    """Builds Borb table containing line items (or rows from line_item_rows) for the invoice."""
 
+    style = get_style(style)
+    colors = style.colors
     format_money = format_money_factory(currency)
     headings = get_headings_for_language(lang)
     assert len(headings) == 4
@@ -269,8 +375,8 @@ def _build_itemised_table(line_items: list[LineItem], currency: Currency, lang:
         return TableCell(
             Paragraph(
                 text,
-                font_color=COLOR['white'],
-                font=STYLE.title_font,
+                font_color=colors['white'],
+                font=style.title_font,
                 horizontal_alignment=Alignment.LEFT,
                 vertical_alignment=Alignment.MIDDLE,
                 # padding_top=Decimal(5),
@@ -282,7 +388,7 @@ def _build_itemised_table(line_items: list[LineItem], currency: Currency, lang:
         return TableCell(
             Paragraph(
                 text,
-                font=STYLE.primary_font,
+                font=style.primary_font,
                 respect_newlines_in_text=True,
             ),
         )
@@ -296,17 +402,18 @@ def _build_itemised_table(line_items: list[LineItem], currency: Currency, lang:
     for heading in headings:
         table.add(heading_helper(heading))
 
-    for row_num, item in enumerate(line_items):
+    rows = line_items if is_line_item_rows(line_items) else line_item_rows(line_items)
+    for description, quantity, price_per_unit, price in rows:
 
-        table.add(row_content_helper(item.description))
-        table.add(row_content_helper(str(item.quantity)))
-        table.add(row_content_helper(format_money(item.price_per_unit)))
-        table.add(row_content_helper(format_money(item.price())))
+        table.add(row_content_helper(description))
+        table.add(row_content_helper(str(quantity)))
+        table.add(row_content_helper(format_money(price_per_unit)))
+        table.add(row_content_helper(format_money(price)))
 
     table.even_odd_row_colors(
-        even_row_color=COLOR['light_grey_blue'],
-        odd_row_color=COLOR['lighter_grey_blue'],
-        header_row_color=COLOR['dark_blue'],
+        even_row_color=colors['light_grey_blue'],
+        odd_row_color=colors['lighter_grey_blue'],
+        header_row_color=colors['dark_blue'],
     )
 
     table.set_padding_on_all_cells(
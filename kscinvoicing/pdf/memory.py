@@ -0,0 +1,51 @@
+"""
+Opt-in peak memory measurement of invoice rendering, using tracemalloc.
+
+Tracing slows rendering down several times, so it is off unless the KSCINVOICING_TRACE_MEMORY environment
+variable is set (e.g. with the --trace-memory option of the CLI).
+"""
+import os
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+TRACE_MEMORY_ENV = "KSCINVOICING_TRACE_MEMORY"
+
+
+def trace_memory_enabled() -> bool:
+    return os.environ.get(TRACE_MEMORY_ENV, "") not in ("", "0")
+
+
+@dataclass
+class MemoryReport:
+    peak_bytes: int | None = None  # None when tracing is disabled
+
+    def __str__(self) -> str:
+        if self.peak_bytes is None:
+            return "peak memory not traced"
+        return f"peak memory {self.peak_bytes / 2 ** 20:.1f} MiB"
+
+
+@contextmanager
+def trace_peak_memory(enabled: bool | None = None) -> Iterator[MemoryReport]:
+    """
+    Measure the peak memory allocated by the block, above what was already allocated on entry.
+    enabled=None follows the KSCINVOICING_TRACE_MEMORY environment variable; when disabled the report stays empty.
+    Nested measurements reset the peak of the enclosing one.
+    """
+    report = MemoryReport()
+    if not (trace_memory_enabled() if enabled is None else enabled):
+        yield report
+        return
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    try:
+        yield report
+    finally:
+        report.peak_bytes = tracemalloc.get_traced_memory()[1] - baseline
+        if started:
+            tracemalloc.stop()
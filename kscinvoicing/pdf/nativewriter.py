@@ -0,0 +1,692 @@
+"""
+Native PDF writer for the invoice layout.
+
+borb's layout engine is general purpose: every paragraph, table cell and page element is sized through several
+layers of Decimal geometry, which makes it the dominant cost of build_invoice. The invoice layout itself is fixed
+(logo, contact details, invoice information, line items, totals and footer), so this module lays it out directly,
+following the same placement rules as borb (see SingleColumnLayout, FixedColumnWidthTable and Paragraph), and
+writes the PDF objects itself. The output is visually equivalent to the borb backend, see
+tests/pdf/test_nativewriter.py.
+
+Glyph ids and widths are taken from the style's borb fonts and cached per character, so lines wrap exactly as
+they do with borb; fonts are embedded as subsets of the glyphs drawn (see fontsubset).
+"""
+import io
+import re
+import zlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from itertools import batched, chain
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator
+
+from PIL import Image as PILImage
+
+from kscinvoicing.invoice.invoicedata import LineItem, LineItemBatch, is_line_item_rows, line_item_rows
+from kscinvoicing.pdf.fontsubset import subset_font_program
+from kscinvoicing.pdf.sectioncache import SECTION_CACHE, schema_inputs
+from kscinvoicing.pdf.tableschema import TableSchema
+from kscinvoicing.pdf.utils import StyleConfig, Currency, Language, format_money_factory, get_headings_for_language
+
+# borb's default page (A4) and SingleColumnLayout margins
+PAGE_WIDTH = 595.0
+PAGE_HEIGHT = 842.0
+MARGIN_LEFT = PAGE_WIDTH * 0.1
+MARGIN_TOP = MARGIN_BOTTOM = PAGE_HEIGHT * 0.1
+COLUMN_WIDTH = PAGE_WIDTH * 0.8
+
+LEADING = 1.2  # line height, in font sizes
+ELEMENT_SPACING = 5.0  # between two elements when neither is text
+IMAGE_MARGIN = 5.0
+FONT_SIZE = 12.0
+
+# cell padding (top, right, bottom, left) of TableSchema.build_table and invoicebuilder._build_itemised_table
+SCHEMA_PADDING = (2.0, 2.0, 2.0, 2.0)
+ITEM_PADDING = (7.0, 5.0, 2.0, 5.0)
+ITEM_COLUMN_WIDTHS = [3.0, 1.0, 1.0, 1.0]
+
+_WHITESPACE = re.compile(r"(\s)")
+
+RGB = tuple[float, float, float]
+BLACK: RGB = (0.0, 0.0, 0.0)
+
+
+def _rgb(color) -> RGB:
+    color = color.to_rgb()
+    return float(color.red), float(color.green), float(color.blue)
+
+
+# ---------------------------------------------------------------------------
+# Fonts
+# ---------------------------------------------------------------------------
+
+class FontMetrics:
+    """Glyph ids and widths (in 1/1000 em) of a borb Type0 font, looked up once per character."""
+
+    def __init__(self, font):
+        if font.get("Subtype") != "Type0":
+            raise ValueError(f"The native PDF backend needs TrueType fonts with at least 256 glyphs, "
+                             f"got {font.get('BaseFont')}; use the borb backend instead.")
+        self.font = font
+        descendant = font["DescendantFonts"][0]
+        descriptor = descendant["FontDescriptor"]
+        self.base_font = str(font["BaseFont"])
+        self.descent = float(descriptor["Descent"])
+        self.descriptor = {key: descriptor[key] for key in
+                           ("Flags", "FontBBox", "ItalicAngle", "Ascent", "Descent", "CapHeight", "StemV")
+                           if key in descriptor}
+        self.font_program: bytes = descriptor["FontFile2"]["DecodedBytes"]
+        self._glyphs: dict[str, tuple[int, int]] = {}
+
+    def glyph(self, char: str) -> tuple[int, int]:
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            gid = self.font.unicode_to_character_identifier(char) or 0
+            glyph = self._glyphs[char] = (gid, int(self.font.get_width(gid) or 0))
+        return glyph
+
+    def width(self, text: str, size: float) -> float:
+        glyph = self.glyph
+        return sum(glyph(char)[1] for char in text) * size / 1000
+
+
+_METRICS: dict[int, FontMetrics] = {}
+
+
+def font_metrics(font) -> FontMetrics:
+    """Metrics of a borb font, cached for the fonts of the styles in use."""
+    metrics = _METRICS.get(id(font))
+    if metrics is None or metrics.font is not font:
+        if len(_METRICS) > 32:  # styles are evicted from their own LRU cache, don't keep their fonts alive forever
+            _METRICS.clear()
+        metrics = _METRICS[id(font)] = FontMetrics(font)
+    return metrics
+
+
+def wrap_text(text: str, metrics: FontMetrics, size: float, width: float, respect_newlines: bool = False) -> list[str]:
+    """Split text into lines that fit the width, breaking at whitespace like borb's TextToLineSplitter."""
+    if respect_newlines and "\n" in text:
+        return [line for part in text.split("\n") for line in wrap_text(part, metrics, size, width)]
+    text = re.sub(r"[ \t]+", " ", re.sub(r"\n+", " ", text)).strip()
+    if not text:
+        return [""]
+
+    def fits(candidate: str) -> bool:
+        return round(width - metrics.width(candidate, size), 2) >= 0
+
+    lines: list[str] = []
+    line = ""
+    for token in filter(None, _WHITESPACE.split(text)):
+        if not line and token.isspace():
+            continue
+        if fits(line + token):
+            line += token
+            continue
+        if line:
+            lines.append(line.rstrip(" "))
+        line = "" if token.isspace() else token
+        while not fits(line) and len(line) > 1:
+            # a word wider than the column (which borb refuses to lay out): break it where it overflows
+            end = next((i for i in range(len(line) - 1, 1, -1) if fits(line[:i])), 1)
+            lines.append(line[:end])
+            line = line[end:]
+    if line:
+        lines.append(line.rstrip(" "))
+    return lines
+
+
+# ---------------------------------------------------------------------------
+# Layout elements
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Cell:
+    text: str
+    font: FontMetrics
+    size: float = FONT_SIZE
+    color: RGB = BLACK
+    column_span: int = 1
+    respect_newlines: bool = False
+    middle: bool = False  # vertically centered in its row
+
+
+@dataclass
+class Row:
+    cells: list[Cell]
+    background: RGB | None = None
+
+
+class _Element(ABC):
+    margin = 0.0
+    text_size: float | None = None  # font size of text elements, which borb spaces by their leading
+
+    @abstractmethod
+    def height(self, width: float) -> float:
+        """Height of the element laid out in a column of the given width."""
+
+    @abstractmethod
+    def paint(self, page: "_Page", x: float, top: float, width: float) -> None:
+        """Draw the element on a page, with its top left corner at (x, top)."""
+
+
+class _Text(_Element):
+    """A paragraph, e.g. the blank line under the logo or the centered footer."""
+
+    def __init__(self, text: str, font: FontMetrics, size: float = FONT_SIZE, centered: bool = False):
+        self.text, self.font, self.text_size, self.centered = text, font, size, centered
+
+    def height(self, width: float) -> float:
+        return len(wrap_text(self.text, self.font, self.text_size, width)) * LEADING * self.text_size
+
+    def paint(self, page: "_Page", x: float, top: float, width: float) -> None:
+        lines = wrap_text(self.text, self.font, self.text_size, width)
+        if self.centered:
+            x += (width - max(self.font.width(line, self.text_size) for line in lines)) / 2
+        for i, line in enumerate(lines):
+            page.text(line, self.font, self.text_size, BLACK, x, top - i * LEADING * self.text_size)
+
+
+class _Spacer(_Element):
+    """utils.VerticalSpacer: a one-cell table holding a blank Helvetica line, padded by size."""
+
+    def __init__(self, size: float):
+        self.size = size
+
+    def height(self, width: float) -> float:
+        return self.size + LEADING * FONT_SIZE + 1
+
+    def paint(self, page: "_Page", x: float, top: float, width: float) -> None:
+        pass
+
+
+class _Image(_Element):
+    margin = IMAGE_MARGIN
+
+    def __init__(self, name: str, width: float, height: float):
+        self.name, self.width, self.image_height = name, width, height
+
+    def height(self, width: float) -> float:
+        return self.image_height
+
+    def paint(self, page: "_Page", x: float, top: float, width: float) -> None:
+        page.image(self.name, x, top - self.image_height, self.width, self.image_height)
+
+
+class _Table(_Element):
+    """A FixedColumnWidthTable without borders: columns share the width by ratio, rows fit their tallest cell."""
+
+    def __init__(self, rows: list[Row], column_widths: list[float], padding: tuple[float, float, float, float]):
+        self.rows = rows
+        total = sum(column_widths)
+        self.ratios = [w / total for w in column_widths]
+        self.padding = padding
+        self._layout: tuple[float, list] | None = None  # (width, rows) of the last layout
+
+    def _lay_out(self, width: float) -> list[tuple[float, list[tuple[Cell, float, float, list[str]]]]]:
+        """Rows as (height, [(cell, x offset, cell width, lines)]), for a table width."""
+        if self._layout is not None and self._layout[0] == width:
+            return self._layout[1]
+        top, right, bottom, left = self.padding
+        edges = [0.0]
+        for ratio in self.ratios:
+            edges.append(edges[-1] + width * ratio)
+        rows = []
+        for row in self.rows:
+            cells, column, height = [], 0, 0.0
+            for cell in row.cells:
+                x, cell_width = edges[column], edges[column + cell.column_span] - edges[column]
+                lines = wrap_text(cell.text, cell.font, cell.size, max(0.0, cell_width - left - right),
+                                  cell.respect_newlines)
+                cells.append((cell, x, cell_width, lines))
+                height = max(height, top + len(lines) * LEADING * cell.size + bottom)
+                column += cell.column_span
+            rows.append((height, cells))
+        self._layout = (width, rows)
+        return rows
+
+    def height(self, width: float) -> float:
+        return sum(height for height, _ in self._lay_out(width))
+
+    def paint(self, page: "_Page", x: float, top: float, width: float) -> None:
+        pad_top, _, pad_bottom, pad_left = self.padding
+        for row, (height, cells) in zip(self.rows, self._lay_out(width)):
+            for cell, cell_x, cell_width, lines in cells:
+                if row.background is not None:
+                    page.fill(row.background, x + cell_x, top - height, cell_width, height)
+                text_top = top - pad_top
+                if cell.middle:
+                    text_top -= (height - pad_top - pad_bottom - len(lines) * LEADING * cell.size) / 2
+                for i, line in enumerate(lines):
+                    page.text(line, cell.font, cell.size, cell.color, x + cell_x + pad_left,
+                              text_top - i * LEADING * cell.size)
+            top -= height
+
+
+# ---------------------------------------------------------------------------
+# PDF output
+# ---------------------------------------------------------------------------
+
+@dataclass
+class _FontResource:
+    name: str
+    metrics: FontMetrics
+    used: dict[int, str] = field(default_factory=dict)  # glyph id -> character
+
+
+class _Page:
+    """Content stream of one page."""
+
+    def __init__(self, fonts: dict[int, _FontResource]):
+        self._fonts = fonts
+        self._ops: list[str] = []
+
+    def _font(self, metrics: FontMetrics) -> _FontResource:
+        resource = self._fonts.get(id(metrics))
+        if resource is None:
+            resource = self._fonts[id(metrics)] = _FontResource(f"F{len(self._fonts) + 1}", metrics)
+        return resource
+
+    def text(self, text: str, metrics: FontMetrics, size: float, color: RGB, x: float, line_top: float) -> None:
+        """Draw a line of text whose line box starts at line_top, on the baseline borb's ChunkOfText uses."""
+        if not text:
+            return
+        resource = self._font(metrics)
+        gids = []
+        for char in text:
+            gid = metrics.glyph(char)[0]
+            resource.used.setdefault(gid, char)
+            gids.append(gid)
+        baseline = line_top - size - metrics.descent * size / 1000
+        self._ops.append("BT %.3f %.3f %.3f rg /%s %.2f Tf 1 0 0 1 %.3f %.3f Tm <%s> Tj ET"
+                         % (*color, resource.name, size, x, baseline, "".join(f"{gid:04x}" for gid in gids)))
+
+    def fill(self, color: RGB, x: float, y: float, width: float, height: float) -> None:
+        self._ops.append("%.3f %.3f %.3f rg %.3f %.3f %.3f %.3f re f" % (*color, x, y, width, height))
+
+    def image(self, name: str, x: float, y: float, width: float, height: float) -> None:
+        self._ops.append("q %.3f 0 0 %.3f %.3f %.3f cm /%s Do Q" % (width, height, x, y, name))
+
+    def content(self) -> bytes:
+        return "\n".join(self._ops).encode("latin-1")
+
+
+class _ObjectWriter:
+    """
+    Writes numbered PDF objects to a binary stream as they are added, keeping only their offsets for the xref table.
+    Offsets are counted rather than read from the stream, so it can be a pipe or a socket.
+    """
+
+    def __init__(self, out: BinaryIO):
+        self._out = out
+        self._offset = 0
+        self._offsets: dict[int, int] = {}
+        self._count = 0
+        self._emit(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    def _emit(self, data: bytes) -> None:
+        self._out.write(data)
+        self._offset += len(data)
+
+    def reserve(self) -> int:
+        """Number an object to be added later, so it can be referred to first."""
+        self._count += 1
+        return self._count
+
+    def add(self, body: bytes, number: int | None = None) -> int:
+        if number is None:
+            number = self.reserve()
+        self._offsets[number] = self._offset
+        self._emit(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        return number
+
+    def add_stream(self, entries: str, data: bytes, compress: bool = True, number: int | None = None) -> int:
+        if compress:
+            data = zlib.compress(data, 6)
+            entries += "/Filter/FlateDecode"
+        return self.add(b"<<%s/Length %d>>stream\n%s\nendstream" % (entries.encode("latin-1"), len(data), data),
+                        number)
+
+    def finish(self, catalog: int, info: int) -> None:
+        """Write the xref table and trailer, once every reserved object has been added."""
+        xref = self._offset
+        self._emit(b"xref\n0 %d\n0000000000 65535 f \n" % (self._count + 1))
+        self._emit(b"".join(b"%010d 00000 n \n" % self._offsets[number] for number in range(1, self._count + 1)))
+        self._emit(b"trailer\n<</Size %d/Root %d 0 R/Info %d 0 R>>\nstartxref\n%d\n%%%%EOF\n"
+                   % (self._count + 1, catalog, info, xref))
+
+
+class NativeDocument:
+    """
+    A PDF laid out by this module, written out with write().
+
+    A document can instead be laid out while it is written (see defer_layout): each page is then written out, and
+    dropped, as soon as the next one is started, and the fonts and page tree it refers to are written last. Memory
+    then depends on the size of a page rather than on the size of the document.
+    """
+
+    def __init__(self):
+        self._fonts: dict[int, _FontResource] = {}
+        self._images: dict[str, EncodedImage] = {}
+        self.pages: list[_Page] = [_Page(self._fonts)]
+        self.subset_fonts = True
+        self._layout: Callable[["NativeDocument"], None] | None = None
+        self._write_page: Callable[[_Page], None] | None = None  # while a deferred layout is written
+        self._written_pages = 0
+
+    @property
+    def page_count(self) -> int:
+        """Pages laid out so far (by the last write(), for a deferred layout)."""
+        return self._written_pages + len(self.pages)
+
+    def add_page(self) -> _Page:
+        if self._write_page is not None:
+            self._write_page(self.pages.pop())
+            self._written_pages += 1
+        self.pages.append(_Page(self._fonts))
+        return self.pages[-1]
+
+    def add_image(self, image: "EncodedImage") -> str:
+        name = f"Im{len(self._images) + 1}"
+        self._images[name] = image
+        return name
+
+    def defer_layout(self, layout: Callable[["NativeDocument"], None]) -> None:
+        """
+        Lay the document out with layout(document) on each write() rather than now, writing pages out as they are
+        finished. layout draws on pages[-1] and add_page(), and must lay out the same document every time.
+        """
+        self._layout = layout
+
+    # -- serialization
+
+    def _add_font(self, writer: _ObjectWriter, resource: _FontResource) -> int:
+        metrics = resource.metrics
+        gids = sorted(resource.used)
+        if self.subset_fonts:
+            program = subset_font_program(metrics.font_program, frozenset(gids) | {0})
+        else:
+            program = metrics.font_program
+        font_file = writer.add_stream(f"/Length1 {len(program)}", program)
+
+        descriptor = "".join(f"/{key} {_pdf_value(value)}" for key, value in metrics.descriptor.items())
+        descriptor_number = writer.add(
+            f"<</Type/FontDescriptor/FontName/{metrics.base_font}{descriptor}/FontFile2 {font_file} 0 R>>"
+            .encode("latin-1"))
+        widths = " ".join(f"{gid}[{metrics.glyph(char)[1]}]" for gid, char in sorted(resource.used.items()))
+        descendant = writer.add(
+            f"<</Type/Font/Subtype/CIDFontType2/BaseFont/{metrics.base_font}"
+            f"/CIDSystemInfo<</Registry(Adobe)/Ordering(Identity)/Supplement 0>>"
+            f"/FontDescriptor {descriptor_number} 0 R/DW 250/W[{widths}]/CIDToGIDMap/Identity>>".encode("latin-1"))
+        to_unicode = writer.add_stream("", _to_unicode_cmap(resource.used))
+        return writer.add(
+            f"<</Type/Font/Subtype/Type0/BaseFont/{metrics.base_font}/Encoding/Identity-H"
+            f"/DescendantFonts[{descendant} 0 R]/ToUnicode {to_unicode} 0 R>>".encode("latin-1"))
+
+    @staticmethod
+    def _add_image(writer: _ObjectWriter, image: "EncodedImage") -> int:
+        entries = f"/Type/XObject/Subtype/Image/Width {image.width}/Height {image.height}/BitsPerComponent 8"
+        if image.smask is not None:
+            smask = writer.add_stream(entries + "/ColorSpace/DeviceGray/Filter/FlateDecode", image.smask,
+                                      compress=False)
+            entries += f"/SMask {smask} 0 R"
+        return writer.add_stream(entries + f"/ColorSpace/DeviceRGB/Filter/{image.filter}", image.data,
+                                 compress=False)
+
+    def write(self, out: BinaryIO) -> None:
+        """
+        Serialize the document as a PDF file to a binary stream, which is only written to (never seeked or read),
+        so it can be a pipe or a socket.
+        """
+        writer = _ObjectWriter(out)
+        catalog, pages, info, resources = (writer.reserve() for _ in range(4))
+        kids = []
+
+        def write_page(page: _Page) -> None:
+            page_number = writer.reserve()
+            contents = writer.add_stream("", page.content())
+            writer.add(f"<</Type/Page/Parent {pages} 0 R/MediaBox[0 0 {PAGE_WIDTH:g} {PAGE_HEIGHT:g}]"
+                       f"/Resources {resources} 0 R/Contents {contents} 0 R>>".encode("latin-1"), page_number)
+            kids.append(f"{page_number} 0 R")
+
+        if self._layout is None:
+            for page in self.pages:
+                write_page(page)
+        else:
+            self._fonts.clear()
+            self.pages, self._written_pages = [_Page(self._fonts)], 0
+            self._write_page = write_page
+            try:
+                self._layout(self)
+            finally:
+                self._write_page = None
+            write_page(self.pages.pop())
+            self._written_pages += 1
+
+        fonts = " ".join(f"/{resource.name} {self._add_font(writer, resource)} 0 R"
+                         for resource in self._fonts.values())
+        images = " ".join(f"/{name} {self._add_image(writer, image)} 0 R" for name, image in self._images.items())
+        writer.add(f"<</Font<<{fonts}>>/XObject<<{images}>>>>".encode("latin-1"), resources)
+        writer.add(f"<</Type/Pages/Kids[{' '.join(kids)}]/Count {len(kids)}>>".encode("latin-1"), pages)
+        writer.add(f"<</Type/Catalog/Pages {pages} 0 R>>".encode("latin-1"), catalog)
+        created = datetime.now().strftime("D:%Y%m%d%H%M%S")
+        writer.add(f"<</Producer(ksc-invoicing)/CreationDate({created})>>".encode("latin-1"), info)
+        writer.finish(catalog, info)
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        self.write(buffer)
+        return buffer.getvalue()
+
+
+def _pdf_value(value) -> str:
+    """Serialize a number or number array read from a borb font descriptor."""
+    if isinstance(value, list):
+        return "[" + " ".join(_pdf_value(v) for v in value) + "]"
+    return f"{float(value):g}"
+
+
+def _to_unicode_cmap(used: dict[int, str]) -> bytes:
+    pairs = [f"<{gid:04x}> <{char.encode('utf-16-be').hex()}>" for gid, char in sorted(used.items())]
+    blocks = "".join(f"{len(chunk)} beginbfchar\n" + "\n".join(chunk) + "\nendbfchar\n"
+                     for chunk in batched(pairs, 100))
+    return ("/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+            "/CIDSystemInfo <</Registry (Adobe) /Ordering (UCS) /Supplement 0>> def\n"
+            "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+            "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+            f"{blocks}endcmap\nCMapName currentdict /CMap defineresource pop\nend\nend\n").encode("latin-1")
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    width: int
+    height: int
+    data: bytes
+    filter: str  # DCTDecode (JPEG) or FlateDecode (RGB samples)
+    smask: bytes | None = None  # compressed alpha channel
+
+
+@lru_cache(maxsize=16)
+def _encode_logo(path: Path, mtime_ns: int) -> EncodedImage:
+    """
+    Encode a logo like borb does: RGBA images as RGB samples with an alpha mask, others as JPEG (flattened on white).
+    Keyed by modification time, so edited files are reloaded.
+    """
+    with PILImage.open(path) as image:
+        if image.mode == "RGBA":
+            return EncodedImage(image.width, image.height, zlib.compress(image.convert("RGB").tobytes(), 6),
+                                "FlateDecode", zlib.compress(image.getchannel("A").tobytes(), 6))
+        image = image.convert("RGBA") if image.mode in ("P", "LA") else image
+        if image.mode == "RGBA":
+            background = PILImage.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG")
+        return EncodedImage(image.width, image.height, buffer.getvalue(), "DCTDecode")
+
+
+# ---------------------------------------------------------------------------
+# Invoice
+# ---------------------------------------------------------------------------
+
+def _schema_table(schema: TableSchema) -> _Table:
+    """The table TableSchema.build_table makes: bold cells in the title font, double cells spanning two columns."""
+    primary, title = font_metrics(schema.style.primary_font), font_metrics(schema.style.title_font)
+    rows = []
+    for i, values in enumerate(schema.tabledata):
+        cells, skip = [], False
+        for j, value in enumerate(values):
+            if skip:
+                skip = False
+                continue
+            span = 2 if (i, j) in schema.double_cells else 1
+            skip = span == 2
+            cells.append(Cell(value, title if (i, j) in schema.bold_cells else primary, float(schema.font_size),
+                              column_span=span))
+        rows.append(Row(cells))
+    return _Table(rows, [float(w) for w in schema.column_widths], SCHEMA_PADDING)
+
+
+def _item_rows(rows, currency: Currency, lang: Language, style: StyleConfig) -> list[Row]:
+    """The rows of invoicebuilder._build_itemised_table: a heading row, then line items in alternating colours."""
+    primary, title = font_metrics(style.primary_font), font_metrics(style.title_font)
+    colors = {name: _rgb(color) for name, color in style.colors.items()}
+    format_money = format_money_factory(currency)
+    table_rows = [Row([Cell(text, title, color=colors["white"], middle=True)
+                       for text in get_headings_for_language(lang)], background=colors["dark_blue"])]
+    for i, (description, quantity, price_per_unit, price) in enumerate(rows, start=1):
+        table_rows.append(Row(
+            [Cell(description, primary, respect_newlines=True), Cell(str(quantity), primary),
+             Cell(format_money(price_per_unit), primary), Cell(format_money(price), primary)],
+            background=colors["lighter_grey_blue"] if i % 2 else colors["light_grey_blue"],
+        ))
+    return table_rows
+
+
+def paginate_line_items(line_items: list[LineItem] | LineItemBatch | tuple[tuple], currency: Currency,
+                        lang: Language, style: StyleConfig, rows_per_table: int) -> list[tuple]:
+    """
+    Split the rows of line_item_rows into the chunks laid out as separate item tables, since borb can't split a
+    table across pages: at most rows_per_table rows each, and short enough to fit on a page under their heading.
+    Cached by the rows (see sectioncache), since measuring them wraps every description.
+    """
+    rows = line_items if is_line_item_rows(line_items) else tuple(line_item_rows(line_items))
+    return SECTION_CACHE.get("item_pages", style, (rows, currency, lang, rows_per_table),
+                             lambda: _paginate_rows(rows, currency, lang, style, rows_per_table))
+
+
+def _paginate_rows(rows: tuple[tuple], currency: Currency, lang: Language, style: StyleConfig,
+                   rows_per_table: int) -> list[tuple]:
+    return list(_iter_item_pages(rows, currency, lang, style, rows_per_table))
+
+
+def _iter_item_pages(rows: Iterable[tuple], currency: Currency, lang: Language, style: StyleConfig,
+                     rows_per_table: int) -> Iterator[tuple]:
+    """The chunks of paginate_line_items, measuring rows_per_table rows at a time rather than all of them at once."""
+    chunk, height = [], 0.0
+    for window in batched(rows, rows_per_table):
+        heading_height, *heights = [height for height, _ in
+                                    _Table(_item_rows(window, currency, lang, style), ITEM_COLUMN_WIDTHS, ITEM_PADDING)
+                                    ._lay_out(COLUMN_WIDTH)]
+        max_height = PAGE_HEIGHT - MARGIN_TOP - MARGIN_BOTTOM - heading_height
+        for row, row_height in zip(window, heights):
+            if chunk and (len(chunk) == rows_per_table or round(height + row_height, 2) > round(max_height, 2)):
+                yield tuple(chunk)
+                chunk, height = [], 0.0
+            chunk.append(row)
+            height += row_height
+    if chunk:
+        yield tuple(chunk)
+
+
+def _item_tables(line_items: list[LineItem] | LineItemBatch, currency: Currency, lang: Language,
+                 style: StyleConfig, rows_per_table: int) -> list[_Table]:
+    """The item tables, one per page-sized chunk (see paginate_line_items)."""
+    rows = tuple(line_item_rows(line_items))
+    return SECTION_CACHE.get(
+        "native_items", style, (rows, currency, lang, rows_per_table),
+        lambda: [_Table(_item_rows(chunk, currency, lang, style), ITEM_COLUMN_WIDTHS, ITEM_PADDING)
+                 for chunk in paginate_line_items(rows, currency, lang, style, rows_per_table)],
+    )
+
+
+def _section_table(schema: TableSchema) -> _Table:
+    """_schema_table, cached: tables are only read once laid out, so documents can share them."""
+    return SECTION_CACHE.get("native_table", schema.style, schema_inputs(schema), lambda: _schema_table(schema))
+
+
+def _flow(document: NativeDocument, elements: Iterable[_Element]) -> None:
+    """Place elements top to bottom like borb's SingleColumnLayout, moving to a new page when one doesn't fit."""
+    page = document.pages[-1]
+    previous: tuple[_Element, float] | None = None  # last element on the page and the y of its bottom
+    for element in elements:
+        width = COLUMN_WIDTH - 2 * element.margin
+        height = element.height(width)
+        top = PAGE_HEIGHT - MARGIN_TOP
+        if previous is not None:
+            previous_element, previous_bottom = previous
+            sizes = [e.text_size for e in (previous_element, element) if e.text_size is not None]
+            top = previous_bottom - (max(LEADING * size for size in sizes) if sizes else ELEMENT_SPACING)
+            top -= max(previous_element.margin, element.margin)
+            if round(height, 2) > round(top - MARGIN_BOTTOM, 2):
+                page = document.add_page()
+                top = PAGE_HEIGHT - MARGIN_TOP
+        element.paint(page, MARGIN_LEFT + element.margin, top, width)
+        previous = (element, top - height)
+
+
+def build_invoice_document(
+    contact_details: TableSchema,
+    invoice_information: TableSchema,
+    line_items: list[LineItem] | LineItemBatch,
+    currency: Currency,
+    lang: Language,
+    totals: TableSchema,
+    style: StyleConfig,
+    rows_per_table: int,
+    footer_text: str = None,
+    logo_path: Path = None,
+    logo_width: int = 200,
+    subset_fonts: bool = True,
+    streaming: bool = False,
+) -> NativeDocument:
+    """
+    Lay out an invoice from the same table schemas as the borb backend (see invoicebuilder.build_invoice).
+    With streaming, the invoice is laid out while it is written, one page at a time (see NativeDocument.defer_layout),
+    and its item tables are built page by page instead of being cached.
+    """
+    document = NativeDocument()
+    document.subset_fonts = subset_fonts
+
+    header: list[_Element] = []
+    if logo_path is not None:
+        logo = _encode_logo(logo_path, logo_path.stat().st_mtime_ns)
+        header.append(_Image(document.add_image(logo), logo_width, logo_width * logo.height // logo.width))
+    primary = font_metrics(style.primary_font)
+    header += [
+        _Text(" ", primary),
+        _section_table(contact_details),
+        _Spacer(15),
+        _section_table(invoice_information),
+        _Spacer(5),
+    ]
+    trailer = [_Spacer(10), _section_table(totals)]
+
+    def item_tables() -> Iterable[_Table]:
+        if not streaming:
+            return _item_tables(line_items, currency, lang, style, rows_per_table)
+        return (_Table(_item_rows(chunk, currency, lang, style), ITEM_COLUMN_WIDTHS, ITEM_PADDING)
+                for chunk in _iter_item_pages(line_item_rows(line_items), currency, lang, style, rows_per_table))
+
+    def lay_out(document: NativeDocument) -> None:
+        if footer_text is not None:  # on the first page, as with borb, painted first so the page can be written out
+            _Text(footer_text, primary, size=8, centered=True).paint(document.pages[0], 0.0, 60.0, PAGE_WIDTH)
+        _flow(document, chain(header, item_tables(), trailer))
+
+    if streaming:
+        document.defer_layout(lay_out)
+    else:
+        lay_out(document)
+    return document
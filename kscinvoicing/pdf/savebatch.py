@@ -0,0 +1,129 @@
+"""
+Atomic, group-committed saving of rendered invoices: pdf files and their invoice log entries.
+
+Each pdf is written to a temporary file next to its final path and fsynced. The invoices are then logged in a single
+DB transaction, and only once it is committed are the temporary files renamed to their final names and their
+folders fsynced. A crash therefore never leaves a pdf under an invoice number that wasn't logged (and will be given
+to another invoice): either nothing but a temporary file remains, or the invoice is logged and its pdf, if the rename
+didn't happen, can be regenerated from its snapshot (see archive). A batch of invoices pays for one transaction and
+one fsync per folder, instead of one each.
+
+Invoices logged elsewhere (by schedules.run_schedules and render job workers, see
+generate_invoice_from_json.render_numbered_invoice) follow the same order with write_temp_pdf and move_pdfs.
+"""
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.invoice import InvoiceData
+from kscinvoicing.pdf.borbinvoice import BorbInvoice
+
+TEMP_SUFFIX = ".tmp"
+
+
+def _fsync_dir(folder: Path) -> None:
+    """Make renames in a folder durable. Folders can't be opened on Windows, where renames need no fsync."""
+    if os.name == "nt":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_temp_pdf(invoice_with_pdf: BorbInvoice, save_path: Path) -> Path:
+    """Write and fsync the pdf to a hidden temporary file in the folder of save_path, returning its path."""
+    fd, temp_path = tempfile.mkstemp(dir=save_path.parent, prefix=f".{save_path.name}.", suffix=TEMP_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            invoice_with_pdf._write(f)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return Path(temp_path)
+
+
+def move_pdfs(moves: Iterable[tuple[Path, Path]]) -> None:
+    """Rename (temporary path, final path) pairs, once their invoices are logged, and fsync each folder once."""
+    folders = set()
+    for temp_path, save_path in moves:
+        os.replace(temp_path, save_path)
+        folders.add(save_path.parent)
+    for folder in folders:
+        _fsync_dir(folder)
+
+
+@dataclass
+class _Pending:
+    invoice: InvoiceData
+    record: dict
+    temp_path: Path
+    save_path: Path
+
+
+class SaveBatch:
+    """
+    Rendered invoices waiting to be saved and logged together by commit(). All invoices of a batch must use the
+    same invoice DB. Their numbers are reserved in the DB (see InvoiceData.assign_number) until the commit, and
+    given back if the commit fails or the batch is discarded.
+    """
+
+    def __init__(self):
+        self.db_path: Path | None = None
+        self._pending: list[_Pending] = []
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def assign_number(self, invoice: InvoiceData) -> str:
+        """
+        Reserve the number of an invoice to be added to this batch. If it isn't added (its render failed), give the
+        number back with invoice.release_number(), so the next invoice takes it.
+        """
+        return invoice.assign_number()
+
+    def add(self, invoice_with_pdf: BorbInvoice) -> Path:
+        """Write the pdf of a numbered invoice to a temporary file. Returns the path it will be saved to."""
+        invoice = invoice_with_pdf.invoice
+        if invoice.invoice_number is None:
+            raise ValueError("Invoice has no number, call assign_number() before saving it.")
+        if self.db_path is None:
+            self.db_path = invoice.logger.db_path
+        elif invoice.logger.db_path != self.db_path:
+            raise ValueError(f"Invoice logged to '{invoice.logger.db_path}', not to this batch's '{self.db_path}'")
+        save_path = invoice_with_pdf._get_save_path()
+        temp_path = write_temp_pdf(invoice_with_pdf, save_path)
+        record = invoice_store.invoice_record(invoice, invoice_with_pdf.render_options)
+        self._pending.append(_Pending(invoice, record, temp_path, save_path))
+        return save_path
+
+    def commit(self) -> list[tuple[int, Path]]:
+        """
+        Log the pending invoices in one transaction, then move their pdfs to their final paths. If logging fails,
+        the pdfs are discarded, their numbers given back and the error raised.
+        Returns the (invoice id, path) of each invoice.
+        """
+        if not self._pending:
+            return []
+        try:
+            invoice_ids = invoice_store.log_invoices([p.record for p in self._pending], self.db_path)
+        except BaseException:
+            self.discard()
+            raise
+        pending, self._pending = self._pending, []
+        move_pdfs((p.temp_path, p.save_path) for p in pending)
+        return [(invoice_id, p.save_path) for invoice_id, p in zip(invoice_ids, pending)]
+
+    def discard(self) -> None:
+        """Delete the pdfs of the pending invoices, which are not logged, and give back their numbers."""
+        pending, self._pending = self._pending, []
+        for p in pending:
+            p.temp_path.unlink(missing_ok=True)
+        if pending:
+            invoice_store.release_invoice_numbers([p.invoice.invoice_number for p in pending], self.db_path)
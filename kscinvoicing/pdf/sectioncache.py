@@ -0,0 +1,71 @@
+"""
+Cache of built invoice sections (contact details, invoice information, line items, totals), keyed by a hash of
+their inputs.
+
+Re-rendering an invoice after a small edit, or rendering a batch of invoices that share sender and recipient,
+then only rebuilds the sections whose inputs changed. Cached sections are shared between renders, so only
+values that rendering never mutates are cached: table schemas, item pages and native layout tables, html
+fragments. borb layout elements carry per-document state and are always rebuilt.
+"""
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Callable, TypeVar
+
+from kscinvoicing.pdf.tableschema import TableSchema
+from kscinvoicing.pdf.utils import StyleConfig
+
+SECTION_CACHE_SIZE = 128
+
+T = TypeVar("T")
+
+
+def input_hash(inputs: tuple) -> bytes:
+    """Digest of picklable section inputs (dataclasses, strings, numbers, Decimals, datetimes...)."""
+    return hashlib.sha256(pickle.dumps(inputs, protocol=pickle.HIGHEST_PROTOCOL)).digest()
+
+
+def schema_inputs(schema: TableSchema) -> tuple:
+    """The inputs of a section built from a table schema (its style is keyed separately)."""
+    return (schema.tabledata, schema.column_widths, schema.bold_cells, schema.double_cells, schema.font_size)
+
+
+class SectionCache:
+    """Thread-safe LRU cache of sections by (section name, style, hash of inputs)."""
+
+    def __init__(self, maxsize: int = SECTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # values are kept with their style, so the style's id isn't reused while it is part of a key
+        self._sections: OrderedDict[tuple, tuple[StyleConfig, object]] = OrderedDict()
+
+    def get(self, section: str, style: StyleConfig, inputs: tuple, build: Callable[[], T]) -> T:
+        """The cached section for these inputs, built with build() on a miss."""
+        key = (section, id(style), input_hash(inputs))
+        with self._lock:
+            entry = self._sections.get(key)
+            if entry is not None:
+                self._sections.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = build()
+        with self._lock:
+            self._sections[key] = (style, value)
+            while len(self._sections) > self.maxsize:
+                self._sections.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sections.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+
+SECTION_CACHE = SectionCache()
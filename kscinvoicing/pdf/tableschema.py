@@ -7,7 +7,7 @@ from borb.pdf import (
     TableCell,
 )
 
-from kscinvoicing.pdf.utils import STYLE
+from kscinvoicing.pdf.utils import StyleConfig, get_style
 
 
 @dataclass
@@ -19,8 +19,10 @@ class TableSchema:
     bold_cells: list[tuple[int, int]]
     double_cells: list[tuple[int, int]] = field(default_factory=lambda: [])  # merges righthand cell with specified cell
     font_size: Decimal = Decimal(12)
+    style: StyleConfig = None  # defaults to the default style
 
     def __post_init__(self):
+        self.style = get_style(self.style)
 
         self.n_rows = len(self.tabledata)
         self.n_cols = len(self.tabledata[0])
@@ -57,7 +59,7 @@ class TableSchema:
                 if (i, j) in ignore_cells:
                     continue
 
-                font = STYLE.title_font if (i, j) in self.bold_cells else STYLE.primary_font
+                font = self.style.title_font if (i, j) in self.bold_cells else self.style.primary_font
                 text = Paragraph(val, font=font, font_size=self.font_size)
 
                 if (i, j) in self.double_cells:
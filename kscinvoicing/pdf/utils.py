@@ -1,11 +1,13 @@
 import locale # for french currency
 from dataclasses import dataclass, field
 from decimal import Decimal
+from functools import lru_cache
 from pathlib import Path
 import json
 import enum
 
 from borb.pdf import (
+    HexColor,
     RGBColor,
     TrueTypeFont,
     FixedColumnWidthTable,
@@ -72,32 +74,87 @@ def get_headings_for_language(language: Language) -> list[str]:
 
 
 CONFIG_FOLDER = Path(__file__).parents[2] / "config"
+STYLES_FOLDER = CONFIG_FOLDER / "styles"
+DEFAULT_STYLE = "default"
+STYLE_CACHE_SIZE = 8  # each style holds its parsed fonts, so only keep the recently used ones
+
+
+def _parse_color(value: str | list) -> RGBColor:
+    """Parse a colour from style json, either a hex string ("#24406f") or [r, g, b] components in 0-1."""
+    if isinstance(value, str):
+        return HexColor(value)
+    r, g, b = value
+    return RGBColor(Decimal(r), Decimal(g), Decimal(b))
+
 
 @dataclass
 class StyleConfig:
     cfg: dict
+    base_folder: Path = CONFIG_FOLDER  # font paths in cfg are relative to this folder
     primary_font: TrueTypeFont = field(init=False)
     title_font: TrueTypeFont = field(init=False)
+    colors: dict[str, RGBColor] = field(init=False)
 
     @staticmethod
-    def load_font(font_path: str) -> TrueTypeFont:
-        full_font_path = CONFIG_FOLDER / font_path
+    def load_font(font_path: str, base_folder: Path = CONFIG_FOLDER) -> TrueTypeFont:
+        full_font_path = base_folder / font_path
         if not full_font_path.exists(): # borb throws obscure AssertionError better to catch beforehand
             raise FileNotFoundError(f"Font file not found: {full_font_path}")
         return TrueTypeFont.true_type_font_from_file(full_font_path)
 
     def __post_init__(self):
-        self.primary_font = self.load_font(self.cfg['primary_font'])
-        self.title_font = self.load_font(self.cfg['title_font'])
+        self.primary_font = self.load_font(self.cfg['primary_font'], self.base_folder)
+        self.title_font = self.load_font(self.cfg['title_font'], self.base_folder)
+        self.colors = {**COLOR, **{name: _parse_color(value) for name, value in self.cfg.get('colors', {}).items()}}
 
 
-def load_style_config() -> StyleConfig:
-    """Load style configuration from json file."""
-    style_path = CONFIG_FOLDER / "style.json"
+def _style_path(style: str | Path) -> Path:
+    """
+    Resolve a style name (a json file in config/styles, with or without its .json suffix, or "default" for
+    config/style.json) or a Path. Names come from invoice json, so they can't leave config/styles: style files
+    elsewhere must be given as Path objects.
+    """
+    if isinstance(style, Path):
+        return style.resolve()
+    if style == DEFAULT_STYLE:
+        return (CONFIG_FOLDER / "style.json").resolve()
+    style_path = (STYLES_FOLDER / (style if style.endswith(".json") else f"{style}.json")).resolve()
+    if not style_path.is_relative_to(STYLES_FOLDER.resolve()):
+        raise ValueError(f"Style {style!r} is not in {STYLES_FOLDER}, pass a Path to use another style file")
+    return style_path
+
+
+def _read_style(style_path: Path) -> StyleConfig:
     with open(style_path, "r") as file:
         style_cfg = json.load(file)
-    style = StyleConfig(style_cfg)
-    return style
+    return StyleConfig(style_cfg, base_folder=style_path.parent)
+
+
+@lru_cache(maxsize=STYLE_CACHE_SIZE)
+def _load_style(style_path: Path, mtime_ns: int) -> StyleConfig:
+    """Load a style once per process (keyed by modification time, so edited files are reloaded)."""
+    return _read_style(style_path)
+
+
+def get_style(style: StyleConfig | str | Path | None = None) -> StyleConfig:
+    """
+    Return the StyleConfig for a style name or json Path (see _style_path), loading it on first use.
+    Styles are kept in a small LRU cache, so several senders can use different styles in one process.
+    None gives the default style (STYLE, which is never evicted); StyleConfig objects are returned unchanged.
+    """
+    if isinstance(style, StyleConfig):
+        return style
+    style_path = _style_path(style or DEFAULT_STYLE)
+    if style_path == _style_path(DEFAULT_STYLE):
+        return STYLE
+    if not style_path.is_file():
+        raise FileNotFoundError(f"Style file not found: {style_path}")
+    return _load_style(style_path, style_path.stat().st_mtime_ns)
+
+
+def load_style_config() -> StyleConfig:
+    """Load the default style configuration from json file."""
+    return _read_style(_style_path(DEFAULT_STYLE))
 
 STYLE = load_style_config()
 
@@ -7,12 +7,20 @@ from decimal import Decimal
 from pathlib import Path
 
 import streamlit as st
+import streamlit.components.v1 as components
 
 from kscinvoicing.web import profile_store
+from kscinvoicing.web.client_index import get_client_index
+from kscinvoicing.web.line_item_index import get_line_item_index
 from kscinvoicing.info import Address, CompanySender, IndividualRecipient, CompanyRecipient
 from kscinvoicing.invoice import LineItem, InvoiceData
+from kscinvoicing.pdf.htmlpreview import build_invoice_html
 from kscinvoicing.pdf.invoicebuilder import build_invoice
 
+CLIENT_PICKER_SIZE = 50  # clients listed by the pickers, best search matches first
+LINE_ITEM_SUGGESTIONS = 8  # past line items suggested for each description
+
+
 # ---------------------------------------------------------------------------
 # Session state initialisation
 # ---------------------------------------------------------------------------
@@ -72,6 +80,29 @@ def _build_recipient(d: dict) -> IndividualRecipient | CompanyRecipient:
     )
 
 
+def _build_invoice_data(sender: dict, client: dict, items: list[dict], save_folder: str, currency: str,
+                        invoice_date: date, due_date: date | None, discount: float, tax_rate: float) -> InvoiceData:
+    """Build an (unnumbered) InvoiceData from the generate form, for the preview and the final invoice."""
+    return InvoiceData(
+        sender=_build_sender(sender),
+        recipient=_build_recipient(client),
+        items=[
+            LineItem(
+                description=it["description"],
+                quantity=int(it["quantity"]),
+                price_per_unit=Decimal(str(it["price_per_unit"])),
+            )
+            for it in items
+        ],
+        save_folder=Path(save_folder),
+        currency=currency,
+        date=datetime.combine(invoice_date, datetime.min.time()),
+        due_date=datetime.combine(due_date, datetime.min.time()) if due_date is not None else None,
+        discount=Decimal(str(discount)),
+        tax_rate=Decimal(str(tax_rate)),
+    )
+
+
 # ---------------------------------------------------------------------------
 # Reusable address form widget (returns dict)
 # ---------------------------------------------------------------------------
@@ -94,8 +125,8 @@ def _address_form(prefix: str, defaults: dict) -> dict:
 # ---------------------------------------------------------------------------
 
 def _tab_generate():
-    history = profile_store.load_line_item_history()
-    history_keys = list(history.keys())
+    line_item_index = get_line_item_index()
+    history = line_item_index.history
 
     # ---- Sender ----
     st.subheader("Sender")
@@ -109,17 +140,24 @@ def _tab_generate():
 
     # ---- Client ----
     st.subheader("Client")
-    clients = profile_store.load_clients()
+    client_index = get_client_index()
+    clients = client_index.clients
+    selected_client = None
     if not clients:
         st.warning("No clients saved. Go to the Manage Clients tab.")
-        selected_client = None
     else:
-        client_options = list(clients.keys())
-        selected_client = st.selectbox("Select client", client_options, key="selected_client_gen")
-        c_data = clients[selected_client]
-        type_label = "Company" if c_data.get("type") == "company" else "Individual"
-        company_info = f" — {c_data['company_name']}" if c_data.get("type") == "company" else ""
-        st.info(f"**{selected_client}**{company_info} ({type_label}) | {c_data.get('email', '')}")
+        c1, c2 = st.columns([1, 2])
+        client_query = c1.text_input("Search clients", key="client_search_gen",
+                                     placeholder="Reference, company, name or email")
+        client_options = client_index.search(client_query, limit=CLIENT_PICKER_SIZE)
+        if not client_options:
+            c2.info(f"No clients matching '{client_query}'.")
+        else:
+            selected_client = c2.selectbox("Select client", client_options, key="selected_client_gen")
+            c_data = clients[selected_client]
+            type_label = "Company" if c_data.get("type") == "company" else "Individual"
+            company_info = f" — {c_data['company_name']}" if c_data.get("type") == "company" else ""
+            st.info(f"**{selected_client}**{company_info} ({type_label}) | {c_data.get('email', '')}")
 
     # ---- Line items ----
     st.subheader("Line items")
@@ -128,15 +166,16 @@ def _tab_generate():
     for i, item in enumerate(st.session_state["line_items"]):
         c1, c2, c3, c4 = st.columns([4, 1, 1.5, 0.5])
 
-        mode_options = ["-- Custom --"] + history_keys
-        current_desc = item.get("description", "")
-        default_mode_idx = history_keys.index(current_desc) + 1 if current_desc in history_keys else 0
-        chosen = c1.selectbox("Description", mode_options, index=default_mode_idx, key=f"item_desc_sel_{i}",
-                               label_visibility="collapsed")
+        # suggestions for the typed description: the top matches from the history index, not the whole history
+        typed = c1.text_input("Description", value=item.get("description", ""),
+                              key=f"item_desc_txt_{i}", label_visibility="collapsed",
+                              placeholder="Description (type to search past line items)")
+        suggestions = line_item_index.search(typed, limit=LINE_ITEM_SUGGESTIONS)
+        chosen = c1.selectbox("Past line items", ["-- Custom --"] + suggestions, key=f"item_desc_sel_{i}",
+                              label_visibility="collapsed")
 
         if chosen == "-- Custom --":
-            desc = c1.text_input("Custom description", value=current_desc, key=f"item_desc_txt_{i}",
-                                  label_visibility="collapsed", placeholder="Description")
+            desc = typed
             qty_default = item.get("quantity", 1)
             price_default = item.get("price_per_unit", 0.0)
         else:
@@ -188,6 +227,33 @@ def _tab_generate():
 
     save_folder = st.text_input("Save folder", value="invoices", key="inv_save_folder")
 
+    valid_items = [it for it in st.session_state["line_items"] if it.get("description")]
+
+    def invoice_from_form() -> InvoiceData:
+        return _build_invoice_data(saved_sender, clients[selected_client], valid_items, save_folder, currency,
+                                   invoice_date, due_date if due_date_enabled else None, discount, tax_rate)
+
+    # ---- Preview ----
+    # re-rendered as html on every change; the pdf is only built on generation
+    with st.expander("Preview", expanded=True):
+        if saved_sender is None or selected_client is None or not valid_items:
+            st.caption("Select a sender, a client and at least one line item to see a preview.")
+        else:
+            try:
+                components.html(
+                    build_invoice_html(
+                        invoice_from_form(),
+                        logo_path=saved_sender.get("logo_path") or None,
+                        logo_width=int(logo_width),
+                        footer_text=saved_sender.get("footer_text") or None,
+                        language=language,
+                    ),
+                    height=900,
+                    scrolling=True,
+                )
+            except Exception as e:
+                st.caption(f"No preview: {e}")
+
     # ---- Generate ----
     st.divider()
     if st.button("Generate Invoice", type="primary"):
@@ -196,7 +262,6 @@ def _tab_generate():
             errors.append("No sender profile saved. Go to the Sender Profile tab.")
         if selected_client is None:
             errors.append("No clients saved. Add a client in the Manage Clients tab.")
-        valid_items = [it for it in st.session_state["line_items"] if it.get("description")]
         if not valid_items:
             errors.append("At least one line item with a description is required.")
 
@@ -204,35 +269,13 @@ def _tab_generate():
             for e in errors:
                 st.error(e)
         else:
+            invoice_data = None
             try:
-                sender_obj = _build_sender(saved_sender)
-                recipient_obj = _build_recipient(clients[selected_client])
-                line_item_objs = [
-                    LineItem(
-                        description=it["description"],
-                        quantity=int(it["quantity"]),
-                        price_per_unit=Decimal(str(it["price_per_unit"])),
-                    )
-                    for it in valid_items
-                ]
-
                 folder = Path(save_folder)
                 folder.mkdir(parents=True, exist_ok=True)
 
-                invoice_dt = datetime.combine(invoice_date, datetime.min.time())
-                due_dt = datetime.combine(due_date, datetime.min.time()) if due_date_enabled else None
-
-                invoice_data = InvoiceData(
-                    sender=sender_obj,
-                    recipient=recipient_obj,
-                    items=line_item_objs,
-                    save_folder=folder,
-                    currency=currency,
-                    date=invoice_dt,
-                    due_date=due_dt,
-                    discount=Decimal(str(discount)),
-                    tax_rate=Decimal(str(tax_rate)),
-                )
+                invoice_data = invoice_from_form()
+                invoice_data.assign_number()
 
                 saved_logo = saved_sender.get("logo_path") or None
                 saved_footer = saved_sender.get("footer_text") or None
@@ -265,6 +308,8 @@ def _tab_generate():
                         )
 
             except Exception as e:
+                if invoice_data is not None:  # a no-op once the invoice is logged
+                    invoice_data.release_number()
                 st.error(f"Error generating invoice: {e}")
 
 
@@ -272,35 +317,50 @@ def _tab_generate():
 # Tab 2: Manage Clients
 # ---------------------------------------------------------------------------
 
-def _tab_clients():
+def _client_rows(clients: dict) -> list[dict]:
+    """Table rows of the saved clients."""
+    return [
+        {
+            "Reference": key,
+            "Type": "Company" if data.get("type") == "company" else "Individual",
+            "Company": data.get("company_name", "") if data.get("type") == "company" else "",
+            "Email": data.get("email", ""),
+        }
+        for key, data in clients.items()
+    ]
+
+
+@st.cache_data(max_entries=1)
+def _clients_dataframe(version: tuple[int, int, int]):
+    """Table of all saved clients, indexed by reference, rebuilt only when the client store version changes."""
     import pandas as pd
+    return pd.DataFrame(_client_rows(get_client_index().clients)).set_index("Reference", drop=False)
 
-    clients = profile_store.load_clients()
+
+def _tab_clients():
+    client_index = get_client_index()
+    clients = client_index.clients
 
     # ---- Client list ----
     st.subheader("Saved clients")
     selected_key = None
     if clients:
-        rows = [
-            {
-                "Reference": key,
-                "Type": "Company" if data.get("type") == "company" else "Individual",
-                "Company": data.get("company_name", "") if data.get("type") == "company" else "",
-                "Email": data.get("email", ""),
-            }
-            for key, data in clients.items()
-        ]
-        df = pd.DataFrame(rows)
+        df = _clients_dataframe(profile_store.clients_version())
+        client_query = st.text_input("Search clients", key="client_search_manage",
+                                     placeholder="Reference, company, name or email")
+        if client_query.strip():
+            df = df.loc[client_index.search(client_query, limit=CLIENT_PICKER_SIZE)]
         event = st.dataframe(
             df,
             use_container_width=True,
             hide_index=True,
             on_select="rerun",
             selection_mode="single-row",
+            key=f"clients_table_{client_query}",
         )
         selected_rows = event.selection.rows if event else []
         if selected_rows:
-            selected_key = rows[selected_rows[0]]["Reference"]
+            selected_key = df.iloc[selected_rows[0]]["Reference"]
     else:
         st.info("No clients saved yet.")
 
@@ -452,87 +512,156 @@ def _tab_sender():
 
 
 # ---------------------------------------------------------------------------
-# Main
+# Tab 4: Invoice History
 # ---------------------------------------------------------------------------
 
+HISTORY_PAGE_SIZES = [25, 50, 100]
+
+
+def _history_rows(invoices: list[dict]) -> list[dict]:
+    """Table rows of the invoice history page."""
+    status_labels = {"unpaid": "🔴 Unpaid", "paid": "🟢 Paid", "overdue": "🟡 Overdue"}
+    return [
+        {
+            "Number": inv["number"],
+            "Date": inv["date"] or "—",
+            "Client": inv["client_name"] or "—",
+            "Total": f"{inv['total']:,.2f} {inv['currency'] or ''}".strip() if inv["total"] is not None else "—",
+            "Status": status_labels.get(inv["status"], inv["status"]),
+        }
+        for inv in invoices
+    ]
+
+
+def _export_csv(export_what: str, db_path: Path, date_from: date | None, date_to: date | None,
+                status: str | None) -> bytes:
+    """CSV of the invoices or line items of the history tab's export, spooled to disk while written if large."""
+    from kscinvoicing.invoice.export import spool_csv, write_invoices_csv, write_line_items_csv
+
+    write_csv = write_invoices_csv if export_what == "Invoices" else write_line_items_csv
+    with spool_csv(write_csv, db_path=db_path, date_from=date_from, date_to=date_to, status=status) as csv_file:
+        return csv_file.read()
+
+
 def _tab_history():
+    import pandas as pd
     import kscinvoicing.invoice.invoice_store as invoice_store
 
-    invoices = invoice_store.get_all_invoices(profile_store.INVOICE_DB)
-
-    if not invoices:
+    db_path = profile_store.INVOICE_DB
+    if invoice_store.summarize_invoices(db_path=db_path)["count"] == 0:
         st.info("No invoices logged yet. Generate an invoice to get started.")
         return
 
-    status_filter = st.selectbox(
-        "Filter by status", ["All", "Unpaid", "Paid", "Overdue"], key="hist_status_filter"
+    c1, c2 = st.columns([3, 1])
+    search_query = c1.text_input(
+        "Search", key="hist_search", placeholder="Client name or line item description, e.g. cern workshop"
     )
-    filtered = (
-        invoices
-        if status_filter == "All"
-        else [i for i in invoices if i["status"] == status_filter.lower()]
+    status_filter = c2.selectbox(
+        "Filter by status", ["All", "Unpaid", "Paid", "Overdue"], key="hist_status_filter"
     )
+    status = None if status_filter == "All" else status_filter.lower()
+
+    with st.expander("Export CSV"):
+        c1, c2, c3 = st.columns(3)
+        export_what = c1.selectbox("Export", ["Invoices", "Line items"], key="hist_export_what")
+        export_from = c2.date_input("From", value=None, key="hist_export_from")
+        export_to = c3.date_input("To", value=None, key="hist_export_to")
+        st.caption(f"Status filter: {status_filter}")
+        if st.button("Prepare CSV", key="hist_export_btn"):
+            st.download_button(
+                label="Download CSV",
+                data=_export_csv(export_what, db_path, export_from, export_to, status),
+                file_name=f"{export_what.lower().replace(' ', '_')}.csv",
+                mime="text/csv",
+                key="hist_export_download",
+            )
+
+    # Only the current page is fetched, for searches too
+    c1, c2 = st.columns([1, 3])
+    page_size = c1.selectbox("Per page", HISTORY_PAGE_SIZES, key="hist_page_size")
+    if search_query.strip():
+        summary = invoice_store.summarize_search(search_query, status, db_path=db_path)
+    else:
+        summary = invoice_store.summarize_invoices(status, db_path=db_path)
 
-    if not filtered:
-        st.info(f"No {status_filter.lower()} invoices.")
+    if summary["count"] == 0:
+        if search_query.strip():
+            st.info(f"No invoices matching '{search_query}'.")
+        else:
+            st.info(f"No {status_filter.lower()} invoices.")
         return
 
+    page_count = -(-summary["count"] // page_size)
+    page = c2.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1,
+                           key=f"hist_page_{search_query}_{status_filter}_{page_size}")
+    offset = (page - 1) * page_size
+    if search_query.strip():
+        invoices = invoice_store.search_invoices(search_query, page_size, status, offset, db_path=db_path)
+    else:
+        invoices = invoice_store.get_invoices_page(offset, page_size, status, db_path=db_path)
+
     # Summary metrics
-    total_sum = sum(i["total"] or 0 for i in filtered)
     c1, c2 = st.columns(2)
-    c1.metric("Invoices", len(filtered))
-    c2.metric("Total", f"{total_sum:,.2f}")
+    c1.metric("Invoices", summary["count"])
+    c2.metric("Total", f"{summary['total']:,.2f}")
 
     st.divider()
 
-    # Per-invoice rows
-    for inv in filtered:
-        c1, c2, c3, c4, c5, c6, c7 = st.columns([1, 2, 3, 2, 2, 2, 1])
-        c1.write(f"**#{inv['number']}**")
-        c2.write(inv["date"] or "—")
-        c3.write(inv["client_name"] or "—")
-        currency = inv["currency"] or ""
-        c4.write(f"{inv['total']:,.2f} {currency}".strip() if inv["total"] is not None else "—")
-
-        status = inv["status"]
-        status_label = {"unpaid": "🔴 Unpaid", "paid": "🟢 Paid", "overdue": "🟡 Overdue"}.get(status, status)
-        c5.write(status_label)
-
-        if status == "paid":
-            if c6.button("Mark Unpaid", key=f"unpaid_{inv['id']}"):
-                invoice_store.update_invoice_status(inv["id"], "unpaid", profile_store.INVOICE_DB)
-                st.rerun()
-        else:
-            if c6.button("Mark Paid", key=f"paid_{inv['id']}"):
-                invoice_store.update_invoice_status(inv["id"], "paid", profile_store.INVOICE_DB)
-                st.rerun()
+    event = st.dataframe(
+        pd.DataFrame(_history_rows(invoices)),
+        use_container_width=True,
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="multi-row",
+        key=f"hist_table_{search_query}_{status_filter}_{page}_{page_size}",
+    )
+    selected = [invoices[i] for i in (event.selection.rows if event else [])]
+    if not selected:
+        st.caption("Select invoices to mark them paid or unpaid, view their line items or delete them.")
+        return
 
-        if c7.button("🗑", key=f"del_{inv['id']}", help="Delete invoice"):
-            st.session_state["delete_invoice_confirm"] = inv["id"]
+    # Actions on the selected rows
+    ids = [inv["id"] for inv in selected]
+    numbers = ", ".join(f"#{inv['number']}" for inv in selected)
+    c1, c2, c3 = st.columns(3)
+    if c1.button("Mark Paid", key="hist_paid_btn"):
+        invoice_store.update_invoices_status(ids, "paid", db_path)
+        st.rerun()
+    if c2.button("Mark Unpaid", key="hist_unpaid_btn"):
+        invoice_store.update_invoices_status(ids, "unpaid", db_path)
+        st.rerun()
+    if c3.button("🗑 Delete", key="hist_del_btn"):
+        st.session_state["delete_invoice_confirm"] = ids
+
+    # Delete confirmation
+    if st.session_state.get("delete_invoice_confirm") == ids:
+        st.warning(f"Delete invoice(s) **{numbers}**? This cannot be undone.")
+        col1, col2 = st.columns(2)
+        if col1.button("Yes, delete", key="confirm_del_btn"):
+            invoice_store.delete_invoices(ids, db_path)
+            st.session_state.pop("delete_invoice_confirm", None)
+            st.rerun()
+        if col2.button("Cancel", key="cancel_del_btn"):
+            st.session_state.pop("delete_invoice_confirm", None)
+            st.rerun()
 
-        # Delete confirmation
-        if st.session_state.get("delete_invoice_confirm") == inv["id"]:
-            st.warning(f"Delete invoice **#{inv['number']}**? This cannot be undone.")
-            col1, col2 = st.columns(2)
-            if col1.button("Yes, delete", key=f"confirm_del_{inv['id']}"):
-                invoice_store.delete_invoice(inv["id"], profile_store.INVOICE_DB)
-                st.session_state.pop("delete_invoice_confirm", None)
-                st.rerun()
-            if col2.button("Cancel", key=f"cancel_del_{inv['id']}"):
-                st.session_state.pop("delete_invoice_confirm", None)
-                st.rerun()
+    with st.expander(f"Line items of {numbers}"):
+        line_items = invoice_store.get_line_items_for_invoices(ids, db_path)
+        for inv in selected:
+            st.markdown(f"**#{inv['number']}** — {inv['client_name'] or '—'}")
+            if not line_items[inv["id"]]:
+                st.caption("No line items logged.")
+            for li in line_items[inv["id"]]:
+                st.write(
+                    f"- {li['description']} × {li['quantity']} @ "
+                    f"{li['price_per_unit']:.2f} = "
+                    f"{li['quantity'] * li['price_per_unit']:.2f}"
+                )
 
-        # Line items expander (only for invoices that have them)
-        line_items = invoice_store.get_invoice_line_items(inv["id"], profile_store.INVOICE_DB)
-        if line_items:
-            with st.expander("Line items"):
-                for li in line_items:
-                    st.write(
-                        f"- {li['description']} × {li['quantity']} @ "
-                        f"{li['price_per_unit']:.2f} = "
-                        f"{li['quantity'] * li['price_per_unit']:.2f}"
-                    )
 
+# ---------------------------------------------------------------------------
+# Main
+# ---------------------------------------------------------------------------
 
 def main():
     st.set_page_config(page_title="KSC Invoicing", layout="wide")
@@ -543,6 +672,11 @@ def main():
     if migrated:
         st.toast(f"Migrated {migrated} invoice(s) from legacy log files.")
 
+    from kscinvoicing.invoice.invoice_store import run_overdue_sweep
+    overdue = run_overdue_sweep(db_path=profile_store.INVOICE_DB)
+    if overdue:
+        st.toast(f"Marked {overdue} invoice(s) as overdue.")
+
     tab1, tab2, tab3, tab4 = st.tabs(["Generate Invoice", "Manage Clients", "Sender Profile", "Invoice History"])
 
     with tab1:
@@ -0,0 +1,76 @@
+"""
+Search index over saved clients, for the client pickers of the web UI.
+No Streamlit dependency — independently testable.
+
+Clients are matched on their reference, company name, contact name and email, ignoring case and accents.
+Words starting with the query rank before other substring matches; prefix lookups use a sorted word list, so
+search stays fast for client books of thousands of entries.
+"""
+import re
+import unicodedata
+from bisect import bisect_left
+
+from kscinvoicing.web import profile_store
+
+SEARCH_FIELDS = ("company_name", "name", "email")
+
+
+def normalize(text: str) -> str:
+    """Casefold and strip accents, so "équipe" matches "Equipe"."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class ClientIndex:
+    """Prefix and substring index over a clients dict (see profile_store.load_clients), which it keeps as clients."""
+
+    def __init__(self, clients: dict):
+        self.clients = clients
+        self.keys = list(clients)
+        self._texts: list[str] = []  # normalized searchable text of each client, for substring matches
+        words = set()
+        for position, (key, data) in enumerate(clients.items()):
+            fields = [key, *(data.get(name) or "" for name in SEARCH_FIELDS)]
+            text = normalize(" ".join(fields))
+            self._texts.append(text)
+            words.update((word, position) for word in re.findall(r"\w+", text))
+            words.add((normalize(key), position))  # the whole reference, for prefixes spanning several words
+        self._words = sorted(words)
+
+    def _prefix_matches(self, prefix: str) -> set[int]:
+        matches = set()
+        for word, position in self._words[bisect_left(self._words, (prefix,)):]:
+            if not word.startswith(prefix):
+                break
+            matches.add(position)
+        return matches
+
+    def search(self, query: str, limit: int = 20) -> list[str]:
+        """
+        Keys of the clients matching every word of the query, best first: clients with a word starting with
+        each query word, then clients merely containing them, each group in saved order.
+        """
+        terms = re.findall(r"\w+", normalize(query)) if query.strip() else []
+        if not terms:
+            return self.keys[:limit]
+        prefix = set.intersection(*(self._prefix_matches(term) for term in terms))
+        ranked = sorted(prefix)
+        if len(ranked) < limit:
+            ranked += [position for position, text in enumerate(self._texts)
+                       if position not in prefix and all(term in text for term in terms)]
+        return [self.keys[position] for position in ranked[:limit]]
+
+
+_index: tuple[tuple[int, int, int], ClientIndex] | None = None
+
+
+def get_client_index() -> ClientIndex:
+    """
+    The index of the saved clients, rebuilt only when the client store changes.
+    Its clients dict is shared between callers and must not be modified; use profile_store to save changes.
+    """
+    global _index
+    version = profile_store.clients_version()
+    if _index is None or _index[0] != version:
+        _index = (version, ClientIndex(profile_store.load_clients()))
+    return _index[1]
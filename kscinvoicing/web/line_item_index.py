@@ -0,0 +1,74 @@
+"""
+Fuzzy autocomplete over the line item history, for the description fields of the web UI.
+No Streamlit dependency — independently testable.
+
+Descriptions are indexed by the trigrams of their words, padded so that the first letters of a word form
+trigrams too: a query matches the descriptions sharing enough of its trigrams, which tolerates typos and
+works from the first letter typed. Only the posting lists of the query's trigrams are visited, so lookups
+don't scan the whole history.
+"""
+import heapq
+import re
+from collections import Counter
+
+from kscinvoicing.web import profile_store
+from kscinvoicing.web.client_index import normalize
+
+MIN_SCORE = 0.5  # share of the query's trigrams a description must contain
+
+
+def trigrams(text: str) -> set[str]:
+    """Trigrams of the words of a text, each word padded with two leading spaces and one trailing space."""
+    grams = set()
+    for word in re.findall(r"\w+", normalize(text)):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class LineItemIndex:
+    """Trigram index over a line item history (see profile_store.load_line_item_history), kept as history."""
+
+    def __init__(self, history: dict):
+        self.history = history
+        self.descriptions = list(history)
+        self._normalized = [normalize(description) for description in self.descriptions]
+        self._counts = [entry.get("count", 0) for entry in history.values()]
+        self._by_usage = sorted(self.descriptions, key=lambda d: -history[d].get("count", 0))
+        self._postings: dict[str, list[int]] = {}
+        for position, description in enumerate(self.descriptions):
+            for gram in trigrams(description):
+                self._postings.setdefault(gram, []).append(position)
+
+    def search(self, query: str, limit: int = 10) -> list[str]:
+        """
+        Top matches for a partially typed description: descriptions containing the query first, then by
+        share of matching trigrams, then by usage count. An empty query gives the most used descriptions.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return self._by_usage[:limit]
+        shared = Counter(position for gram in grams for position in self._postings.get(gram, ()))
+        needle = normalize(query.strip())
+        scored = [
+            (needle not in self._normalized[position], -matches / len(grams),
+             -self._counts[position], position)
+            for position, matches in shared.items()
+            if matches / len(grams) >= MIN_SCORE
+        ]
+        return [self.descriptions[position] for *_, position in heapq.nsmallest(limit, scored)]
+
+
+_index: tuple[tuple[int, int, int], LineItemIndex] | None = None
+
+
+def get_line_item_index() -> LineItemIndex:
+    """
+    The index of the line item history, rebuilt only when the history changes.
+    Its history dict is shared between callers and must not be modified; use profile_store to record items.
+    """
+    global _index
+    version = profile_store.line_item_history_version()
+    if _index is None or _index[0] != version:
+        _index = (version, LineItemIndex(profile_store.load_line_item_history()))
+    return _index[1]
@@ -23,6 +23,24 @@ def _ensure_data_dir():
     DATA_DIR.mkdir(exist_ok=True)
 
 
+# writes from this process, in case a file's mtime and size don't change
+_writes: dict[str, int] = {"clients": 0, "line_item_history": 0}
+
+
+def _version(path: Path, name: str) -> tuple[int, int, int]:
+    """Changes whenever the file is written, for caches of data derived from it."""
+    if not path.exists():
+        return 0, 0, _writes[name]
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size, _writes[name]
+
+
+def _write_json(path: Path, name: str, data: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    _writes[name] += 1
+
+
 # ---------------------------------------------------------------------------
 # Invoice DB
 # ---------------------------------------------------------------------------
@@ -30,7 +48,7 @@ def _ensure_data_dir():
 def run_migration() -> int:
     """
     Initialise the invoice DB and import any legacy log.json files.
-    Idempotent — safe to call on every app start.
+    Idempotent — safe to call on every app start (the DB schema is only checked once per process, see init_db).
     Returns the total number of newly migrated entries.
     """
     from kscinvoicing.invoice.invoice_store import init_db, migrate_from_json
@@ -62,6 +80,11 @@ def save_sender(data: dict) -> None:
 # Clients
 # ---------------------------------------------------------------------------
 
+def clients_version() -> tuple[int, int, int]:
+    """Changes whenever the client store is written, for caches of data derived from the clients."""
+    return _version(CLIENTS_FILE, "clients")
+
+
 def load_clients() -> dict:
     """Return dict keyed by client display name."""
     if not CLIENTS_FILE.exists():
@@ -74,21 +97,24 @@ def save_client(key: str, data: dict) -> None:
     _ensure_data_dir()
     clients = load_clients()
     clients[key] = data
-    with open(CLIENTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(clients, f, indent=2, ensure_ascii=False)
+    _write_json(CLIENTS_FILE, "clients", clients)
 
 
 def delete_client(key: str) -> None:
     clients = load_clients()
     clients.pop(key, None)
-    with open(CLIENTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(clients, f, indent=2, ensure_ascii=False)
+    _write_json(CLIENTS_FILE, "clients", clients)
 
 
 # ---------------------------------------------------------------------------
 # Line item history
 # ---------------------------------------------------------------------------
 
+def line_item_history_version() -> tuple[int, int, int]:
+    """Changes whenever the line item history is written."""
+    return _version(LINE_ITEM_HISTORY_FILE, "line_item_history")
+
+
 def load_line_item_history() -> dict:
     """Return dict keyed by description string, sorted by usage count descending."""
     if not LINE_ITEM_HISTORY_FILE.exists():
@@ -114,5 +140,4 @@ def record_line_items(items: list[dict]) -> None:
                 "price_per_unit": str(item["price_per_unit"]),
                 "count": 1,
             }
-    with open(LINE_ITEM_HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(history, f, indent=2, ensure_ascii=False)
+    _write_json(LINE_ITEM_HISTORY_FILE, "line_item_history", history)
@@ -0,0 +1,47 @@
+"""
+Benchmark script: render the example invoice repeatedly and report render time and PDF size,
+with and without font subsetting, and with the native PDF backend.
+Usage: python -m scripts.benchmark [runs]
+"""
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+from kscinvoicing.generate_invoice_from_json import invoice_data_from_json, invoice_from_json
+from kscinvoicing.pdf.invoicebuilder import build_invoice
+
+
+def benchmark(data: dict, runs: int, subset_fonts: bool, backend: str = "borb") -> tuple[float, int]:
+    """Return the mean seconds per render (build and serialize) and the PDF size in bytes."""
+    invoice = invoice_from_json(data)
+    size = 0
+    start = time.perf_counter()
+    for _ in range(runs):
+        with contextlib.redirect_stdout(io.StringIO()):  # silence logo warnings
+            invoice_with_pdf = build_invoice(invoice, logo_path=data.get('logo_path'),
+                                             footer_text=data.get('footer_text'), language=data['language'],
+                                             subset_fonts=subset_fonts, backend=backend)
+        size = len(invoice_with_pdf.to_bytes())
+    return (time.perf_counter() - start) / runs, size
+
+
+def main(runs: int = 5):
+    file_path = Path(__file__).parents[1] / "example_config/invoice.json"
+    data = invoice_data_from_json(str(file_path))
+
+    print(f"{'backend':<10}{'fonts':<10}{'time/render':>14}{'pdf size':>12}")
+    results = {}
+    for backend, label, subset_fonts in (("borb", "full", False), ("borb", "subset", True),
+                                         ("native", "subset", True)):
+        seconds, size = benchmark(data, runs, subset_fonts, backend)
+        results[backend, label] = seconds, size
+        print(f"{backend:<10}{label:<10}{seconds * 1000:>11.1f} ms{size / 1024:>9.1f} KB")
+    borb_seconds, borb_size = results["borb", "subset"]
+    print(f"subsetting saves {1 - borb_size / results['borb', 'full'][1]:.0%} of the pdf size")
+    print(f"the native backend renders {borb_seconds / results['native', 'subset'][0]:.0f}x faster than borb")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -62,6 +62,7 @@ def main():
         tax_rate=0.0,
         currency="EUR",
     )
+    invoice_data.assign_number()
 
     invoice = build_invoice(
         invoice=invoice_data,
@@ -0,0 +1,151 @@
+"""Tests for the headless rendering API in kscinvoicing.api.server."""
+import http.client
+import json
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from kscinvoicing.api.server import MAX_BODY_BYTES, RenderServer, RenderService
+from kscinvoicing.invoice import invoice_store
+
+EXAMPLE_CONFIG = Path(__file__).parents[2] / "example_config"
+PAYLOAD = json.loads((EXAMPLE_CONFIG / "invoice.json").read_text(encoding="utf-8"))
+PAYLOAD["logo_path"] = "logo.png"  # inside the service's base_dir
+
+
+@pytest.fixture(scope="module")
+def api(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("api")
+    shutil.copy(EXAMPLE_CONFIG / "example_logo.png", tmp_path / "logo.png")
+    service = RenderService(workers=1, queue_size=1, db_path=tmp_path / "invoices.db", store_pdfs=True,
+                            base_dir=tmp_path)
+    server = RenderServer(("localhost", 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{server.server_port}", service, tmp_path
+    server.shutdown()
+    server.server_close()
+    service.shutdown()
+
+
+def _post(url: str, payload) -> tuple[int, dict, bytes]:
+    data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+    request = urllib.request.Request(url, data=data, method="POST", headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+def _get(url: str) -> tuple[int, bytes]:
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_draft_render_returns_pdf_without_logging(api):
+    base_url, service, tmp_path = api
+    status, headers, body = _post(f"{base_url}/invoices?draft=1", dict(PAYLOAD, save_location=str(tmp_path)))
+    assert status == 200
+    assert headers["Content-Type"] == "application/pdf"
+    assert body.startswith(b"%PDF")
+    assert "X-Invoice-Number" not in headers
+    assert invoice_store.get_all_invoices(service.db_path) == []
+
+
+def test_render_numbers_saves_and_logs(api):
+    base_url, service, tmp_path = api
+    status, headers, body = _post(f"{base_url}/invoices", dict(PAYLOAD, save_location=str(tmp_path)))
+    assert status == 200
+    number = headers["X-Invoice-Number"]
+    assert number in [i["number"] for i in invoice_store.get_all_invoices(service.db_path)]
+    assert list(tmp_path.glob(f"Invoice_{number}_*.pdf"))
+
+
+def test_stored_pdf_is_streamed_from_db(api):
+    base_url, service, tmp_path = api
+    status, headers, body = _post(f"{base_url}/invoices", dict(PAYLOAD, save_location=str(tmp_path)))
+    number = headers["X-Invoice-Number"]
+
+    with urllib.request.urlopen(f"{base_url}/invoices/{number}/pdf", timeout=60) as response:
+        assert response.read() == body
+        etag = response.headers["ETag"]
+    request = urllib.request.Request(f"{base_url}/invoices/{number}/pdf", headers={"If-None-Match": etag})
+    with pytest.raises(urllib.error.HTTPError) as not_modified:
+        urllib.request.urlopen(request, timeout=60)
+    assert not_modified.value.code == 304
+    assert _get(f"{base_url}/invoices/9999/pdf")[0] == 404
+
+
+def test_async_job(api):
+    base_url, service, tmp_path = api
+    status, headers, body = _post(f"{base_url}/invoices?async=1&draft=1", dict(PAYLOAD, save_location=str(tmp_path)))
+    assert status == 202
+    job_id = json.loads(body)["job_id"]
+    assert headers["Location"] == f"/jobs/{job_id}"
+
+    service.get_job(job_id).result(timeout=60)
+    status, body = _get(f"{base_url}/jobs/{job_id}")
+    assert json.loads(body)["status"] == "done"
+    status, body = _get(f"{base_url}/jobs/{job_id}/pdf")
+    assert status == 200 and body.startswith(b"%PDF")
+    assert _get(f"{base_url}/jobs/unknown")[0] == 404
+
+
+def test_invalid_payload_rejected(api):
+    base_url, _, _ = api
+    status, _, body = _post(f"{base_url}/invoices", {"currency": "EUR"})
+    assert status == 400
+    assert "$.sender: required field missing" in json.loads(body)["errors"]
+    assert _post(f"{base_url}/invoices", b"{not json")[0] == 400
+
+
+def test_missing_or_oversized_content_length_rejected(api):
+    base_url, _, _ = api
+    host, port = base_url.removeprefix("http://").split(":")
+    for headers in ({}, {"Content-Length": str(MAX_BODY_BYTES + 1)}, {"Content-Length": "lots"},
+                    {"Content-Length": "-1"}):
+        connection = http.client.HTTPConnection(host, int(port), timeout=60)
+        connection.putrequest("POST", "/invoices")
+        for key, value in headers.items():
+            connection.putheader(key, value)
+        connection.endheaders()  # no body is sent: the server must answer without reading one
+        assert connection.getresponse().status == 413
+        connection.close()
+
+
+def test_backpressure_when_queue_full(api, monkeypatch):
+    base_url, service, tmp_path = api
+    monkeypatch.setattr(service, "_in_flight", service.capacity)
+    status, headers, body = _post(f"{base_url}/invoices?draft=1", dict(PAYLOAD, save_location=str(tmp_path)))
+    assert status == 503
+    assert headers["Retry-After"] == "1"
+
+
+def test_paths_outside_base_dir_rejected(api):
+    base_url, service, tmp_path = api
+    for payload in (dict(PAYLOAD, save_location=str(tmp_path.parent)), dict(PAYLOAD, save_location="../out"),
+                    dict(PAYLOAD, save_location=".", logo_path=str(EXAMPLE_CONFIG / "example_logo.png"))):
+        status, _, body = _post(f"{base_url}/invoices", payload)
+        assert status == 400
+        assert json.loads(body)["errors"][0].endswith("must be inside the server's base folder")
+
+
+def test_failed_render_gives_its_number_back(api):
+    base_url, service, tmp_path = api
+    (tmp_path / "broken.png").write_bytes(b"not an image")
+    number = invoice_store.get_next_invoice_number(service.db_path)
+    assert _post(f"{base_url}/invoices", dict(PAYLOAD, save_location=".", logo_path="broken.png"))[0] == 500
+    deadline = time.time() + 10
+    while invoice_store.get_next_invoice_number(service.db_path) != number and time.time() < deadline:
+        time.sleep(0.05)  # released by the job's done callback
+    status, headers, _ = _post(f"{base_url}/invoices", dict(PAYLOAD, save_location="."))
+    assert headers["X-Invoice-Number"] == number
@@ -0,0 +1,397 @@
+"""Unit tests for kscinvoicing.invoice.invoice_store and the CSV export and archives built on it."""
+import csv
+import io
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.info import Address, CompanySender, IndividualRecipient
+from kscinvoicing.invoice import InvoiceData, LineItem
+from kscinvoicing.invoice.archive import write_archive
+from kscinvoicing.invoice.export import spool_csv, write_invoices_csv, write_line_items_csv
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "invoices.db"
+    invoice_store.init_db(path)
+    return path
+
+
+def _log(db_path, client: str, invoice_date: date, descriptions: list[str], status: str = "unpaid",
+         due_date: date | None = None) -> int:
+    """Number and log an invoice for `client`, returning its row id."""
+    address = Address(number="1", street="Rue A", postcode="75000", city="Paris", country="France")
+    invoice = InvoiceData(
+        sender=CompanySender(siren="123456789", company_name="ACME", name="Alice", address=address, email="a@a.fr"),
+        recipient=IndividualRecipient(name=client, address=address, email="c@c.fr"),
+        items=[LineItem(description=d, quantity=2, price_per_unit=Decimal("10.00")) for d in descriptions],
+        save_folder=db_path.parent,
+        currency="EUR",
+        date=datetime.combine(invoice_date, datetime.min.time()),
+        due_date=datetime.combine(due_date, datetime.min.time()) if due_date else None,
+        db_path=db_path,
+    )
+    invoice.assign_number()
+    invoice_id = invoice_store.log_invoice(invoice, db_path)
+    if status != "unpaid":
+        invoice_store.update_invoice_status(invoice_id, status, db_path)
+    return invoice_id
+
+
+@pytest.fixture
+def history(db_path):
+    _log(db_path, "Bob", date(2024, 1, 15), ["Consulting"])
+    _log(db_path, "Carol", date(2024, 2, 10), ["Workshop", "Travel"], status="paid")
+    _log(db_path, "Dave", date(2024, 3, 5), ["Training"])
+    return db_path
+
+
+# ---------------------------------------------------------------------------
+# Streaming queries
+# ---------------------------------------------------------------------------
+
+def test_iter_invoices_all_in_number_order(history):
+    rows = list(invoice_store.iter_invoices(history, batch_size=1))
+    assert [r["number"] for r in rows] == ["0001", "0002", "0003"]
+
+
+def test_iter_invoices_date_range_is_inclusive(history):
+    rows = list(invoice_store.iter_invoices(history, date_from=date(2024, 2, 10), date_to=date(2024, 3, 5)))
+    assert [r["client_name"] for r in rows] == ["Carol", "Dave"]
+
+
+def test_iter_invoices_status_filter(history):
+    rows = list(invoice_store.iter_invoices(history, status="unpaid"))
+    assert [r["client_name"] for r in rows] == ["Bob", "Dave"]
+
+
+def test_iter_line_items_joins_invoice(history):
+    rows = list(invoice_store.iter_line_items(history, status="paid"))
+    assert [(r["invoice_number"], r["description"]) for r in rows] == [("0002", "Workshop"), ("0002", "Travel")]
+
+
+# ---------------------------------------------------------------------------
+# CSV export
+# ---------------------------------------------------------------------------
+
+def test_write_invoices_csv(history):
+    out = io.StringIO()
+    count = write_invoices_csv(out, history, date_to=date(2024, 2, 28))
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert count == 2
+    assert [r["number"] for r in rows] == ["0001", "0002"]
+    assert rows[1]["status"] == "paid"
+    assert float(rows[1]["total"]) == 40.0
+
+
+def test_write_line_items_csv(history):
+    out = io.StringIO()
+    count = write_line_items_csv(out, history)
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert count == 4
+    assert rows[0]["description"] == "Consulting"
+    assert rows[0]["quantity"] == "2"
+
+
+def test_spool_csv_returns_rewound_bytes(history):
+    spool = spool_csv(write_invoices_csv, db_path=history, status="paid")
+    lines = spool.read().decode("utf-8").splitlines()
+    assert lines[0].startswith("number,date")
+    assert len(lines) == 2
+
+
+# ---------------------------------------------------------------------------
+# Archives
+# ---------------------------------------------------------------------------
+
+class _NonSeekable(io.RawIOBase):
+    """Write-only stream without seek/tell, like stdout."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+def _fake_render(row: dict, db_path) -> bytes:
+    if row["client_name"] == "Dave":
+        raise RuntimeError("no snapshot")
+    return b"%PDF regenerated " + row["number"].encode()
+
+
+def _manifest(text: bytes) -> list[dict]:
+    return list(csv.DictReader(io.StringIO(text.decode("utf-8"))))
+
+
+def test_write_archive_zip_with_manifest(history):
+    (history.parent / "Invoice_0001_Bob_2024-01-15.pdf").write_bytes(b"%PDF bob")
+    out = _NonSeekable()
+    counts = write_archive(out, history.parent, history, date_to=date(2024, 2, 28))
+    assert counts == {"file": 1, "regenerated": 0, "missing": 1}
+
+    with zipfile.ZipFile(io.BytesIO(bytes(out.data))) as archive:
+        assert archive.namelist() == ["Invoice_0001_Bob_2024-01-15.pdf", "manifest.csv"]
+        assert archive.read("Invoice_0001_Bob_2024-01-15.pdf") == b"%PDF bob"
+        manifest = _manifest(archive.read("manifest.csv"))
+    assert [(r["number"], r["file"], r["source"]) for r in manifest] == [
+        ("0001", "Invoice_0001_Bob_2024-01-15.pdf", "file"), ("0002", "", "missing")]
+
+
+def test_write_archive_tar_regenerates_missing(history):
+    (history.parent / "Invoice_0002_Carol_2024-02-10.pdf").write_bytes(b"%PDF carol")
+    out = io.BytesIO()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        counts = write_archive(out, history.parent, history, fmt="tar", regenerate=_fake_render, executor=executor)
+    assert counts == {"file": 1, "regenerated": 1, "missing": 1}
+
+    out.seek(0)
+    with tarfile.open(fileobj=out, mode="r:gz") as archive:
+        assert archive.extractfile("Invoice_0001_Bob_2024-01-15.pdf").read() == b"%PDF regenerated 0001"
+        manifest = _manifest(archive.extractfile("manifest.csv").read())
+    assert {r["number"]: r["source"] for r in manifest} == {"0001": "regenerated", "0002": "file", "0003": "missing"}
+
+
+# ---------------------------------------------------------------------------
+# PDF blobs
+# ---------------------------------------------------------------------------
+
+def test_store_and_stream_pdf(history):
+    pdf = b"%PDF-1.7 " + bytes(range(256)) * 100
+    digest = invoice_store.store_pdf(1, io.BytesIO(pdf), history, chunk_size=1000)
+    assert invoice_store.get_pdf_info(1, history) == {"sha256": digest, "size": len(pdf)}
+
+    chunks = list(invoice_store.iter_pdf(1, history, chunk_size=4096))
+    assert b"".join(chunks) == pdf
+    assert max(len(chunk) for chunk in chunks) == 4096
+
+
+def test_store_pdf_replaces_and_is_deleted_with_invoice(history):
+    invoice_store.store_pdf(2, b"%PDF old", history)
+    invoice_store.store_pdf(2, b"%PDF new", history)
+    assert b"".join(invoice_store.iter_pdf(2, history)) == b"%PDF new"
+
+    invoice_store.delete_invoice(2, history)
+    assert invoice_store.get_pdf_info(2, history) is None
+    with pytest.raises(LookupError):
+        list(invoice_store.iter_pdf(2, history))
+
+
+# ---------------------------------------------------------------------------
+# History pages and bulk actions
+# ---------------------------------------------------------------------------
+
+def test_get_invoices_page_newest_first(history):
+    assert [r["number"] for r in invoice_store.get_invoices_page(0, 2, db_path=history)] == ["0003", "0002"]
+    assert [r["number"] for r in invoice_store.get_invoices_page(2, 2, db_path=history)] == ["0001"]
+    assert [r["client_name"] for r in invoice_store.get_invoices_page(status="paid", db_path=history)] == ["Carol"]
+
+
+def test_summarize_invoices(history):
+    assert invoice_store.summarize_invoices(db_path=history) == {"count": 3, "total": 80.0}
+    assert invoice_store.summarize_invoices("paid", db_path=history) == {"count": 1, "total": 40.0}
+    assert invoice_store.summarize_invoices("overdue", db_path=history) == {"count": 0, "total": 0}
+
+
+def test_bulk_status_update_and_delete(history):
+    assert invoice_store.update_invoices_status([1, 3], "paid", history) == 2
+    assert invoice_store.summarize_invoices("paid", db_path=history)["count"] == 3
+
+    items = invoice_store.get_line_items_for_invoices([2, 3], history)
+    assert [[item["description"] for item in items[i]] for i in (2, 3)] == [["Workshop", "Travel"], ["Training"]]
+
+    invoice_store.delete_invoices([1, 2], history)
+    assert [r["number"] for r in invoice_store.get_invoices_page(db_path=history)] == ["0003"]
+    assert invoice_store.get_line_items_for_invoices([1, 2], history) == {1: [], 2: []}
+
+
+# ---------------------------------------------------------------------------
+# Full-text search
+# ---------------------------------------------------------------------------
+
+def test_search_invoices_by_client_and_description(history):
+    _log(history, "CERN", date(2024, 4, 2), ["Quantum workshop"])
+    consulting = _log(history, "CERN", date(2024, 5, 2), ["Consulting"])
+    assert [r["number"] for r in invoice_store.search_invoices("cern workshop", db_path=history)] == ["0004"]
+    assert {r["number"] for r in invoice_store.search_invoices("CERN", db_path=history)} == {"0004", "0005"}
+    invoice_store.update_invoice_status(consulting, "paid", history)
+    assert [r["number"] for r in invoice_store.search_invoices("CERN", status="paid", db_path=history)] == ["0005"]
+
+
+def test_search_invoices_prefix_and_diacritics(history):
+    _log(history, "Équipe Rouge", date(2024, 4, 2), ["Formation"])
+    assert [r["client_name"] for r in invoice_store.search_invoices("equipe form", db_path=history)] == ["Équipe Rouge"]
+
+
+def test_search_invoices_ranks_and_limits(history):
+    results = invoice_store.search_invoices("consulting", db_path=history)
+    assert [r["client_name"] for r in results] == ["Bob"]
+    _log(history, "Erin", date(2024, 4, 2), ["Consulting", "Consulting follow-up"])
+    assert len(invoice_store.search_invoices("consulting", limit=1, db_path=history)) == 1
+
+
+def test_search_invoices_pages_and_summary(history):
+    for day in range(1, 4):
+        _log(history, "Erin", date(2024, 4, day), ["Consulting"])
+    ranked = [r["number"] for r in invoice_store.search_invoices("consulting", db_path=history)]
+    assert len(ranked) == 4
+    pages = [invoice_store.search_invoices("consulting", limit=3, offset=offset, db_path=history) for offset in (0, 3)]
+    assert [r["number"] for page in pages for r in page] == ranked
+    assert invoice_store.summarize_search("consulting", db_path=history) == {"count": 4, "total": 80.0}
+    assert invoice_store.summarize_search("consulting", "paid", db_path=history) == {"count": 0, "total": 0}
+    assert invoice_store.summarize_search("  ", db_path=history) == {"count": 0, "total": 0}
+
+
+def test_search_invoices_ignores_fts_syntax(history):
+    assert invoice_store.search_invoices('"travel*', db_path=history)[0]["client_name"] == "Carol"
+    assert invoice_store.search_invoices('travel OR NEAR(', db_path=history) == []
+    assert invoice_store.search_invoices("  ", db_path=history) == []
+
+
+def test_search_index_follows_deletes(history):
+    invoice_store.delete_invoice(2, history)
+    assert invoice_store.search_invoices("carol", db_path=history) == []
+    assert invoice_store.search_invoices("workshop", db_path=history) == []
+
+
+def test_search_index_backfilled_for_existing_db(tmp_path):
+    db_path = tmp_path / "legacy.db"
+    _legacy_db(db_path, ["Legacy Client"])
+    invoice_store.init_db(db_path)
+    assert [r["number"] for r in invoice_store.search_invoices("legacy", db_path=db_path)] == ["0001"]
+    assert invoice_store.get_invoice_snapshot(1, db_path) is None
+
+
+def _legacy_db(db_path, clients: list[str]):
+    """A DB created before the schema was versioned, without snapshots or search index."""
+    import sqlite3
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE invoices (id INTEGER PRIMARY KEY AUTOINCREMENT, number TEXT NOT NULL UNIQUE, "
+                     "date TEXT, due_date TEXT, sender_name TEXT, client_name TEXT, currency TEXT, subtotal REAL, "
+                     "discount REAL, tax_rate REAL, total REAL, status TEXT NOT NULL DEFAULT 'unpaid')")
+        conn.executemany("INSERT INTO invoices (number, client_name) VALUES (?, ?)",
+                         [(f"{i:04}", client) for i, client in enumerate(clients, start=1)])
+    conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Invoice numbers
+# ---------------------------------------------------------------------------
+
+def test_reserved_numbers_are_skipped_until_logged_released_or_expired(db_path):
+    now = time.time()
+    assert invoice_store.reserve_invoice_numbers(3, db_path, seconds=60, now=now) == ["0001", "0002", "0003"]
+    assert invoice_store.get_next_invoice_number(db_path) == "0004"
+
+    _log(db_path, "Bob", date(2024, 1, 15), ["Consulting"])  # takes 0004, 0001-0003 are still reserved
+    invoice_store.release_invoice_numbers(["0002"], db_path)
+    assert invoice_store.reserve_invoice_numbers(1, db_path, now=now) == ["0002"]
+    # 0001 and 0003 expire unlogged: handed out again, lowest first, before new numbers
+    assert invoice_store.reserve_invoice_numbers(3, db_path, now=now + 61) == ["0001", "0003", "0005"]
+
+
+# ---------------------------------------------------------------------------
+# Schema migrations
+# ---------------------------------------------------------------------------
+
+def _schema_version(db_path) -> int:
+    import sqlite3
+    with sqlite3.connect(db_path) as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.close()
+    return version
+
+
+def test_init_db_checks_schema_once(db_path, monkeypatch):
+    assert _schema_version(db_path) == invoice_store.SCHEMA_VERSION
+    monkeypatch.setattr(invoice_store.sqlite3, "connect", None)
+    invoice_store.init_db(db_path)  # checked already
+
+    # another process only reads the version of a current DB, and runs no migration
+    def fail(conn):
+        raise AssertionError("migration run on a current DB")
+    monkeypatch.undo()
+    monkeypatch.setattr(invoice_store, "_current_schemas", set())
+    monkeypatch.setattr(invoice_store, "_MIGRATIONS", (fail,) * invoice_store.SCHEMA_VERSION)
+    invoice_store.init_db(db_path)
+
+
+def test_init_db_refuses_newer_schema(db_path, monkeypatch):
+    monkeypatch.setattr(invoice_store, "_current_schemas", set())
+    monkeypatch.setattr(invoice_store, "_MIGRATIONS", invoice_store._MIGRATIONS[:-1])
+    monkeypatch.setattr(invoice_store, "SCHEMA_VERSION", invoice_store.SCHEMA_VERSION - 1)
+    with pytest.raises(RuntimeError):
+        invoice_store.init_db(db_path)
+
+
+def test_interrupted_search_backfill_resumes(tmp_path, monkeypatch):
+    import sqlite3
+    db_path = tmp_path / "legacy.db"
+    _legacy_db(db_path, [f"Client {i}" for i in range(1, 8)])
+    monkeypatch.setattr(invoice_store, "MIGRATION_BATCH_SIZE", 3)
+
+    # fail the second batch, as a crash would after the first one was committed
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE app_meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TRIGGER interrupt BEFORE UPDATE ON app_meta WHEN new.value = '6' "
+                     "BEGIN SELECT RAISE(ABORT, 'interrupted'); END")
+    conn.close()
+    with pytest.raises(sqlite3.IntegrityError):
+        invoice_store.init_db(db_path)
+    assert _schema_version(db_path) == 1
+
+    # rows not indexed yet can still be renamed and deleted
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP TRIGGER interrupt")
+        conn.execute("UPDATE invoices SET client_name = 'Renamed' WHERE id IN (2, 5)")
+        conn.execute("DELETE FROM invoices WHERE id = 6")
+    conn.close()
+    invoice_store.init_db(db_path)
+    assert _schema_version(db_path) == invoice_store.SCHEMA_VERSION
+    numbers = [r["number"] for r in invoice_store.search_invoices("client", db_path=db_path)]
+    assert sorted(numbers) == ["0001", "0003", "0004", "0007"]
+    assert sorted(r["number"] for r in invoice_store.search_invoices("renamed", db_path=db_path)) == ["0002", "0005"]
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO invoices_fts(invoices_fts) VALUES ('integrity-check')")
+        assert conn.execute("SELECT COUNT(*) FROM app_meta WHERE key LIKE '%backfill%'").fetchone() == (0,)
+    conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Overdue detection
+# ---------------------------------------------------------------------------
+
+def test_mark_overdue_invoices(db_path):
+    _log(db_path, "Bob", date(2024, 1, 1), ["A"], due_date=date(2024, 1, 31))
+    _log(db_path, "Carol", date(2024, 1, 1), ["A"], due_date=date(2024, 2, 15))
+    _log(db_path, "Dave", date(2024, 1, 1), ["A"], due_date=date(2024, 1, 15), status="paid")
+    _log(db_path, "Erin", date(2024, 1, 1), ["A"])
+
+    assert invoice_store.mark_overdue_invoices(date(2024, 2, 1), db_path) == 1
+    statuses = {i["client_name"]: i["status"] for i in invoice_store.get_all_invoices(db_path)}
+    assert statuses == {"Bob": "overdue", "Carol": "unpaid", "Dave": "paid", "Erin": "unpaid"}
+
+
+def test_run_overdue_sweep_once_per_day(db_path, monkeypatch):
+    monkeypatch.setattr(invoice_store, "_last_overdue_sweep", {})
+    _log(db_path, "Bob", date(2024, 1, 1), ["A"], due_date=date(2024, 1, 31))
+    assert invoice_store.run_overdue_sweep(date(2024, 2, 1), db_path) == 1
+
+    # marked unpaid again by hand: not swept again on the same day, even from another process
+    invoice_store.update_invoice_status(1, "unpaid", db_path)
+    assert invoice_store.run_overdue_sweep(date(2024, 2, 1), db_path) == 0
+    monkeypatch.setattr(invoice_store, "_last_overdue_sweep", {})
+    assert invoice_store.run_overdue_sweep(date(2024, 2, 1), db_path) == 0
+
+    assert invoice_store.run_overdue_sweep(date(2024, 2, 2), db_path) == 1
@@ -2,9 +2,11 @@ import tempfile
 import unittest
 from dataclasses import dataclass
 from datetime import datetime
+from decimal import Decimal
 from pathlib import Path
 
-from kscinvoicing.invoice.invoicedata import LineItem, InvoiceData
+from kscinvoicing.invoice.invoicedata import LineItem, LineItemBatch, InvoiceData
+from kscinvoicing.invoice.totals import Totals, bulk_calculate_totals
 
 
 class TestLineItem(unittest.TestCase):
@@ -68,8 +70,44 @@ class TestInvoiceData(unittest.TestCase):
         self._db_path.unlink(missing_ok=True)
 
     def test_get_invoice_name(self):
+        self.invoice_data.assign_number()
         self.assertEqual("Invoice_0001_Bob-Recipient_2023-09-04", self.invoice_data.get_invoice_name())
 
+    def test_get_invoice_name_draft(self):
+        self.assertFalse(self.invoice_data.is_numbered)
+        self.assertEqual("Invoice_DRAFT_Bob-Recipient_2023-09-04", self.invoice_data.get_invoice_name())
+
+    def test_construction_does_not_touch_db(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = Path(tmp_dir) / "data" / "invoices.db"
+            InvoiceData(
+                sender=None,
+                recipient=self.invoice_data.recipient,
+                items=self.line_items,
+                save_folder=Path(tmp_dir),
+                currency="EUR",
+                db_path=db_path,
+            )
+            self.assertFalse(db_path.parent.exists())
+
+    def test_log_invoice_requires_number(self):
+        with self.assertRaises(ValueError):
+            self.invoice_data.log_invoice()
+
+    def test_assign_number_is_idempotent(self):
+        self.assertEqual("0001", self.invoice_data.assign_number())
+        self.assertEqual("0001", self.invoice_data.assign_number())
+
+    def test_assign_number_reserves_until_logged_or_released(self):
+        other = InvoiceData(sender=None, recipient=self.invoice_data.recipient, items=self.line_items,
+                            save_folder=Path("./"), currency="EUR", db_path=self._db_path)
+        self.assertEqual("0001", self.invoice_data.assign_number())
+        self.assertEqual("0002", other.assign_number())  # e.g. a second UI session, before the first is logged
+
+        self.invoice_data.release_number()
+        self.assertIsNone(self.invoice_data.invoice_number)
+        self.assertEqual("0001", self.invoice_data.assign_number())  # given back numbers are reused first
+
     def test_subtotal(self):
         for item in self.invoice_data.items:
             print(item.description, item.price())
@@ -86,3 +124,106 @@ class TestInvoiceData(unittest.TestCase):
         350 + 70 = 420
         """
         self.assertEqual(420.0, self.invoice_data.total)
+
+    def test_totals_are_cached(self):
+        self.assertIs(self.invoice_data.totals, self.invoice_data.totals)
+
+    def test_totals_invalidated_on_reassignment(self):
+        self.assertEqual(420.0, self.invoice_data.total)
+        self.invoice_data.discount = 0.0
+        self.assertEqual(480.0, self.invoice_data.total)
+        self.invoice_data.tax_rate = 0.0
+        self.assertEqual(400.0, self.invoice_data.total)
+        self.invoice_data.items = self.line_items[:1]
+        self.assertEqual(200.0, self.invoice_data.total)
+
+    def test_items_cannot_change_in_place(self):
+        self.assertEqual(400.0, self.invoice_data.subtotal)
+        self.line_items.append(LineItem(description="Extra", quantity=1, price_per_unit=100.0))
+        with self.assertRaises(AttributeError):
+            self.invoice_data.items.append(LineItem(description="Extra", quantity=1, price_per_unit=100.0))
+        with self.assertRaises(AttributeError):
+            self.invoice_data.items[0].quantity = 10
+        self.assertEqual(400.0, self.invoice_data.subtotal)
+        self.invoice_data.items = [*self.invoice_data.items, self.line_items[-1]]
+        self.assertEqual(500.0, self.invoice_data.subtotal)
+
+    def test_bulk_calculate_totals(self):
+        other = InvoiceData(
+            sender=None,
+            recipient=self.invoice_data.recipient,
+            items=[LineItem(description="Service C", quantity=4, price_per_unit=Decimal("25.00"))],
+            date=self.invoice_date,
+            save_folder=Path("./"),
+            currency="EUR",
+            db_path=self._db_path,
+        )
+        totals = bulk_calculate_totals([self.invoice_data, other])
+        self.assertEqual(Totals(subtotal=400.0, discount=50.0, tax=70.0, total=420.0), totals[0])
+        self.assertEqual(Decimal("100.00"), totals[1].total)
+        self.assertIs(totals[1], other.totals)
+        other.discount = Decimal("10.00")  # primed totals are invalidated like computed ones
+        self.assertEqual(Decimal("90.00"), other.totals.total)
+
+
+class TestLineItemBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.batch = LineItemBatch(
+            descriptions=["Service A", "Product B"],
+            quantities=[2, 1],
+            prices_per_unit=[Decimal("100.00"), 200.0],
+        )
+
+    def test_columns(self):
+        self.assertEqual(2, len(self.batch))
+        self.assertEqual([10000, 20000], list(self.batch.unit_prices_cents))
+        self.assertEqual([20000, 20000], list(self.batch.prices_cents()))
+        self.assertEqual(Decimal("400.00"), self.batch.subtotal())
+
+    def test_iter_yields_line_items(self):
+        items = list(self.batch)
+        self.assertIsInstance(items[0], LineItem)
+        self.assertEqual(Decimal("200.00"), items[0].price())
+        self.assertEqual("Product B", items[1].description)
+
+    def test_from_line_items(self):
+        batch = LineItemBatch.from_line_items([LineItem(description="Service A", quantity=3, price_per_unit=50.0)])
+        self.assertEqual([("Service A", 3, Decimal("50.00"), Decimal("150.00"))], list(batch.rows()))
+
+    def test_invalid_quantity(self):
+        with self.assertRaises(ValueError):
+            LineItemBatch(["A", "B"], [1, 0], [1.0, 1.0])
+        with self.assertRaises(ValueError):
+            LineItemBatch(["A"], [1.5], [1.0])
+
+    def test_invalid_price(self):
+        with self.assertRaises(ValueError):
+            LineItemBatch(["A"], [1], [-1.0])
+        with self.assertRaises(ValueError):
+            LineItemBatch(["A"], [1], [Decimal("0.001")])
+        for price in (float("inf"), float("nan"), Decimal("-Infinity"), Decimal("sNaN")):
+            with self.assertRaisesRegex(ValueError, r"line item 1 \('B'\)"):
+                LineItemBatch(["A", "B"], [1, 1], [1.0, price])
+
+    def test_invalid_description(self):
+        with self.assertRaises(ValueError):
+            LineItemBatch([""], [1], [1.0])
+
+    def test_mismatched_columns(self):
+        with self.assertRaises(ValueError):
+            LineItemBatch(["A", "B"], [1], [1.0])
+
+    def test_invoice_data_accepts_batch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            invoice_data = InvoiceData(
+                sender=None,
+                recipient=None,
+                items=self.batch,
+                save_folder=Path(tmp_dir),
+                currency="EUR",
+                tax_rate=Decimal("0.2"),
+                db_path=Path(tmp_dir) / "invoices.db",
+            )
+            self.assertEqual(Decimal("400.00"), invoice_data.subtotal)
+            self.assertEqual(Decimal("480.00"), invoice_data.total)
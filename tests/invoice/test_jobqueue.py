@@ -0,0 +1,111 @@
+"""Unit tests for kscinvoicing.invoice.jobqueue and the job queries of invoice_store."""
+import time
+from pathlib import Path
+
+import pytest
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.generate_invoice_from_json import InvoiceValidationError, invoice_from_json
+from kscinvoicing.invoice import jobqueue
+
+ADDRESS = {"number": "1", "street": "Rue A", "postcode": "75000", "city": "Paris", "country": "France"}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "invoices.db"
+    invoice_store.init_db(path)
+    return path
+
+
+def _payload(db_path, client: str = "Bob") -> dict:
+    return {
+        "save_location": str(db_path.parent), "invoice_date": "2024-01-15", "currency": "EUR", "language": "fr",
+        "sender": {"name": "Alice", "company": "ACME", "siren": "123456789", "email": "a@a.fr", "address": ADDRESS},
+        "recipient": {"name": client, "email": "b@b.fr", "address": ADDRESS},
+        "lineitem_details": [{"description": "Consulting", "quantity": 2, "price_per_unit": "10.00"}],
+    }
+
+
+def _fake_render(data: dict, invoice_number: str, db_path: Path) -> dict:
+    if data["recipient"]["name"] == "Fail":
+        raise RuntimeError("render failed")
+    invoice = invoice_from_json(data, db_path=db_path)
+    invoice.invoice_number = invoice_number
+    path = Path(data["save_location"]) / f"{invoice.get_invoice_name()}.pdf"
+    temp_path = path.with_name(f".{path.name}.tmp")
+    temp_path.write_bytes(b"%PDF")
+    return {"temp_path": str(temp_path), "path": str(path), "record": invoice_store.invoice_record(invoice)}
+
+
+def test_enqueue_validates_all_payloads(db_path):
+    invalid = {**_payload(db_path), "currency": "XYZ"}
+    with pytest.raises(InvoiceValidationError) as e:
+        jobqueue.enqueue([_payload(db_path), invalid], db_path=db_path)
+    assert e.value.errors == ["[1] $.currency: invalid value 'XYZ'"]
+    assert invoice_store.count_jobs(db_path)["queued"] == 0
+
+
+def test_claim_reserves_numbers_and_leases(db_path):
+    jobqueue.enqueue([_payload(db_path, "Bob"), _payload(db_path, "Carol")], db_path=db_path)
+    now = time.time()
+    first = invoice_store.claim_job("w1", 60, db_path, now=now)
+    second = invoice_store.claim_job("w2", 60, db_path, now=now)
+    assert (first["invoice_number"], second["invoice_number"]) == ("0001", "0002")
+    assert first["payload"]["recipient"]["name"] == "Bob"
+    assert invoice_store.claim_job("w3", 60, db_path, now=now) is None
+    assert invoice_store.get_next_invoice_number(db_path) == "0003"
+
+    # w1 died: its job is taken over once the lease expires, with the same number, and w1 can't complete it
+    taken_over = invoice_store.claim_job("w3", 60, db_path, now=now + 61)
+    assert (taken_over["id"], taken_over["invoice_number"], taken_over["attempts"]) == (first["id"], "0001", 2)
+    record = _fake_render(first["payload"], "0001", db_path)
+    assert not invoice_store.complete_job(first["id"], "w1", record["record"], record["path"], db_path)
+    assert invoice_store.complete_job(first["id"], "w3", record["record"], record["path"], db_path)
+    assert [r["number"] for r in invoice_store.iter_invoices(db_path)] == ["0001"]
+    assert invoice_store.get_job(first["id"], db_path)["status"] == "done"
+
+
+def test_failed_jobs_are_retried_then_failed(db_path, monkeypatch):
+    monkeypatch.setattr(jobqueue, "RETRY_DELAY", 0)
+    [job_id] = jobqueue.enqueue([_payload(db_path, "Fail")], max_attempts=2, db_path=db_path)
+    assert jobqueue.run_worker(_fake_render, db_path, exit_when_idle=True, poll_interval=0) == 2
+    job = invoice_store.get_job(job_id, db_path)
+    assert (job["status"], job["attempts"], job["error"]) == ("failed", 2, "render failed")
+    assert invoice_store.retry_job(job_id, db_path)
+    assert invoice_store.get_job(job_id, db_path)["status"] == "queued"
+
+
+def test_job_failed_for_good_gives_its_number_back(db_path, monkeypatch):
+    monkeypatch.setattr(jobqueue, "RETRY_DELAY", 0)
+    [failing, _] = jobqueue.enqueue([_payload(db_path, "Fail"), _payload(db_path, "Bob")], max_attempts=2,
+                                    db_path=db_path)
+    assert jobqueue.run_worker(_fake_render, db_path, exit_when_idle=True, poll_interval=0) == 3
+    # the failed job had reserved 0001: it is released, so the next job takes it and the numbering has no gap
+    job = invoice_store.get_job(failing, db_path)
+    assert (job["status"], job["attempts"], job["invoice_number"]) == ("failed", 2, None)
+    assert [r["number"] for r in invoice_store.iter_invoices(db_path)] == ["0001"]
+
+    # retried, it reserves a number again
+    assert invoice_store.retry_job(failing, db_path)
+    assert invoice_store.claim_job("w1", 60, db_path)["invoice_number"] == "0002"
+
+
+def test_expired_lease_on_last_attempt_fails_job(db_path):
+    [job_id] = jobqueue.enqueue([_payload(db_path)], max_attempts=1, db_path=db_path)
+    now = time.time()
+    invoice_store.claim_job("w1", 60, db_path, now=now)
+    assert invoice_store.claim_job("w2", 60, db_path, now=now + 61) is None
+    job = invoice_store.get_job(job_id, db_path)
+    assert (job["error"], job["invoice_number"]) == ("worker lost its lease", None)
+    assert invoice_store.get_next_invoice_number(db_path) == "0001"
+
+
+def test_run_workers_processes_all_jobs(db_path):
+    jobqueue.enqueue([_payload(db_path, f"Client {i}") for i in range(12)], db_path=db_path)
+    start = time.time()
+    jobqueue.run_workers(3, _fake_render, db_path, exit_when_idle=True, poll_interval=0.05)
+    assert time.time() - start < 30
+    assert invoice_store.count_jobs(db_path)["done"] == 12
+    assert [r["number"] for r in invoice_store.iter_invoices(db_path)] == [f"{i:04}" for i in range(1, 13)]
+    assert len(list(db_path.parent.glob("Invoice_*.pdf"))) == 12
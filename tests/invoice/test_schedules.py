@@ -0,0 +1,168 @@
+"""Unit tests for kscinvoicing.invoice.schedules."""
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.generate_invoice_from_json import (
+    InvoiceValidationError,
+    invoice_from_json,
+    render_numbered_invoice,
+)
+from kscinvoicing.invoice.schedules import add_schedule, next_run_date, period_of, run_schedules
+
+ADDRESS = {"number": "1", "street": "Rue A", "postcode": "75000", "city": "Paris", "country": "France",
+           "building": ""}
+SENDER = {"name": "Alice", "company": "ACME", "siren": "123456789", "email": "a@a.fr", "address": ADDRESS}
+CLIENTS = {
+    "Bob": {"type": "individual", "name": "Bob", "email": "b@b.fr", "address": ADDRESS},
+    "Initech": {"type": "company", "name": "Carol", "company_name": "Initech", "siren": "987654321",
+                "email": "c@c.fr", "address": ADDRESS},
+}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "invoices.db"
+    invoice_store.init_db(path)
+    return path
+
+
+def _schedule(db_path, client="Bob", cadence="monthly", start="2024-01-31", **fields) -> int:
+    data = {"client": client, "cadence": cadence, "start": start, "save_location": str(db_path.parent),
+            "currency": "EUR", "language": "fr", "due_days": 30,
+            "lineitem_details": [{"description": "Retainer", "quantity": 1, "price_per_unit": "500.00"}],
+            **fields}
+    return add_schedule(data, SENDER, CLIENTS, db_path)
+
+
+def _fake_render(data: dict, invoice_number: str, db_path: Path) -> dict:
+    if data["recipient"]["name"] == "Fail":
+        raise RuntimeError("render failed")
+    invoice = invoice_from_json(data, db_path=db_path)
+    invoice.invoice_number = invoice_number
+    path = Path(data["save_location"]) / f"{invoice.get_invoice_name()}.pdf"
+    temp_path = path.with_name(f".{path.name}.tmp")
+    temp_path.write_bytes(b"%PDF")
+    return {"temp_path": str(temp_path), "path": str(path), "record": invoice_store.invoice_record(invoice, {"language": data["language"]})}
+
+
+def _run(db_path, today: date, clients=CLIENTS, render=_fake_render) -> list[dict]:
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        return run_schedules(SENDER, clients, render, today=today, db_path=db_path, executor=executor)
+
+
+# ---------------------------------------------------------------------------
+# Cadences
+# ---------------------------------------------------------------------------
+
+def test_monthly_runs_clamp_to_month_end():
+    runs = [date(2024, 1, 31)]
+    for _ in range(3):
+        runs.append(next_run_date(runs[-1], "monthly", 31))
+    assert runs == [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+    assert next_run_date(date(2024, 11, 30), "quarterly", 30) == date(2025, 2, 28)
+
+
+def test_periods():
+    assert period_of(date(2024, 2, 1), "weekly") == "2024-W05"
+    assert period_of(date(2024, 2, 1), "monthly") == "2024-02"
+    assert period_of(date(2024, 5, 1), "quarterly") == "2024-Q2"
+    assert period_of(date(2024, 5, 1), "yearly") == "2024"
+
+
+def test_add_schedule_validates(db_path):
+    with pytest.raises(InvoiceValidationError) as e:
+        _schedule(db_path, client="Nobody", cadence="daily", lineitem_details=[])
+    assert e.value.errors == ["$.cadence: expected one of weekly, monthly, quarterly, yearly",
+                              "$.client: unknown client 'Nobody'"]
+    with pytest.raises(InvoiceValidationError):
+        _schedule(db_path, lineitem_details=[])
+    assert invoice_store.get_schedules(db_path) == []
+
+
+# ---------------------------------------------------------------------------
+# Runs
+# ---------------------------------------------------------------------------
+
+def test_run_schedules_catches_up_and_is_idempotent(db_path):
+    monthly = _schedule(db_path)
+    quarterly = _schedule(db_path, client="Initech", cadence="quarterly", start="2024-03-31")
+    results = _run(db_path, date(2024, 3, 31))
+    assert [(r["schedule_id"], r["period"], r["status"], r["invoice_number"]) for r in results] == [
+        (monthly, "2024-01", "ok", "0001"), (monthly, "2024-02", "ok", "0002"),
+        (monthly, "2024-03", "ok", "0003"), (quarterly, "2024-Q1", "ok", "0004"),
+    ]
+    invoices = list(invoice_store.iter_invoices(db_path))
+    assert [(r["date"], r["due_date"], r["client_name"]) for r in invoices] == [
+        ("2024-01-31", "2024-03-01", "Bob"), ("2024-02-29", "2024-03-30", "Bob"),
+        ("2024-03-31", "2024-04-30", "Bob"), ("2024-03-31", "2024-04-30", "Carol"),
+    ]
+    snapshot = invoice_store.get_invoice_snapshot(invoices[3]["id"], db_path)
+    assert snapshot["recipient"]["company"] == "Initech"
+
+    assert _run(db_path, date(2024, 3, 31)) == []
+    next_runs = {s["id"]: s["next_run"] for s in invoice_store.get_schedules(db_path)}
+    assert next_runs == {monthly: "2024-04-30", quarterly: "2024-06-30"}
+
+
+def test_run_schedules_skips_generated_periods(db_path):
+    schedule_id = _schedule(db_path)
+    _run(db_path, date(2024, 1, 31))
+    invoice_store.set_schedules_next_run({schedule_id: "2024-01-31"}, db_path)  # e.g. restored from a backup
+    results = _run(db_path, date(2024, 2, 29))
+    assert [(r["period"], r["status"]) for r in results] == [("2024-01", "skipped"), ("2024-02", "ok")]
+    assert invoice_store.summarize_invoices(db_path=db_path)["count"] == 2
+
+
+def test_run_schedules_keeps_numbers_gapless_on_failure(db_path):
+    clients = {**CLIENTS, "Fail": {**CLIENTS["Bob"], "name": "Fail"}}
+    _schedule(db_path)
+    add_schedule({"client": "Fail", "cadence": "monthly", "start": "2024-01-31", "save_location": str(db_path.parent),
+                  "currency": "EUR", "language": "fr",
+                  "lineitem_details": [{"description": "X", "quantity": 1, "price_per_unit": 1}]},
+                 SENDER, clients, db_path)
+    _schedule(db_path, client="Initech")
+    results = _run(db_path, date(2024, 1, 31), clients=clients)
+    assert [r["status"] for r in results] == ["ok", "error", "error"]
+    assert results[1]["errors"] == ["render failed"]
+    assert results[2]["errors"] == ["not logged, invoice 0002 failed first"]
+    assert [r["number"] for r in invoice_store.iter_invoices(db_path)] == ["0001"]
+    assert not list(db_path.parent.glob("Invoice_0003_*.pdf"))
+
+    results = _run(db_path, date(2024, 1, 31))  # "Fail" removed from the client store
+    assert [(r["status"], r.get("invoice_number")) for r in results] == [("error", None), ("ok", "0002")]
+    assert results[0]["errors"] == ["unknown client 'Fail'"]
+
+
+def test_run_schedules_reports_logging_failure(db_path, monkeypatch):
+    _schedule(db_path)
+    _schedule(db_path, client="Initech")
+
+    def log_invoices(*args, **kwargs):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(invoice_store, "log_invoices", log_invoices)
+    results = _run(db_path, date(2024, 1, 31))
+    assert [(r["status"], r["errors"]) for r in results] == [("error", ["not logged: disk I/O error"])] * 2
+    assert [path.name for path in db_path.parent.iterdir()] == ["invoices.db"]
+    assert invoice_store.reserve_invoice_numbers(2, db_path) == ["0001", "0002"]  # given back
+
+
+def test_run_schedules_renders_pdfs(db_path):
+    _schedule(db_path, start="2024-01-15")
+    rendered = []
+
+    def render(data: dict, invoice_number: str, db_path: Path) -> dict:
+        rendered.append(render_numbered_invoice(data, invoice_number, db_path))
+        assert not Path(rendered[-1]["path"]).exists()  # only moved there once logged
+        return rendered[-1]
+
+    results = _run(db_path, date(2024, 1, 15), render=render)
+    assert not Path(rendered[0]["temp_path"]).exists()
+    assert results[0]["status"] == "ok"
+    assert Path(results[0]["path"]).read_bytes().startswith(b"%PDF")
+    assert invoice_store.get_invoice_by_number("0001", db_path)["total"] == 500.0
@@ -0,0 +1,37 @@
+"""Shared fixtures for the kscinvoicing.pdf tests."""
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from kscinvoicing.info import Address, CompanyRecipient, CompanySender, IndividualRecipient
+from kscinvoicing.invoice import InvoiceData, LineItem
+
+ADDRESS = Address(number="1", street="Rue A", postcode="75000", city="Paris", country="France")
+
+
+@pytest.fixture
+def make_invoice(tmp_path):
+    """
+    Factory of unnumbered invoices from ACME (Alice) to a client, an individual unless a company name is given,
+    saved and logged in tmp_path. Defaults to one line item dated 2024-01-01; other InvoiceData arguments are
+    passed through.
+    """
+    def make(items: list[LineItem] | None = None, client: str = "Bob", company: str | None = None,
+             **kwargs) -> InvoiceData:
+        recipient = (CompanyRecipient(company_name=company, siren="987654321", name=client, address=ADDRESS,
+                                      email="b@b.fr", phone="+33 1 02 03 04 05")
+                     if company else IndividualRecipient(name=client, address=ADDRESS, email="b@b.fr"))
+        kwargs.setdefault("date", datetime(2024, 1, 1))
+        return InvoiceData(
+            sender=CompanySender(siren="123456789", company_name="ACME", name="Alice", address=ADDRESS,
+                                 email="a@a.fr"),
+            recipient=recipient,
+            items=items if items is not None else [
+                LineItem(description="Conseil", quantity=1, price_per_unit=Decimal("100.00"))],
+            save_folder=tmp_path,
+            currency="EUR",
+            db_path=tmp_path / "invoices.db",
+            **kwargs,
+        )
+    return make
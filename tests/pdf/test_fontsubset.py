@@ -0,0 +1,72 @@
+"""Unit tests for kscinvoicing.pdf.fontsubset."""
+import io
+from decimal import Decimal
+
+import pytest
+from borb.pdf import PDF
+from borb.toolkit import SimpleTextExtraction
+from fontTools.ttLib import TTFont
+
+from kscinvoicing.invoice import LineItem
+from kscinvoicing.pdf import fontsubset
+from kscinvoicing.pdf.invoicebuilder import build_invoice
+from kscinvoicing.pdf.utils import STYLE
+
+
+@pytest.fixture
+def invoice(make_invoice):
+    return make_invoice([LineItem(description="Conseil stratégique", quantity=2, price_per_unit=Decimal("150.00"))])
+
+
+def _text(pdf: bytes) -> str:
+    extraction = SimpleTextExtraction()
+    PDF.loads(io.BytesIO(pdf), [extraction])
+    return extraction.get_text()[0]
+
+
+def _embedded_fonts(invoice_with_pdf) -> list:
+    fonts = invoice_with_pdf.document.get_page(0)["Resources"]["Font"]
+    return [font for font in fonts.values() if font.get("Subtype") == "Type0"]
+
+
+def test_subset_pdf_is_smaller_with_same_text(invoice):
+    full = build_invoice(invoice, footer_text="Mentions légales", subset_fonts=False).to_bytes()
+    subset = build_invoice(invoice, footer_text="Mentions légales").to_bytes()
+    assert len(subset) < len(full) / 3
+    assert _text(subset) == _text(full)
+
+
+def _program(font) -> TTFont:
+    return TTFont(io.BytesIO(font["DescendantFonts"][0]["FontDescriptor"]["FontFile2"]["DecodedBytes"]))
+
+
+def test_subset_keeps_glyphs_used(invoice):
+    invoice_with_pdf = build_invoice(invoice)
+    originals = {str(font["BaseFont"]): _program(font) for font in (STYLE.primary_font, STYLE.title_font)}
+    for font in _embedded_fonts(invoice_with_pdf):
+        program, original = _program(font), originals[str(font["BaseFont"])]
+        assert "GSUB" not in program and "cmap" not in program
+
+        drawn = {int(cid) for cid in list(font["DescendantFonts"][0]["W"])[::2]}
+        assert 0 < len(drawn) < 100
+        assert program["maxp"].numGlyphs == max(drawn) + 1  # glyph ids are kept, trailing unused glyphs dropped
+        for gid in range(program["maxp"].numGlyphs):
+            contours = program["glyf"][program.getGlyphName(gid)].numberOfContours
+            if gid in drawn:
+                assert contours == original["glyf"][original.getGlyphName(gid)].numberOfContours
+            elif gid != 0:
+                assert contours == 0
+
+
+def test_shared_style_fonts_are_not_modified(invoice):
+    program = STYLE.primary_font["DescendantFonts"][0]["FontDescriptor"]["FontFile2"]["DecodedBytes"]
+    build_invoice(invoice)
+    assert STYLE.primary_font["DescendantFonts"][0]["FontDescriptor"]["FontFile2"]["DecodedBytes"] is program
+    assert len(STYLE.primary_font["DescendantFonts"][0]["W"]) > 1000
+
+
+def test_subset_programs_are_cached(invoice):
+    build_invoice(invoice)
+    hits = fontsubset.subset_font_program.cache_info().hits
+    build_invoice(invoice)
+    assert fontsubset.subset_font_program.cache_info().hits >= hits + 2
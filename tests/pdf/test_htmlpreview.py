@@ -0,0 +1,39 @@
+"""Unit tests for kscinvoicing.pdf.htmlpreview."""
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+from kscinvoicing.invoice import InvoiceData, LineItem
+from kscinvoicing.pdf.htmlpreview import build_invoice_html
+
+LOGO = Path(__file__).parents[2] / "example_config" / "example_logo.png"
+
+
+@pytest.fixture
+def preview_invoice(make_invoice):
+    def make(**kwargs) -> InvoiceData:
+        items = [LineItem(description="Atelier\nPréparation", quantity=2, price_per_unit=Decimal("1250.50")),
+                 LineItem(description="Conseil", quantity=1, price_per_unit=Decimal("100"))]
+        return make_invoice(items, client="Bob <Dupont>", date=datetime(2024, 1, 31), **kwargs)
+    return make
+
+
+def test_preview_shows_every_section(preview_invoice):
+    html = build_invoice_html(preview_invoice(tax_rate=Decimal("0.2")), logo_path=str(LOGO),
+                              footer_text="TVA non applicable", language="en")
+    for text in ["Facturé par", "Alice", "Facture Nº", "DRAFT", "31/01/2024", "Unit Price",
+                 "Atelier<br>Préparation", "Sous-Total", "TVA", "Total", "TVA non applicable"]:
+        assert text in html
+    assert html.count("<tr") == 6 + 3 + 3 + 3  # contact details, invoice information, items and totals
+    assert 'src="data:image/png;base64,' in html
+
+
+def test_preview_escapes_text_and_has_no_side_effects(preview_invoice, tmp_path):
+    invoice = preview_invoice()
+    html = build_invoice_html(invoice, logo_path=str(tmp_path / "missing.png"))
+    assert "Bob &lt;Dupont&gt;" in html and "<Dupont>" not in html
+    assert "<img" not in html and "<footer>" not in html
+    assert invoice.invoice_number is None
+    assert not (tmp_path / "invoices.db").exists()
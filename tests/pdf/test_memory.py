@@ -0,0 +1,64 @@
+"""Memory budget of invoice rendering, and the tracemalloc helper of kscinvoicing.pdf.memory."""
+import io
+import os
+from decimal import Decimal
+
+from borb.pdf import PDF
+
+from kscinvoicing.invoice import LineItem
+from kscinvoicing.pdf.invoicebuilder import ITEM_ROWS_PER_TABLE, build_invoice
+from kscinvoicing.pdf.memory import TRACE_MEMORY_ENV, trace_peak_memory
+
+# Peak memory allowed to render and serialize the 1000-line reference invoice (about 45 MiB when measured),
+# overridable with KSCINVOICING_MEMORY_BUDGET_MIB, e.g. to tighten it while working on the renderer.
+MEMORY_BUDGET_MIB = float(os.environ.get("KSCINVOICING_MEMORY_BUDGET_MIB", 96))
+REFERENCE_LINES = 1000
+# Peak memory allowed to stream an invoice four times as long (under 1 MiB when measured), which mustn't grow with it
+STREAMING_BUDGET_MIB = 4
+
+
+def _reference_items(lines: int) -> list[LineItem]:
+    return [LineItem(description=f"Consulting session {i}", quantity=i % 5 + 1, price_per_unit=Decimal("80.50"))
+            for i in range(lines)]
+
+
+def test_trace_peak_memory_is_opt_in(monkeypatch):
+    monkeypatch.delenv(TRACE_MEMORY_ENV, raising=False)
+    with trace_peak_memory() as memory:
+        bytearray(1024)
+    assert memory.peak_bytes is None
+
+    monkeypatch.setenv(TRACE_MEMORY_ENV, "1")
+    with trace_peak_memory() as memory:
+        bytearray(1024)
+    assert memory.peak_bytes is not None
+
+
+def test_trace_peak_memory_measures_peak_above_baseline():
+    kept = bytearray(8 * 2 ** 20)
+    with trace_peak_memory(enabled=True) as memory:
+        buffer = bytearray(4 * 2 ** 20)
+        del buffer
+    assert 4 * 2 ** 20 <= memory.peak_bytes < 6 * 2 ** 20
+    del kept
+
+
+def test_long_invoice_spans_pages(make_invoice):
+    lines = 3 * ITEM_ROWS_PER_TABLE
+    pdf = build_invoice(make_invoice(_reference_items(lines))).to_bytes()
+    document = PDF.loads(io.BytesIO(pdf))
+    assert int(document.get_document_info().get_number_of_pages()) > 1
+
+
+def test_reference_invoice_within_memory_budget(make_invoice):
+    with trace_peak_memory(enabled=True) as memory:
+        pdf = build_invoice(make_invoice(_reference_items(REFERENCE_LINES))).to_bytes()
+    assert pdf.startswith(b"%PDF")
+    assert memory.peak_bytes / 2 ** 20 < MEMORY_BUDGET_MIB, f"{memory} over the {MEMORY_BUDGET_MIB} MiB budget"
+
+
+def test_streaming_memory_does_not_grow_with_the_invoice(make_invoice):
+    invoice = make_invoice(_reference_items(4 * REFERENCE_LINES))
+    with open(os.devnull, "wb") as out, trace_peak_memory(enabled=True) as memory:
+        build_invoice(invoice, backend="native", streaming=True)._write(out)
+    assert memory.peak_bytes / 2 ** 20 < STREAMING_BUDGET_MIB, f"{memory} over the {STREAMING_BUDGET_MIB} MiB budget"
@@ -0,0 +1,154 @@
+"""Unit tests for kscinvoicing.pdf.nativewriter, checked against the borb backend."""
+import io
+import os
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from borb.pdf import PDF
+from borb.pdf.canvas.event.begin_page_event import BeginPageEvent
+from borb.pdf.canvas.event.chunk_of_text_render_event import ChunkOfTextRenderEvent
+from borb.pdf.canvas.event.event_listener import EventListener
+
+from kscinvoicing.invoice import LineItem
+from kscinvoicing.invoice.invoicedata import line_item_rows
+from kscinvoicing.pdf.invoicebuilder import PDF_BACKEND_ENV, build_invoice
+from kscinvoicing.pdf.nativewriter import NativeDocument, font_metrics, paginate_line_items, wrap_text
+from kscinvoicing.pdf.utils import STYLE, Currency, Language
+
+LOGO = Path(__file__).parents[2] / "example_config" / "example_logo.png"
+FOOTER = "Dispensé d'immatriculation au registre du commerce et des sociétés. TVA non applicable, art. 293 B du CGI."
+
+_NUMBER = rb"(-?[\d.]+)"
+_FILL_PATH = re.compile(rb"\s+".join([_NUMBER] * 3 + [b"rg"] + [_NUMBER + rb"\s+" + _NUMBER + rb"\s+[ml]"] * 5)
+                        + rb"\s+f")
+_FILL_RECT = re.compile(rb"\s+".join([_NUMBER] * 3 + [b"rg"] + [_NUMBER] * 4 + [b"re", b"f"]))
+_IMAGE = re.compile(rb"\s+".join([_NUMBER, b"0", b"0", _NUMBER, _NUMBER, _NUMBER, rb"cm\s+/\w+\s+Do"]))
+
+
+class _GlyphListener(EventListener):
+    """Every glyph drawn, with its page, baseline position, size and colour."""
+
+    def __init__(self):
+        self.page = -1
+        self.glyphs = Counter()
+
+    def _event_occurred(self, event):
+        if isinstance(event, BeginPageEvent):
+            self.page += 1
+        elif isinstance(event, ChunkOfTextRenderEvent):
+            for glyph in event.split_on_glyphs():
+                if glyph.get_text().strip():
+                    baseline, color = glyph.get_baseline(), glyph.get_font_color().to_rgb()
+                    self.glyphs[(self.page, glyph.get_text(), round(float(baseline.get_x()), 1),
+                                 round(float(baseline.get_y()), 1), round(float(glyph.get_font_size()), 1),
+                                 tuple(round(float(c), 3) for c in (color.red, color.green, color.blue)))] += 1
+
+
+def _marks(pdf: bytes) -> tuple[Counter, Counter]:
+    """What a viewer would draw: glyphs, and filled boxes and images as (page, colour or "image", box)."""
+    listener = _GlyphListener()
+    document = PDF.loads(io.BytesIO(pdf), [listener])
+    shapes = Counter()
+    for page in range(int(document.get_document_info().get_number_of_pages())):
+        content = document.get_page(page)["Contents"]["DecodedBytes"]
+        for match in _FILL_PATH.finditer(content):
+            r, g, b, *points = (float(v) for v in match.groups())
+            xs, ys = points[0::2], points[1::2]
+            shapes[(page, (r, g, b), *(round(v, 1) for v in (min(xs), min(ys), max(xs), max(ys))))] += 1
+        for match in _FILL_RECT.finditer(content):
+            r, g, b, x, y, w, h = (float(v) for v in match.groups())
+            shapes[(page, (r, g, b), *(round(v, 1) for v in (x, y, x + w, y + h)))] += 1
+        for match in _IMAGE.finditer(content):
+            w, h, x, y = (float(v) for v in match.groups())
+            shapes[(page, "image", *(round(v, 1) for v in (x, y, x + w, y + h)))] += 1
+    return listener.glyphs, shapes
+
+
+def _items(count: int) -> list[LineItem]:
+    return [LineItem(description=f"Atelier {i}\nPréparation, animation et compte rendu détaillé de la séance"
+                     if i % 3 == 0 else f"Conseil stratégique {i}",
+                     quantity=i % 4 + 1, price_per_unit=Decimal("1250.50")) for i in range(count)]
+
+
+@pytest.mark.parametrize("items, options", [
+    (_items(2), dict(company="Globex", discount=Decimal("10"), tax_rate=Decimal("20"),
+                     due_date=datetime(2024, 1, 31))),
+    (_items(45), dict()),
+], ids=["one-page", "multi-page"])
+def test_native_backend_draws_like_borb(make_invoice, items, options):
+    invoice = make_invoice(items, **options)
+    render = dict(logo_path=str(LOGO), footer_text=FOOTER, language="en")
+    borb_pdf = build_invoice(invoice, backend="borb", **render).to_bytes()
+    native_pdf = build_invoice(invoice, backend="native", **render).to_bytes()
+
+    borb_glyphs, borb_shapes = _marks(borb_pdf)
+    native_glyphs, native_shapes = _marks(native_pdf)
+    assert native_glyphs == borb_glyphs
+    assert native_shapes == borb_shapes
+    assert len(native_pdf) < len(borb_pdf)
+
+
+def test_native_backend_from_environment(make_invoice, monkeypatch):
+    invoice = make_invoice(_items(1))
+    monkeypatch.setenv(PDF_BACKEND_ENV, "native")
+    invoice_with_pdf = build_invoice(invoice)
+    assert isinstance(invoice_with_pdf.document, NativeDocument)
+    assert invoice_with_pdf.to_bytes().startswith(b"%PDF-1.7")
+
+    with pytest.raises(ValueError):
+        build_invoice(invoice, backend="latex")
+
+
+def test_native_backend_embeds_font_subsets(make_invoice):
+    invoice = make_invoice(_items(1))
+    subset = build_invoice(invoice, backend="native").to_bytes()
+    full = build_invoice(invoice, backend="native", subset_fonts=False).to_bytes()
+    assert len(subset) < len(full) / 2
+
+
+def test_streaming_writes_pages_to_a_pipe(make_invoice):
+    invoice = make_invoice(_items(45))
+    render = dict(logo_path=str(LOGO), footer_text=FOOTER, language="en")
+    laid_out = build_invoice(invoice, backend="native", **render)
+    streamed = build_invoice(invoice, backend="native", streaming=True, **render)
+
+    read_fd, write_fd = os.pipe()
+    with open(read_fd, "rb") as reader, ThreadPoolExecutor(1) as executor:
+        received = executor.submit(reader.read)
+        with open(write_fd, "wb") as writer:
+            streamed._write(writer)
+        pdf = received.result()
+    assert _marks(pdf) == _marks(laid_out.to_bytes())
+    assert streamed.document.page_count == laid_out.document.page_count > 1
+    assert _marks(streamed.to_bytes()) == _marks(pdf)  # laid out again on each write
+
+    with pytest.raises(ValueError):
+        build_invoice(invoice, backend="borb", streaming=True)
+
+
+def test_wrap_text_breaks_at_spaces_and_inside_long_words():
+    metrics = font_metrics(STYLE.primary_font)
+    lines = wrap_text("one two  three\nfour", metrics, 12, metrics.width("three four", 12))
+    assert lines == ["one two", "three four"]
+    assert wrap_text("a\n\nb", metrics, 12, 100, respect_newlines=True) == ["a", "", "b"]
+    assert wrap_text(" ", metrics, 12, 100) == [""]
+
+    word = "x" * 40
+    lines = wrap_text(word, metrics, 12, 50)
+    assert "".join(lines) == word
+    assert all(metrics.width(line, 12) <= 50 for line in lines)
+
+
+def test_paginate_line_items_fits_tables_on_a_page():
+    long_item = LineItem(description="\n".join(["ligne"] * 8), quantity=1, price_per_unit=Decimal("1.00"))
+    chunks = paginate_line_items([long_item] * 12, Currency.EUR, Language.FR, STYLE, rows_per_table=20)
+    assert [len(chunk) for chunk in chunks] == [5, 5, 2]  # 8 lines of 14.4pt, about 125pt per row
+
+    chunks = paginate_line_items(_items(45), Currency.EUR, Language.FR, STYLE, rows_per_table=20)
+    assert sum(chunks, ()) == tuple(line_item_rows(_items(45)))
+    assert max(len(chunk) for chunk in chunks) == 20
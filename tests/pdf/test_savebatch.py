@@ -0,0 +1,75 @@
+"""Unit tests for kscinvoicing.pdf.savebatch."""
+import pytest
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.pdf.invoicebuilder import build_invoice
+from kscinvoicing.pdf.savebatch import SaveBatch
+
+
+def _rendered(make_invoice, client: str = "Bob", batch: SaveBatch | None = None):
+    invoice = make_invoice(client=client)
+    if batch is not None:
+        batch.assign_number(invoice)
+    else:
+        invoice.assign_number()
+    return build_invoice(invoice, backend="native")
+
+
+def _pdfs(tmp_path) -> list[str]:
+    return sorted(path.name for path in tmp_path.iterdir() if path.suffix != ".db")
+
+
+def test_save_logs_then_renames(make_invoice, tmp_path):
+    _rendered(make_invoice).save()
+    assert _pdfs(tmp_path) == ["Invoice_0001_Bob_2024-01-01.pdf"]
+    assert (tmp_path / "Invoice_0001_Bob_2024-01-01.pdf").read_bytes().startswith(b"%PDF")
+    assert [r["number"] for r in invoice_store.iter_invoices(tmp_path / "invoices.db")] == ["0001"]
+
+
+def test_batch_numbers_pending_invoices_and_commits_once(make_invoice, tmp_path, monkeypatch):
+    batch = SaveBatch()
+    paths = [batch.add(_rendered(make_invoice, client, batch)) for client in ("Bob", "Carol", "Dave")]
+    assert [path.name for path in paths] == ["Invoice_0001_Bob_2024-01-01.pdf", "Invoice_0002_Carol_2024-01-01.pdf",
+                                             "Invoice_0003_Dave_2024-01-01.pdf"]
+    assert not any(path.exists() for path in paths)  # only temporary files until the commit
+
+    transactions = []
+    log_invoices = invoice_store.log_invoices
+    monkeypatch.setattr(invoice_store, "log_invoices", lambda *args: transactions.append(1) or log_invoices(*args))
+    saved = batch.commit()
+    assert transactions == [1]
+    assert [path for _, path in saved] == paths
+    assert _pdfs(tmp_path) == [path.name for path in paths]
+    assert len(batch) == 0
+
+
+def test_failed_commit_leaves_no_pdf(make_invoice, tmp_path):
+    _rendered(make_invoice, "Bob").save()
+    batch = SaveBatch()
+    duplicate = _rendered(make_invoice, "Carol")
+    duplicate.invoice.invoice_number = "0001"
+    batch.add(_rendered(make_invoice, "Dave", batch))
+    batch.add(duplicate)
+    with pytest.raises(Exception):
+        batch.commit()
+    assert _pdfs(tmp_path) == ["Invoice_0001_Bob_2024-01-01.pdf"]
+    assert invoice_store.summarize_invoices(db_path=tmp_path / "invoices.db")["count"] == 1
+
+
+def test_discard_and_unnumbered_invoices(make_invoice, tmp_path):
+    batch = SaveBatch()
+    with pytest.raises(ValueError):
+        batch.add(build_invoice(make_invoice(), backend="native"))
+    batch.add(_rendered(make_invoice, batch=batch))
+    batch.discard()
+    assert _pdfs(tmp_path) == []
+    assert batch.assign_number(make_invoice()) == "0001"  # the discarded invoice's number is given back
+
+
+def test_batch_numbers_are_reserved(make_invoice):
+    batch = SaveBatch()
+    batch.add(_rendered(make_invoice, "Bob", batch))
+    other = make_invoice(client="Carol")
+    assert other.assign_number() == "0002"  # e.g. the web UI, while the batch is pending
+    batch.commit()
+    assert batch.assign_number(make_invoice(client="Dave")) == "0003"
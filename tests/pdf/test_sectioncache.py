@@ -0,0 +1,69 @@
+"""Unit tests for kscinvoicing.pdf.sectioncache."""
+import re
+from decimal import Decimal
+
+import pytest
+
+from kscinvoicing.invoice import LineItem
+from kscinvoicing.pdf import invoicebuilder, nativewriter
+from kscinvoicing.pdf.invoicebuilder import build_invoice
+from kscinvoicing.pdf.sectioncache import SECTION_CACHE, SectionCache
+from kscinvoicing.pdf.utils import STYLE
+
+
+def _items(*prices: str) -> list[LineItem]:
+    return [LineItem(description=f"Conseil {i}", quantity=1, price_per_unit=Decimal(price))
+            for i, price in enumerate(prices)]
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Number of times each section was built."""
+    counts = {"contact_details": 0, "totals": 0, "items": 0}
+
+    def counting(name, build):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return build(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(invoicebuilder, "_build_contact_details_schema",
+                        counting("contact_details", invoicebuilder._build_contact_details_schema))
+    monkeypatch.setattr(invoicebuilder, "_build_totals_schema",
+                        counting("totals", invoicebuilder._build_totals_schema))
+    monkeypatch.setattr(nativewriter, "_paginate_rows", counting("items", nativewriter._paginate_rows))
+    SECTION_CACHE.clear()
+    yield counts
+    SECTION_CACHE.clear()
+
+
+def test_cache_hits_and_evicts_least_recently_used():
+    cache = SectionCache(maxsize=2)
+    assert cache.get("a", STYLE, (1,), lambda: "one") == "one"
+    assert cache.get("a", STYLE, (1,), lambda: "other") == "one"
+    assert cache.get("a", STYLE, (2,), lambda: "two") == "two"
+    assert cache.get("b", STYLE, (1,), lambda: "b") == "b"
+    assert cache.get("a", STYLE, (1,), lambda: "rebuilt") == "rebuilt"  # evicted
+    assert (cache.hits, cache.misses, len(cache)) == (1, 4, 2)
+
+
+@pytest.mark.parametrize("backend", ["borb", "native"])
+def test_rerender_only_rebuilds_changed_sections(make_invoice, builds, backend):
+    build_invoice(make_invoice(_items("10", "20")), backend=backend)
+    assert builds == {"contact_details": 1, "totals": 1, "items": 1}
+
+    build_invoice(make_invoice(_items("10", "20")), backend=backend)
+    assert builds == {"contact_details": 1, "totals": 1, "items": 1}
+
+    build_invoice(make_invoice(_items("10", "30")), backend=backend)
+    assert builds == {"contact_details": 1, "totals": 2, "items": 2}
+
+
+def test_cached_sections_render_the_same_pdf(make_invoice, builds):
+    def render() -> bytes:
+        pdf = build_invoice(make_invoice(_items("10", "20")), backend="native").to_bytes()
+        return re.sub(rb"/CreationDate\(D:\d+\)", b"", pdf)
+
+    first = render()
+    assert render() == first
+    assert SECTION_CACHE.hits > 0
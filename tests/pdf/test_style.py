@@ -0,0 +1,93 @@
+"""Unit tests for the style registry in kscinvoicing.pdf.utils."""
+import json
+import shutil
+from decimal import Decimal
+
+import pytest
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.generate_invoice_from_json import rerender_invoice
+from kscinvoicing.invoice import LineItem
+from kscinvoicing.pdf import utils
+from kscinvoicing.pdf.invoicebuilder import build_invoice, _build_itemised_table
+from kscinvoicing.pdf.tableschema import TableSchema
+from kscinvoicing.pdf.utils import STYLE, Currency, Language, get_style
+
+
+@pytest.fixture
+def style_file(tmp_path):
+    shutil.copytree(utils.CONFIG_FOLDER / "fonts" / "Kanit", tmp_path / "fonts")
+    path = tmp_path / "custom.json"
+    path.write_text(json.dumps({
+        "primary_font": "./fonts/Kanit-Regular.ttf",
+        "title_font": "./fonts/Kanit-Regular.ttf",
+        "colors": {"dark_blue": "#ff0000"},
+    }))
+    return path
+
+
+def test_default_style_is_shared():
+    assert get_style() is STYLE
+    assert get_style("default") is STYLE
+    assert get_style(STYLE) is STYLE
+
+
+def test_named_style_from_styles_folder():
+    roboto = get_style("roboto")
+    assert roboto is not STYLE
+    assert get_style("roboto") is roboto
+    assert roboto.colors["white"] is utils.COLOR["white"]
+
+
+def test_style_from_path_resolves_fonts_and_colors(style_file):
+    style = get_style(style_file)
+    assert get_style(style_file) is style
+    assert style.colors["dark_blue"].red == Decimal(1)
+    assert style.colors["light_grey_blue"] is utils.COLOR["light_grey_blue"]
+
+
+def test_style_names_stay_in_styles_folder(style_file):
+    assert get_style("roboto.json") is get_style("roboto")
+    for name in (str(style_file), "../style", "../styles/../../README.md"):
+        with pytest.raises(ValueError):
+            get_style(name)
+
+
+def test_missing_style_raises():
+    with pytest.raises(FileNotFoundError):
+        get_style("no-such-style")
+
+
+def test_style_cache_evicts_least_recently_used(style_file):
+    utils._load_style.cache_clear()
+    get_style(style_file)
+    for i in range(utils.STYLE_CACHE_SIZE):
+        other = style_file.with_name(f"other{i}.json")
+        other.write_text(style_file.read_text())
+        get_style(other)
+    assert utils._load_style.cache_info().currsize == utils.STYLE_CACHE_SIZE
+    misses = utils._load_style.cache_info().misses
+    get_style(style_file)
+    assert utils._load_style.cache_info().misses == misses + 1
+
+
+def test_table_schema_and_itemised_table_use_style(style_file):
+    style = get_style(style_file)
+    assert TableSchema([["a"]], [Decimal(1)], []).style is STYLE
+    assert TableSchema([["a"]], [Decimal(1)], [], style=style).style is style
+
+    items = [LineItem(description="Work", quantity=1, price_per_unit=Decimal("10.00"))]
+    table = _build_itemised_table(items, Currency.EUR, Language.EN, style=style)
+    heading = table._content[0]._layout_element
+    assert heading._font is style.title_font
+
+
+def test_build_invoice_with_style(style_file, make_invoice, tmp_path):
+    invoice = make_invoice([LineItem(description="Work", quantity=1, price_per_unit=Decimal("10.00"))])
+    pdf = build_invoice(invoice, footer_text="Footer", style=style_file).to_bytes()
+    assert pdf.startswith(b"%PDF")
+
+    invoice.assign_number()
+    build_invoice(invoice, style=style_file).save()
+    row = invoice_store.get_invoice_by_number("0001", tmp_path / "invoices.db")
+    assert rerender_invoice(row["id"], tmp_path / "invoices.db").render_options["style"] == str(style_file.resolve())
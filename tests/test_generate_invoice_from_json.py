@@ -1,6 +1,34 @@
+import copy
+import io
+import json
+import os
+import sqlite3
+import tempfile
 import unittest
-from kscinvoicing.generate_invoice_from_json import generate_invoice
+from pathlib import Path
+from unittest.mock import patch
+
+from borb.pdf import PDF
+from borb.toolkit import SimpleTextExtraction
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.generate_invoice_from_json import (
+    generate_invoice,
+    generate_invoices_from_ndjson,
+    regenerate_pdf,
+    rerender_invoice,
+    validate_invoice_json,
+    InvoiceValidationError,
+)
+from kscinvoicing.info import CompanyRecipient
 from kscinvoicing.pdf.borbinvoice import BorbInvoice
+from kscinvoicing.pdf.memory import TRACE_MEMORY_ENV
+
+
+def _pdf_text(pdf: bytes) -> str:
+    extraction = SimpleTextExtraction()
+    PDF.loads(io.BytesIO(pdf), [extraction])
+    return extraction.get_text()[0]
 
 class TestGenerateInvoiceFromJson(unittest.TestCase):
 
@@ -59,3 +87,137 @@ class TestGenerateInvoiceFromJson(unittest.TestCase):
         self.assertIsNotNone(borb_invoice.document)
         self.assertEqual(borb_invoice.invoice.sender.name, 'Alice Sender')
         self.assertEqual(len(borb_invoice.invoice.items), 2)
+
+    def test_validate_invoice_json_valid(self):
+        self.assertEqual([], validate_invoice_json(self.invoice_data))
+
+    def test_validate_invoice_json_reports_all_errors(self):
+        data = copy.deepcopy(self.invoice_data)
+        del data['sender']['siren']
+        data['currency'] = 'JPY'
+        data['lineitem_details'][1]['quantity'] = 0
+        errors = validate_invoice_json(data)
+        self.assertIn("$.sender.siren: required field missing", errors)
+        self.assertIn("$.currency: invalid value 'JPY'", errors)
+        self.assertIn("$.lineitem_details[1].quantity: invalid value 0", errors)
+        self.assertEqual(3, len(errors))
+
+    def test_generate_invoice_raises_validation_error(self):
+        data = copy.deepcopy(self.invoice_data)
+        del data['recipient']
+        with self.assertRaises(InvoiceValidationError):
+            generate_invoice(data)
+
+
+class TestGenerateInvoicesFromNdjson(unittest.TestCase):
+
+    def setUp(self):
+        TestGenerateInvoiceFromJson.setUp(self)  # reuse the same invoice data
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.invoice_data['save_location'] = self._tmp_dir.name
+        db_patch = patch('kscinvoicing.invoice.invoicedata._DEFAULT_DB_PATH', Path(self._tmp_dir.name) / "invoices.db")
+        db_patch.start()
+        self.addCleanup(db_patch.stop)
+        self.addCleanup(self._tmp_dir.cleanup)
+
+    def test_generate_invoices_from_ndjson(self):
+        invalid = copy.deepcopy(self.invoice_data)
+        del invalid['lineitem_details']
+        stream = io.StringIO("\n".join([
+            json.dumps(self.invoice_data),
+            "",
+            "{not json",
+            json.dumps(invalid),
+            json.dumps(self.invoice_data),
+        ]))
+        out = io.StringIO()
+
+        failures = generate_invoices_from_ndjson(stream, out)
+
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(2, failures)
+        self.assertEqual([1, 3, 4, 5], [r['line'] for r in results])
+        self.assertEqual(["ok", "error", "error", "ok"], [r['status'] for r in results])
+        self.assertEqual(["$.lineitem_details: required field missing"], results[2]['errors'])
+        self.assertEqual(["0001", "0002"], [results[0]['invoice_number'], results[3]['invoice_number']])
+        self.assertTrue(Path(results[3]['path']).is_file())
+        self.assertNotIn('peak_memory_bytes', results[0])
+
+    def test_generate_invoices_from_ndjson_failed_batch_is_not_saved(self):
+        stream = io.StringIO("\n".join(json.dumps(self.invoice_data) for _ in range(3)))
+        out = io.StringIO()
+        log_invoices = invoice_store.log_invoices
+        calls = []
+
+        def failing_second_batch(records, db_path):
+            calls.append(len(records))
+            if len(calls) == 2:
+                raise sqlite3.OperationalError("disk I/O error")
+            return log_invoices(records, db_path)
+
+        with patch.object(invoice_store, 'log_invoices', failing_second_batch):
+            failures = generate_invoices_from_ndjson(stream, out, batch_size=2)
+
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([2, 1], calls)
+        self.assertEqual(1, failures)
+        self.assertEqual(["0001", "0002"], [r['invoice_number'] for r in results[:2]])
+        self.assertEqual({"line": 3, "status": "error", "errors": ["not saved: disk I/O error"]}, results[2])
+        self.assertEqual(2, len(list(Path(self._tmp_dir.name).glob("*.pdf"))))
+        self.assertEqual([], list(Path(self._tmp_dir.name).glob(".*.tmp")))
+
+    def test_generate_invoices_from_ndjson_reports_peak_memory(self):
+        out = io.StringIO()
+        with patch.dict(os.environ, {TRACE_MEMORY_ENV: "1"}):
+            generate_invoices_from_ndjson(io.StringIO(json.dumps(self.invoice_data)), out)
+
+        result = json.loads(out.getvalue())
+        self.assertEqual("ok", result['status'])
+        self.assertGreater(result['peak_memory_bytes'], 0)
+
+
+class TestRerenderInvoice(unittest.TestCase):
+
+    def setUp(self):
+        TestGenerateInvoicesFromNdjson.setUp(self)
+        self.db_path = Path(self._tmp_dir.name) / "invoices.db"
+        self.invoice_data['due_date'] = '2023-10-04'
+        self.invoice_data['discount'] = '10.50'
+        self.invoice_data['recipient']['company'] = 'CERN'
+        self.invoice_data['recipient']['siren'] = '987654321'
+
+    def test_snapshot_stored_with_logged_invoice(self):
+        generate_invoice(self.invoice_data).save()
+
+        snapshot = invoice_store.get_invoice_snapshot(1, self.db_path)
+        self.assertEqual("0001", snapshot['invoice_number'])
+        self.assertEqual("CERN", snapshot['recipient']['company'])
+        self.assertEqual("2023-10-04", snapshot['due_date'])
+        self.assertEqual("10.50", snapshot['discount'])
+        self.assertEqual("Some legal text.", snapshot['footer_text'])
+        self.assertEqual("en", snapshot['language'])
+        self.assertEqual({'description': 'service 42', 'quantity': 3, 'price_per_unit': '50'},
+                         snapshot['lineitem_details'][0])
+        self.assertEqual([], validate_invoice_json(snapshot))
+
+    def test_rerender_invoice_matches_original(self):
+        original = generate_invoice(self.invoice_data)
+        original.save()
+
+        rerendered = rerender_invoice(1, self.db_path)
+        self.assertEqual("0001", rerendered.invoice.invoice_number)
+        self.assertIsInstance(rerendered.invoice.recipient, CompanyRecipient)
+        self.assertEqual(original.invoice.totals, rerendered.invoice.totals)
+        self.assertEqual(_pdf_text(original._get_save_path().read_bytes()), _pdf_text(rerendered.to_bytes()))
+        self.assertEqual(1, len(invoice_store.get_all_invoices(self.db_path)))  # re-rendering doesn't log
+
+        row = invoice_store.get_all_invoices(self.db_path)[0]
+        self.assertTrue(regenerate_pdf(row, self.db_path).startswith(b"%PDF"))
+
+    def test_rerender_invoice_without_snapshot(self):
+        invoice_store.init_db(self.db_path)
+        legacy_log = Path(self._tmp_dir.name) / "log.json"
+        legacy_log.write_text(json.dumps({"0001": {"date": "04/09/2023", "invoice_to": "Bob", "total amount": 10}}))
+        invoice_store.migrate_from_json(legacy_log, self.db_path)
+        with self.assertRaises(LookupError):
+            rerender_invoice(1, self.db_path)
@@ -1,6 +1,10 @@
 """Unit tests for pure helper functions in kscinvoicing.web.app (no Streamlit runtime needed)."""
-from kscinvoicing.web.app import _build_address, _build_sender, _build_recipient
+from datetime import date, datetime
+from decimal import Decimal
+
+from kscinvoicing.web.app import _build_address, _build_sender, _build_recipient, _build_invoice_data, _history_rows
 from kscinvoicing.info import Address, CompanySender, IndividualRecipient, CompanyRecipient
+from kscinvoicing.invoice import InvoiceData
 
 
 # ---------------------------------------------------------------------------
@@ -104,3 +108,36 @@ def test_build_recipient_missing_type_defaults_to_individual():
     d = {"name": "Carol", "email": "carol@example.com", "address": {}}
     recipient = _build_recipient(d)
     assert isinstance(recipient, IndividualRecipient)
+
+
+# ---------------------------------------------------------------------------
+# _build_invoice_data
+# ---------------------------------------------------------------------------
+
+def test_build_invoice_data_from_form_values(tmp_path):
+    sender = {"siren": "123456789", "company": "ACME", "name": "Alice", "email": "a@a.fr", "address": {}}
+    client = {"type": "individual", "name": "Bob", "email": "b@b.fr", "address": {}}
+    items = [{"description": "Conseil", "quantity": 2, "price_per_unit": 0.1}]
+    invoice = _build_invoice_data(sender, client, items, str(tmp_path), "EUR", date(2024, 1, 1), None, 0.0, 0.2)
+    assert isinstance(invoice, InvoiceData)
+    assert invoice.invoice_number is None
+    assert invoice.items[0].price_per_unit == Decimal("0.1")
+    assert invoice.date == datetime(2024, 1, 1)
+    assert invoice.due_date is None
+    assert invoice.tax_rate == Decimal("0.2")
+
+
+# ---------------------------------------------------------------------------
+# _history_rows
+# ---------------------------------------------------------------------------
+
+def test_history_rows_format_totals_and_status():
+    invoices = [
+        {"number": "0002", "date": "2024-02-01", "client_name": "Bob", "total": 1234.5, "currency": "EUR",
+         "status": "overdue"},
+        {"number": "0001", "date": None, "client_name": None, "total": None, "currency": None, "status": "paid"},
+    ]
+    assert _history_rows(invoices) == [
+        {"Number": "0002", "Date": "2024-02-01", "Client": "Bob", "Total": "1,234.50 EUR", "Status": "🟡 Overdue"},
+        {"Number": "0001", "Date": "—", "Client": "—", "Total": "—", "Status": "🟢 Paid"},
+    ]
@@ -0,0 +1,61 @@
+"""Tests for the Invoice History tab of kscinvoicing.web.app, run with Streamlit's AppTest."""
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import kscinvoicing.invoice.invoice_store as invoice_store
+from kscinvoicing.info import Address, CompanySender, IndividualRecipient
+from kscinvoicing.invoice import InvoiceData, LineItem
+from kscinvoicing.web import profile_store
+from kscinvoicing.web.app import _export_csv
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = tmp_path / "invoices.db"
+    invoice_store.init_db(path)
+    monkeypatch.setattr(profile_store, "INVOICE_DB", path)
+    address = Address(number="1", street="Rue A", postcode="75000", city="Paris", country="France")
+    invoice = InvoiceData(
+        sender=CompanySender(siren="123456789", company_name="ACME", name="Alice", address=address, email="a@a.fr"),
+        recipient=IndividualRecipient(name="Bob", address=address, email="b@b.fr"),
+        items=[LineItem(description="Conseil", quantity=1, price_per_unit=Decimal("100.00"))],
+        save_folder=tmp_path,
+        currency="EUR",
+        date=datetime(2024, 1, 1),
+        db_path=path,
+    )
+    invoice.assign_number()
+    invoice_store.log_invoices([invoice_store.invoice_record(invoice)], path)
+    return path
+
+
+def _history_tab():
+    from kscinvoicing.web.app import _tab_history
+    _tab_history()
+
+
+def test_export_csv(db_path):
+    lines = _export_csv("Invoices", db_path, None, None, None).decode("utf-8").splitlines()
+    assert len(lines) == 2 and "0001" in lines[1]
+    assert len(_export_csv("Line items", db_path, None, None, "paid").splitlines()) == 1  # header only
+
+
+def test_history_tab_exports_csv(db_path):
+    app = AppTest.from_function(_history_tab)
+    app.run()
+    app.button(key="hist_export_btn").click().run()
+    assert not app.exception
+    assert [button.label for button in app.get("download_button")] == ["Download CSV"]
+
+
+def test_history_tab_pages_search_results(db_path):
+    app = AppTest.from_function(_history_tab)
+    app.run()
+    app.text_input(key="hist_search").input("conseil").run()
+    assert not app.exception
+    assert [metric.value for metric in app.metric] == ["1", "100.00"]
+    app.selectbox(key="hist_status_filter").select("Paid").run()
+    assert [info.value for info in app.info] == ["No invoices matching 'conseil'."]
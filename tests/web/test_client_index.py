@@ -0,0 +1,53 @@
+"""Unit tests for kscinvoicing.web.client_index."""
+import pytest
+
+import kscinvoicing.web.profile_store as ps
+from kscinvoicing.web.client_index import ClientIndex, get_client_index
+
+CLIENTS = {
+    "CERN": {"type": "company", "company_name": "European Organization for Nuclear Research", "name": "Alice",
+             "email": "alice@cern.ch"},
+    "Bob": {"type": "individual", "name": "Bob Martin", "email": "bob@example.com"},
+    "Équipe Rouge": {"type": "company", "company_name": "Équipe Rouge SARL", "name": "Carol",
+                     "email": "carol@rouge.fr"},
+    "Globex": {"type": "company", "company_name": "Globex Corporation", "name": "Hank", "email": "hank@globex.com"},
+}
+
+
+@pytest.fixture(autouse=True)
+def patch_data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ps, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(ps, "CLIENTS_FILE", tmp_path / "clients.json")
+
+
+def test_search_by_prefix_of_any_field():
+    index = ClientIndex(CLIENTS)
+    assert index.search("cern") == ["CERN"]
+    assert index.search("nuclear") == ["CERN"]
+    assert index.search("bob@") == ["Bob"]
+    assert index.search("GLOBEX corp") == ["Globex"]
+
+
+def test_search_ignores_accents_and_ranks_prefixes_first():
+    index = ClientIndex(CLIENTS)
+    assert index.search("equipe") == ["Équipe Rouge"]
+    assert index.search("ouge") == ["Équipe Rouge"]  # substring match
+    # "ro" starts a word of Équipe Rouge but is only inside "Organization" and "European"
+    assert index.search("ro") == ["Équipe Rouge", "CERN"]
+
+
+def test_search_limits_and_empty_query():
+    index = ClientIndex(CLIENTS)
+    assert index.search("", limit=2) == ["CERN", "Bob"]
+    assert len(index.search("o", limit=1)) == 1
+    assert index.search("nobody") == []
+
+
+def test_index_rebuilt_when_clients_change():
+    assert get_client_index().keys == []
+    ps.save_client("Bob", CLIENTS["Bob"])
+    index = get_client_index()
+    assert index.keys == ["Bob"]
+    assert get_client_index() is index
+    ps.delete_client("Bob")
+    assert get_client_index().search("bob") == []
@@ -0,0 +1,51 @@
+"""Unit tests for kscinvoicing.web.line_item_index."""
+import pytest
+
+import kscinvoicing.web.profile_store as ps
+from kscinvoicing.web.line_item_index import LineItemIndex, get_line_item_index, trigrams
+
+HISTORY = {
+    "Consulting services": {"quantity": 3, "price_per_unit": "50.00", "count": 9},
+    "Quantum workshop": {"quantity": 1, "price_per_unit": "1200.00", "count": 4},
+    "Workshop preparation": {"quantity": 2, "price_per_unit": "300.00", "count": 6},
+    "Déplacement Genève": {"quantity": 1, "price_per_unit": "80.00", "count": 1},
+}
+
+
+@pytest.fixture(autouse=True)
+def patch_data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ps, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(ps, "LINE_ITEM_HISTORY_FILE", tmp_path / "line_item_history.json")
+
+
+def test_trigrams_pad_word_starts():
+    assert trigrams("Ab") == {"  a", " ab", "ab "}
+    assert trigrams("  ") == set()
+
+
+def test_search_ranks_containing_matches_then_usage():
+    index = LineItemIndex(HISTORY)
+    assert index.search("workshop") == ["Workshop preparation", "Quantum workshop"]
+    assert index.search("w") == ["Workshop preparation", "Quantum workshop"]
+    assert index.search("geneve") == ["Déplacement Genève"]
+
+
+def test_search_tolerates_typos():
+    index = LineItemIndex(HISTORY)
+    assert index.search("consluting")[0] == "Consulting services"
+    assert index.search("workshp prep")[0] == "Workshop preparation"
+    assert index.search("xyz") == []
+
+
+def test_empty_query_gives_most_used_and_limit_applies():
+    index = LineItemIndex(HISTORY)
+    assert index.search("", limit=2) == ["Consulting services", "Workshop preparation"]
+    assert index.search("w", limit=1) == ["Workshop preparation"]
+
+
+def test_index_rebuilt_when_history_changes():
+    assert get_line_item_index().descriptions == []
+    ps.record_line_items([{"description": "Audit", "quantity": 1, "price_per_unit": "10"}])
+    index = get_line_item_index()
+    assert index.search("aud") == ["Audit"]
+    assert get_line_item_index() is index